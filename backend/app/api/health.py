@@ -0,0 +1,28 @@
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi.responses import JSONResponse
+
+from app.core.config import Settings, get_settings
+from app.core.factory.documentfactory import get_model_warmer
+from app.services.documents.model_warmup import ModelWarmer
+
+
+router = APIRouter()
+
+
+@router.get("/ready")
+async def ready(
+    settings: Settings = Depends(get_settings),
+    warmer: ModelWarmer = Depends(get_model_warmer)
+):
+    """
+    Report whether the service can answer chats without a cold start
+
+    :param settings: The application settings
+    :param warmer: The model warmer
+    :return: 200 once the chat and embedding models respond, 503 before
+    """
+    if not settings.model_warmup_enabled:
+        return {"ready": True, "models": None, "last_warmed": None}
+    status = warmer.status()
+    return JSONResponse(status_code=200 if status["ready"] else 503, content=status)
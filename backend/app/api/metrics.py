@@ -0,0 +1,66 @@
+import secrets
+from typing import Iterator, Optional
+
+from fastapi import APIRouter
+from fastapi import Depends
+from fastapi import Response
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import Metric
+
+from app.core.config import Settings, get_settings
+from app.core.exceptions import ForbiddenException
+from app.core.factory.documentfactory import get_generation_gateway, get_prefill_metrics
+from app.db.base import engine, replicas
+from app.db.pool import get_pool_metrics
+from app.services.auth.revocation import get_revocation_filter
+from app.services.auth.token_cache import get_token_cache
+
+
+router = APIRouter()
+scraper_bearer = HTTPBearer(auto_error=False)
+
+
+class ServiceStatsCollector:
+    """
+    Exports the statistics the generation gateway, the session prefill
+    metrics, the connection pool, the replicas, the token cache and the
+    revocation filter already keep, so that /metrics reads the same
+    numbers as the services and the /api/v1/system endpoints.
+    """
+
+    def describe(self) -> Iterator[Metric]:
+        # Nothing to describe up front: collecting builds the services.
+        return iter(())
+
+    def collect(self) -> Iterator[Metric]:
+        yield from get_generation_gateway().collect()
+        yield from get_prefill_metrics().collect()
+        yield from get_pool_metrics().collect(engine.pool)
+        yield from replicas.collect()
+        yield from get_token_cache().collect()
+        yield from get_revocation_filter().collect()
+
+
+REGISTRY.register(ServiceStatsCollector())
+
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(
+    credentials: Optional[HTTPAuthorizationCredentials] = Depends(scraper_bearer),
+    settings: Settings = Depends(get_settings)
+):
+    """
+    Expose the ingestion, chat, generation and database metrics for
+    Prometheus to scrape
+
+    :param credentials: The bearer token of the scraper
+    :param settings: The application settings
+    :return: The metrics in the Prometheus text format
+    :raises ForbiddenException: If a metrics token is set and not given
+    """
+    if settings.metrics_token and not (
+        credentials and secrets.compare_digest(credentials.credentials, settings.metrics_token)
+    ):
+        raise ForbiddenException(message="Invalid metrics token")
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,80 @@
+from fastapi import APIRouter
+from fastapi import Depends
+
+from app.core.factory.documentfactory import get_generation_gateway, get_prefill_metrics
+from app.db.base import engine, replicas
+from app.db.pool import PoolMetrics, get_pool_metrics
+from app.services.auth.auth_services import jwt_bearer
+from app.services.documents.generation_gateway import GenerationGateway
+from app.services.documents.session_service import PrefillMetrics
+
+
+router = APIRouter()
+
+
+@router.get(
+    "/generation",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=dict,
+)
+async def generation_stats(
+    gateway: GenerationGateway = Depends(get_generation_gateway)
+):
+    """
+    Get the load of the generation gateway
+
+    :param gateway: The generation gateway
+    :return: The in-flight and queued generations, the shed requests
+        and the queue wait-time histogram
+    """
+    return gateway.stats()
+
+
+@router.get(
+    "/prefill",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=dict,
+)
+async def prefill_stats(
+    metrics: PrefillMetrics = Depends(get_prefill_metrics)
+):
+    """
+    Get the prompt evaluation time of chat session turns
+
+    :param metrics: The prefill metrics
+    :return: The prefill time and evaluated prompt tokens of first
+        questions and of follow-ups
+    """
+    return metrics.stats()
+
+
+@router.get(
+    "/db-pool",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=dict,
+)
+async def db_pool_stats(
+    metrics: PoolMetrics = Depends(get_pool_metrics)
+):
+    """
+    Get the utilisation of the database connection pool
+
+    :param metrics: The pool metrics
+    :return: The connections in use, idle and in overflow, and the
+        checkout wait-time histogram
+    """
+    return metrics.stats(engine.pool)
+
+
+@router.get(
+    "/db-replicas",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=dict,
+)
+async def db_replica_stats():
+    """
+    Get the replication lag of the read replicas
+
+    :return: The lag limit and the last measured lag of each replica
+    """
+    return replicas.stats()
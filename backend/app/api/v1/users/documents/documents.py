@@ -1,16 +1,30 @@
-from typing import List
+from typing import List, Optional
 
 from fastapi import APIRouter
 from fastapi import BackgroundTasks
 from fastapi import Depends
 from fastapi import File
+from fastapi import Query
+from fastapi import Request
 from fastapi import UploadFile
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.controllers.documents.document_controller import DocumentController
-from app.db.base import get_db
+from app.core.config import get_settings
+from app.db.base import get_db, get_read_db
+from app.db.models.documents import StatusEnum
 from app.core.factory.documentfactory import get_document_controller
 from app.services.auth.auth_services import jwt_bearer
-from app.schemas.documents.document_schemas import DocumentOut, ChatResponse, ChatRequest
+from app.utils.deadline import Deadline
+from app.utils.disconnect import cancel_on_disconnect
+from app.schemas.documents.document_schemas import (
+    DocumentPage, DocumentDeleteRequest, DocumentDeleteResponse,
+    ChatResponse, ChatRequest,
+    BatchSearchRequest, BatchSearchResponse,
+    ChatSessionOut, ChatSessionDetail,
+    SessionChatRequest, SessionChatResponse,
+    QAJobRequest, QAJobOut, QAJobDetail
+)
 
 
 router = APIRouter()
@@ -18,23 +32,32 @@ router = APIRouter()
 
 @router.get(
     "/",
-    response_model=List[DocumentOut],
+    response_model=DocumentPage,
 )
 async def get_documents(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    status: Optional[StatusEnum] = None,
     user: dict = Depends(jwt_bearer),
     controller: DocumentController = Depends(get_document_controller),
-    session: AsyncSession = Depends(get_db)
+    session: AsyncSession = Depends(get_read_db)
 ):
     """
-    Get a list of all documents for the current user
+    Get a page of the current user's documents, newest first
 
+    :param limit: The maximum number of documents in the page
+    :param cursor: The next_cursor of the previous page
+    :param status: Only documents with this status
     :param user: The current user
     :param controller: The document controller
     :param session: The database session
-    :return: A list of documents for the current user
+    :return: The documents, the total number of the user's documents
+        with the status and the cursor of the next page, if any
     """
     user_id = int(user.get("sub"))
-    return await controller.get_documents(user_id, session)
+    return await controller.get_documents(
+        user_id, session, limit=limit, cursor=cursor, status=status
+    )
 
 
 @router.post(
@@ -64,31 +87,357 @@ async def upload_document(
     )
 
 
+@router.delete(
+    "/",
+    response_model=DocumentDeleteResponse,
+)
+async def delete_all_documents(
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Delete all of the current user's documents
+
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The number of documents deleted
+    """
+    return await controller.delete_documents(int(user.get("sub")), session)
+
+
+@router.post(
+    "/delete",
+    response_model=DocumentDeleteResponse,
+)
+async def delete_documents(
+    delete_request: DocumentDeleteRequest,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Delete several of the current user's documents
+
+    Ids of documents the user does not own are ignored.
+
+    :param delete_request: The ids of the documents
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The number of documents deleted
+    """
+    return await controller.delete_documents(
+        int(user.get("sub")), session, delete_request.document_ids
+    )
+
+
+@router.delete(
+    "/{doc_id}",
+    response_model=DocumentDeleteResponse,
+)
+async def delete_document(
+    doc_id: int,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Delete a document with its chunks, chat sessions and QA jobs
+
+    :param doc_id: The ID of the document
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The number of documents deleted
+    """
+    return await controller.delete_document(
+        user_id=int(user.get("sub")),
+        document_id=doc_id,
+        session=session
+    )
+
+
 @router.post(
     "/{doc_id}/chat",
     dependencies=[Depends(jwt_bearer)],
     response_model=ChatResponse,
 )
 async def chat(
+    request: Request,
     doc_id: int,
     chat_request: ChatRequest,
     user: dict = Depends(jwt_bearer),
-    session: AsyncSession = Depends(get_db),
+    session: AsyncSession = Depends(get_read_db),
     controller: DocumentController = Depends(get_document_controller)
 ):
     """
     Chat with a document
 
+    With mode "extractive", the answer is made of the retrieved
+    sentences closest to the question, without calling the LLM.
+    The whole request runs under one deadline, and a non-streaming
+    request is cancelled when the client disconnects; a stream is
+    cancelled by the server once its client is gone.
+
+    :param request: The incoming request
     :param doc_id: The ID of the document
     :param chat_request: The chat request
     :param user: The current user
     :param session: The database session
     :param controller: The document controller
-    :return: The chat response
+    :return: The chat response, or a Server-Sent Events stream when
+        the request asks for streaming
+    """
+    deadline = Deadline(get_settings().chat_deadline)
+    if chat_request.stream:
+        events = await controller.stream_chat_with_document(
+            user_id=int(user.get("sub")),
+            document_id=doc_id,
+            message=chat_request.query,
+            session=session,
+            deadline=deadline,
+            mode=chat_request.mode
+        )
+        return StreamingResponse(
+            events,
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+        )
+    return await cancel_on_disconnect(
+        request,
+        controller.chat_with_document(
+            user_id=int(user.get("sub")),
+            document_id=doc_id,
+            message=chat_request.query,
+            session=session,
+            deadline=deadline,
+            mode=chat_request.mode
+        )
+    )
+
+
+@router.post(
+    "/{doc_id}/sessions",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=ChatSessionOut,
+)
+async def create_session(
+    doc_id: int,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Start a multi-turn chat session about a document
+
+    :param doc_id: The ID of the document
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The new chat session
+    """
+    return await controller.create_chat_session(
+        user_id=int(user.get("sub")),
+        document_id=doc_id,
+        session=session
+    )
+
+
+@router.get(
+    "/{doc_id}/sessions/{session_id}",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=ChatSessionDetail,
+)
+async def get_session(
+    doc_id: int,
+    session_id: int,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_read_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Get a chat session with its messages
+
+    :param doc_id: The ID of the document
+    :param session_id: The ID of the chat session
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The chat session and its messages
     """
-    return await controller.chat_with_document(
+    return await controller.get_chat_session(
         user_id=int(user.get("sub")),
         document_id=doc_id,
-        message=chat_request.query,
+        session_id=session_id,
         session=session
     )
+
+
+@router.post(
+    "/{doc_id}/sessions/{session_id}/chat",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=SessionChatResponse,
+)
+async def session_chat(
+    request: Request,
+    doc_id: int,
+    session_id: int,
+    chat_request: SessionChatRequest,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Ask a question within a chat session
+
+    :param request: The incoming request
+    :param doc_id: The ID of the document
+    :param session_id: The ID of the chat session
+    :param chat_request: The chat request
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The chat response, with the prompt evaluation time
+    """
+    return await cancel_on_disconnect(
+        request,
+        controller.chat_in_session(
+            user_id=int(user.get("sub")),
+            document_id=doc_id,
+            session_id=session_id,
+            message=chat_request.query,
+            session=session,
+            deadline=Deadline(get_settings().chat_deadline)
+        )
+    )
+
+
+@router.post(
+    "/{doc_id}/search",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=BatchSearchResponse,
+)
+async def search(
+    doc_id: int,
+    search_request: BatchSearchRequest,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_read_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Search a document for a batch of queries
+
+    :param doc_id: The ID of the document
+    :param search_request: The queries and search options
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The hits of each query, grouped by query
+    """
+    return await controller.search_document(
+        user_id=int(user.get("sub")),
+        document_id=doc_id,
+        queries=search_request.queries,
+        k=search_request.k,
+        threshold=search_request.threshold,
+        session=session
+    )
+
+
+@router.post(
+    "/{doc_id}/qa-jobs",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=QAJobOut,
+)
+async def submit_qa_job(
+    doc_id: int,
+    job_request: QAJobRequest,
+    background_tasks: BackgroundTasks,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Answer a list of questions about a document in the background
+
+    :param doc_id: The ID of the document
+    :param job_request: The questions
+    :param background_tasks: The background tasks
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The pending job, to poll for its answers
+    """
+    return await controller.submit_qa_job(
+        user_id=int(user.get("sub")),
+        document_id=doc_id,
+        questions=job_request.questions,
+        background_tasks=background_tasks,
+        session=session
+    )
+
+
+@router.get(
+    "/{doc_id}/qa-jobs/{job_id}",
+    dependencies=[Depends(jwt_bearer)],
+    response_model=QAJobDetail,
+)
+async def get_qa_job(
+    doc_id: int,
+    job_id: int,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_read_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Get the progress of a QA job and the answers so far
+
+    :param doc_id: The ID of the document
+    :param job_id: The ID of the QA job
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: The job and its questions with their answers
+    """
+    return await controller.get_qa_job(
+        user_id=int(user.get("sub")),
+        document_id=doc_id,
+        job_id=job_id,
+        session=session
+    )
+
+
+@router.get(
+    "/{doc_id}/qa-jobs/{job_id}/results",
+    dependencies=[Depends(jwt_bearer)],
+)
+async def download_qa_job_results(
+    doc_id: int,
+    job_id: int,
+    user: dict = Depends(jwt_bearer),
+    session: AsyncSession = Depends(get_read_db),
+    controller: DocumentController = Depends(get_document_controller)
+):
+    """
+    Download the answers of a QA job as JSON lines
+
+    :param doc_id: The ID of the document
+    :param job_id: The ID of the QA job
+    :param user: The current user
+    :param session: The database session
+    :param controller: The document controller
+    :return: One JSON object per question, in question order
+    """
+    lines = await controller.get_qa_job_results(
+        user_id=int(user.get("sub")),
+        document_id=doc_id,
+        job_id=job_id,
+        session=session
+    )
+    return StreamingResponse(
+        iter(lines),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="qa-job-{job_id}.jsonl"'}
+    )
@@ -1,9 +1,23 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager, nullcontext
+from typing import AsyncIterator, Optional, Tuple
 from fastapi import UploadFile, BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.db.models.documents import Document, StatusEnum
+from app.services.auth.rate_limiter import LLM_TOKENS, RateLimiter
 from app.services.documents.chat_service import ChatService
-from app.schemas.documents.document_schemas import DocumentOut
+from app.schemas.documents.document_schemas import (
+    ChatMessageOut, ChatSessionOut, DocumentDeleteResponse, DocumentOut,
+    DocumentPage, QAJobAnswerOut, QAJobOut
+)
 from app.services.documents.documentservice import DocumentService
+from app.services.documents.qa_jobs import QAJobService
+from app.services.documents.session_service import ChatSessionService
+from app.utils.deadline import Deadline
+from app.utils.metrics import CHAT_STAGE_SECONDS
+from app.utils.tokens import track_token_usage
 
 
 class DocumentController:
@@ -14,7 +28,10 @@ class DocumentController:
     """
     def __init__(
         self, document_service: DocumentService,
-        chat_service: ChatService
+        chat_service: ChatService,
+        session_service: Optional[ChatSessionService] = None,
+        qa_job_service: Optional[QAJobService] = None,
+        rate_limiter: Optional[RateLimiter] = None
     ):
         """
         Initialize the controller.
@@ -22,9 +39,17 @@ class DocumentController:
         Args:
             document_service (DocumentService): The document service.
             chat_service (ChatService): The chat service.
+            session_service (ChatSessionService, optional): The chat
+            session service.
+            qa_job_service (QAJobService, optional): The QA job service.
+            rate_limiter (RateLimiter, optional): The per-user limit on
+            LLM tokens.
         """
         self.document_service = document_service
         self.chat_service = chat_service
+        self.session_service = session_service
+        self.qa_job_service = qa_job_service
+        self.rate_limiter = rate_limiter
 
     async def upload_document(
         self,
@@ -52,26 +77,175 @@ class DocumentController:
     
     async def get_documents(
         self, user_id: int,
+        session: AsyncSession,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[StatusEnum] = None
+    ) -> DocumentPage:
+        """
+        Get a page of documents for the current user.
+
+        Args:
+            user_id (int): The user id.
+            session (AsyncSession): The database session.
+            limit (int): The maximum number of documents in the page.
+            cursor (str, optional): The next_cursor of the previous page.
+            status (StatusEnum, optional): Only documents with this status.
+
+        Returns:
+            DocumentPage: The documents, their total and the next cursor.
+        """
+        page = await self.document_service.get_documents(
+            user_id, session, limit=limit, cursor=cursor, status=status
+        )
+        return DocumentPage(
+            items=[
+                DocumentOut(**{**row._mapping, "status": row.status.value})
+                for row in page["items"]
+            ],
+            total=page["total"],
+            next_cursor=page["next_cursor"]
+        )
+
+    async def delete_document(
+        self,
+        user_id: int,
+        document_id: int,
         session: AsyncSession
-    ) -> list[DocumentOut]:
+    ) -> DocumentDeleteResponse:
         """
-        Get a list of all documents for the current user.
+        Delete a document of the current user.
 
         Args:
             user_id (int): The user id.
+            document_id (int): The document id.
             session (AsyncSession): The database session.
 
         Returns:
-            list[DocumentOut]: A list of documents for the current user.
+            DocumentDeleteResponse: The number of documents deleted.
         """
-        return await self.document_service.get_documents(user_id, session)
-    
-    async def chat_with_document(
+        await self.document_service.delete_document(user_id, document_id, session)
+        return DocumentDeleteResponse(deleted=1)
+
+    async def delete_documents(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        document_ids: Optional[list[int]] = None
+    ) -> DocumentDeleteResponse:
+        """
+        Delete several documents of the current user, or all of them.
+
+        Args:
+            user_id (int): The user id.
+            session (AsyncSession): The database session.
+            document_ids (list[int], optional): The documents to delete;
+            all of the user's documents if omitted.
+
+        Returns:
+            DocumentDeleteResponse: The number of documents deleted.
+        """
+        deleted = await self.document_service.delete_documents(
+            user_id, session, document_ids
+        )
+        return DocumentDeleteResponse(deleted=deleted)
+
+    async def _reserve_tokens(self, user_id: int, question: str, questions: int = 1) -> float:
+        """
+        Reserve the estimated LLM tokens of the request for the user.
+
+        Args:
+            user_id (int): The user id.
+            question (str): The question, or all questions of a batch.
+            questions (int): The number of questions.
+
+        Returns:
+            float: The tokens reserved, 0 without a rate limiter.
+
+        Raises:
+            TooManyRequestsException: If the user is over their limit.
+        """
+        if not self.rate_limiter:
+            return 0
+        return await self.rate_limiter.acquire_chat(user_id, question, questions)
+
+    @asynccontextmanager
+    async def _metered(self, user_id: int, reserved: float) -> AsyncIterator[None]:
+        """
+        Settle the reserved tokens to those the model reported within the
+        block, so cached, FAQ and extractive answers are given back.
+
+        Args:
+            user_id (int): The user id.
+            reserved (float): The tokens reserved for the request.
+        """
+        with track_token_usage() as usage:
+            try:
+                yield
+            finally:
+                if reserved:
+                    await self.rate_limiter.settle(user_id, LLM_TOKENS, reserved, usage.tokens)
+
+    async def _metered_stream(
+        self,
+        user_id: int,
+        reserved: float,
+        events: AsyncIterator[str]
+    ) -> AsyncIterator[str]:
+        """
+        Settle the reserved tokens once the stream ends.
+        """
+        async with self._metered(user_id, reserved):
+            async for event in events:
+                yield event
+
+    async def _check_and_embed(
         self,
         user_id: int,
         document_id: int,
         message: str,
         session: AsyncSession
+    ) -> Tuple[Document, list]:
+        """
+        Check the document ownership while the message is being embedded.
+
+        The embedding does not depend on the document, so it runs
+        alongside the ownership query instead of after it, and is
+        cancelled if the check fails.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            message (str): The message.
+            session (AsyncSession): The database session.
+
+        Returns:
+            Tuple[Document, list]: The document and the message embedding.
+
+        Raises:
+            NotFoundException: If the user has no such document.
+        """
+        embedding = asyncio.ensure_future(self.chat_service.embed_query(message))
+        try:
+            with CHAT_STAGE_SECONDS.labels("ownership", "").time():
+                document = await self.document_service.get_user_document(
+                    user_id,
+                    document_id,
+                    session
+                )
+        except BaseException:
+            embedding.cancel()
+            raise
+        return document, await embedding
+
+    async def chat_with_document(
+        self,
+        user_id: int,
+        document_id: int,
+        message: str,
+        session: AsyncSession,
+        deadline: Optional[Deadline] = None,
+        mode: str = "generative"
     ) -> dict:
         """
         Chat with a document.
@@ -81,17 +255,307 @@ class DocumentController:
             document_id (int): The document id.
             message (str): The message.
             session (AsyncSession): The database session.
+            deadline (Deadline, optional): The time the whole request may take.
+            mode (str): "generative" or "extractive".
+
+        Returns:
+            dict: The chat response.
+
+        Raises:
+            GatewayTimeoutException: If the deadline passes.
+            TooManyRequestsException: If the user is over their limit.
+        """
+        async with deadline.limit() if deadline else nullcontext():
+            document, query_embedding = await self._check_and_embed(
+                user_id, document_id, message, session
+            )
+            reserved = await self._reserve_tokens(user_id, message) if mode == "generative" else 0
+            async with self._metered(user_id, reserved):
+                return await self.chat_service.process_chat(
+                    document_id=document_id,
+                    message=message,
+                    session=session,
+                    document_version=document.updated_at,
+                    query_embedding=query_embedding,
+                    deadline=deadline,
+                    mode=mode
+                )
+
+    async def stream_chat_with_document(
+        self,
+        user_id: int,
+        document_id: int,
+        message: str,
+        session: AsyncSession,
+        deadline: Optional[Deadline] = None,
+        mode: str = "generative"
+    ) -> AsyncIterator[str]:
+        """
+        Chat with a document, streaming the answer.
+
+        The ownership check and retrieval run before the stream is
+        returned, so errors are still reported with a regular status code
+        and the database session is released before generation starts.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            message (str): The message.
+            session (AsyncSession): The database session.
+            deadline (Deadline, optional): The time the whole request may take.
+            mode (str): "generative" or "extractive".
+
+        Returns:
+            AsyncIterator[str]: The Server-Sent Events of the response.
+
+        Raises:
+            GatewayTimeoutException: If the deadline passes before streaming.
+            TooManyRequestsException: If the user is over their limit.
+        """
+        async with deadline.limit() if deadline else nullcontext():
+            document, query_embedding = await self._check_and_embed(
+                user_id, document_id, message, session
+            )
+            reserved = await self._reserve_tokens(user_id, message) if mode == "generative" else 0
+            try:
+                events = await self.chat_service.stream_chat(
+                    document_id=document_id,
+                    message=message,
+                    session=session,
+                    document_version=document.updated_at,
+                    query_embedding=query_embedding,
+                    deadline=deadline,
+                    mode=mode
+                )
+            except BaseException:
+                if reserved:
+                    await self.rate_limiter.settle(user_id, LLM_TOKENS, reserved, 0)
+                raise
+            return self._metered_stream(user_id, reserved, events) if reserved else events
+
+    async def create_chat_session(
+        self,
+        user_id: int,
+        document_id: int,
+        session: AsyncSession
+    ) -> ChatSessionOut:
+        """
+        Start a chat session about a document.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            session (AsyncSession): The database session.
+
+        Returns:
+            ChatSessionOut: The new chat session.
+        """
+        await self.document_service.get_user_document(
+            user_id,
+            document_id,
+            session
+        )
+        chat_session = await self.session_service.create_session(
+            user_id, document_id, session
+        )
+        return ChatSessionOut.model_validate(chat_session)
+
+    async def get_chat_session(
+        self,
+        user_id: int,
+        document_id: int,
+        session_id: int,
+        session: AsyncSession
+    ) -> dict:
+        """
+        Get a chat session with its messages.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            session_id (int): The chat session id.
+            session (AsyncSession): The database session.
+
+        Returns:
+            dict: The chat session and its messages, oldest first.
+        """
+        chat_session, messages = await self.session_service.get_session(
+            user_id, document_id, session_id, session
+        )
+        return {
+            **ChatSessionOut.model_validate(chat_session).model_dump(),
+            "messages": [ChatMessageOut.model_validate(message) for message in messages]
+        }
+
+    async def chat_in_session(
+        self,
+        user_id: int,
+        document_id: int,
+        session_id: int,
+        message: str,
+        session: AsyncSession,
+        deadline: Optional[Deadline] = None
+    ) -> dict:
+        """
+        Chat with a document within a chat session.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            session_id (int): The chat session id.
+            message (str): The message.
+            session (AsyncSession): The database session.
+            deadline (Deadline, optional): The time the whole request may take.
 
         Returns:
             dict: The chat response.
+
+        Raises:
+            GatewayTimeoutException: If the deadline passes.
+            TooManyRequestsException: If the user is over their limit.
+        """
+        async with deadline.limit() if deadline else nullcontext():
+            _, query_embedding = await self._check_and_embed(
+                user_id, document_id, message, session
+            )
+            reserved = await self._reserve_tokens(user_id, message)
+            async with self._metered(user_id, reserved):
+                return await self.session_service.chat(
+                    user_id=user_id,
+                    document_id=document_id,
+                    session_id=session_id,
+                    message=message,
+                    session=session,
+                    query_embedding=query_embedding,
+                    deadline=deadline
+                )
+
+    async def search_document(
+        self,
+        user_id: int,
+        document_id: int,
+        queries: list[str],
+        k: int,
+        threshold: float | None,
+        session: AsyncSession
+    ) -> dict:
+        """
+        Search a document for several queries in one round trip.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            queries (list[str]): The queries.
+            k (int): The maximum number of hits per query.
+            threshold (float | None): The maximum cosine distance.
+            session (AsyncSession): The database session.
+
+        Returns:
+            dict: The hits grouped by query.
         """
         await self.document_service.get_user_document(
-            user_id, 
+            user_id,
             document_id,
             session
-        )        
-        return await self.chat_service.process_chat(
+        )
+        results = await self.chat_service.search(
             document_id=document_id,
-            message=message,
+            queries=queries,
+            k=k,
+            threshold=threshold,
             session=session
         )
+        return {"results": results}
+
+    async def submit_qa_job(
+        self,
+        user_id: int,
+        document_id: int,
+        questions: list[str],
+        background_tasks: BackgroundTasks,
+        session: AsyncSession
+    ) -> QAJobOut:
+        """
+        Start answering a list of questions about a document.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            questions (list[str]): The questions.
+            background_tasks (BackgroundTasks): The background tasks.
+            session (AsyncSession): The database session.
+
+        Returns:
+            QAJobOut: The pending job.
+
+        Raises:
+            TooManyRequestsException: If the user is over their limit.
+        """
+        await self.document_service.get_user_document(
+            user_id,
+            document_id,
+            session
+        )
+        reserved = await self._reserve_tokens(user_id, "\n".join(questions), len(questions))
+        job = await self.qa_job_service.submit(
+            user_id, document_id, questions, background_tasks, session,
+            reserved_tokens=reserved
+        )
+        return QAJobOut.model_validate(job)
+
+    async def get_qa_job(
+        self,
+        user_id: int,
+        document_id: int,
+        job_id: int,
+        session: AsyncSession
+    ) -> dict:
+        """
+        Get a QA job with its questions and the answers so far.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            job_id (int): The job id.
+            session (AsyncSession): The database session.
+
+        Returns:
+            dict: The job and its answers, in question order.
+        """
+        job, answers = await self.qa_job_service.get_job(
+            user_id, document_id, job_id, session
+        )
+        return {
+            **QAJobOut.model_validate(job).model_dump(),
+            "answers": [QAJobAnswerOut.model_validate(answer) for answer in answers]
+        }
+
+    async def get_qa_job_results(
+        self,
+        user_id: int,
+        document_id: int,
+        job_id: int,
+        session: AsyncSession
+    ) -> list[str]:
+        """
+        Get the answers of a QA job as JSON lines.
+
+        The answers are loaded before this returns, so the lines can be
+        streamed after the database session is released.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            job_id (int): The job id.
+            session (AsyncSession): The database session.
+
+        Returns:
+            list[str]: One JSON line per question, in question order.
+        """
+        _, answers = await self.qa_job_service.get_job(
+            user_id, document_id, job_id, session
+        )
+        return [
+            json.dumps(QAJobAnswerOut.model_validate(answer).model_dump()) + "\n"
+            for answer in answers
+        ]
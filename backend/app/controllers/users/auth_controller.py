@@ -2,7 +2,7 @@ from app.repositories.users.users import UserRepository
 from app.repositories.users.tokens import TokenRepository
 from app.db.models.users import User
 from app.schemas.users.users import UserCreate, TokenSchema
-from app.utils.security import hash_password, verify_password, create_tokens
+from app.utils.security import hash_password_async, verify_password_async, create_tokens
 from app.core.exceptions import BadRequestException, ForbiddenException
 from jose import jwt, JWTError
 from app.core.config import get_settings
@@ -31,6 +31,7 @@ class AuthController:
 
         Raises:
             BadRequestException: If the username or email already exists.
+            ServiceUnavailableException: If too many passwords are being hashed.
 
         Returns:
             User: The newly created user.
@@ -39,7 +40,7 @@ class AuthController:
         if await self.user_repo.get_by_username_or_email(user.username, user.email):
             raise BadRequestException("Username or email already exists")
 
-        hashed_password = hash_password(user.password)
+        hashed_password = await hash_password_async(user.password)
         new_user = await self.user_repo.create(user.username, user.email, hashed_password)
         return new_user
 
@@ -53,12 +54,13 @@ class AuthController:
 
         Raises:
             BadRequestException: If the username or password is incorrect.
+            ServiceUnavailableException: If too many passwords are being hashed.
 
         Returns:
             TokenSchema: The access and refresh tokens.
         """
         user = await self.user_repo.get_by_username(username)
-        if not user or not verify_password(password, user.hashed_password):
+        if not user or not await verify_password_async(password, user.hashed_password):
             raise BadRequestException("Incorrect username or password")
         return await create_tokens(user.id, self.user_repo.session)
 
@@ -1,4 +1,4 @@
-from typing import ClassVar, Set
+from typing import ClassVar, Optional, Set
 from functools import lru_cache
 from dotenv import load_dotenv
 
@@ -23,6 +23,65 @@ class Settings(BaseSettings):
     
     # database
     database_url: str
+    db_pool_size: int = 10
+    # connections opened beyond the pool size under load, closed when
+    # returned
+    db_max_overflow: int = 20
+    # seconds to wait for a free connection before failing
+    db_pool_timeout: float = 30.0
+    # seconds after which a connection is replaced, -1 to keep it
+    db_pool_recycle: int = 1800
+    db_pool_pre_ping: bool = True
+    # prepared statements kept per connection; 0 when behind pgbouncer
+    # in transaction mode
+    db_statement_cache_size: int = 500
+    # read-only queries go to these replicas, round-robin
+    database_replica_urls: list[str] = []
+    # replicas lagging further behind, in seconds, are skipped until
+    # they catch up
+    db_replica_max_lag: float = 5.0
+    db_replica_poll_interval: float = 2.0
+
+    # auth
+    token_cache_max_entries: int = 10000
+    # seconds a validated access token is trusted without a database
+    # check; bounds how long a revocation on another worker goes unseen
+    token_cache_ttl: float = 60.0
+    # bcrypt runs on its own threads, off the event loop
+    password_hash_workers: int = 2
+    # hashes waiting for a thread before further logins get a 503
+    password_hash_max_pending: int = 32
+    password_hash_retry_after: int = 2
+    # every worker keeps a bloom filter of revoked access token IDs, so
+    # only tokens that hit the filter are checked against the database
+    revocation_filter_enabled: bool = True
+    revocation_filter_capacity: int = 100000
+    revocation_filter_error_rate: float = 0.001
+    # seconds between polls for new revocations
+    revocation_poll_interval: float = 2.0
+    # revocations up to this many seconds older than the newest one seen
+    # are fetched again, for transactions that committed late
+    revocation_poll_overlap: float = 10.0
+    # seconds between full rebuilds, which drop expired token IDs
+    revocation_rebuild_interval: int = 3600
+    # without a successful poll for this long, every token is checked
+    # against the database again
+    revocation_max_staleness: float = 30.0
+    # expired and revoked tokens are deleted in batches
+    token_sweep_enabled: bool = True
+    token_sweep_interval: int = 3600
+    token_sweep_batch_size: int = 1000
+    # per-user token buckets charged by estimated cost; "postgres"
+    # shares them between workers, "memory" keeps them per process
+    user_rate_limit_enabled: bool = True
+    user_rate_limit_store: str = "postgres"
+    upload_bytes_burst: int = 200 * 1024 * 1024
+    upload_bytes_per_hour: int = 1024 * 1024 * 1024
+    embedding_chunks_burst: int = 20000
+    embedding_chunks_per_hour: int = 50000
+    # prompt plus completion tokens
+    llm_tokens_burst: int = 100000
+    llm_tokens_per_hour: int = 1000000
     
     # other
     ALLOWED_FILE_EXTENSIONS: ClassVar[Set[str]] = {
@@ -30,9 +89,94 @@ class Settings(BaseSettings):
         'docx', 'doc', 'txt', 'json'
     }
     MAX_FILE_SIZE: ClassVar[int] = 50 * 1024 * 1024
+    # chunks of a deleted document removed per transaction
+    document_delete_batch_size: int = 1000
+    # Prometheus metrics at /metrics, off unless enabled; when a token is
+    # set the scraper must send it as a bearer token
+    metrics_enabled: bool = False
+    metrics_token: Optional[str] = None
     
     # models
     ollama_url: str
+    ollama_keep_alive: str = "30m"
+    model_warmup_enabled: bool = True
+    keep_warm_interval: int = 300
+    model_warmup_retry: int = 5
+
+    # retrieval
+    chat_top_k: int = 5
+    similarity_threshold: float = 0.7
+    hnsw_ef_search: Optional[int] = None
+    ivfflat_probes: Optional[int] = None
+    # needs pgvector 0.8+; set to None on older versions
+    hnsw_iterative_scan: Optional[str] = "relaxed_order"
+    context_neighbours: int = 0
+    context_char_budget: int = 6000
+    context_token_budget: int = 3000
+
+    # generation
+    llm_num_predict: int = 512
+    # headroom for the gap between estimated and real token counts
+    llm_token_margin: float = 0.2
+    # one window for chats, session turns and warm-up: Ollama reloads the
+    # model when num_ctx changes; sessions need the context budget plus the
+    # history threshold, summary and follow-up passages
+    llm_num_ctx: int = 8192
+    generation_max_concurrency: int = 2
+    generation_max_queue: int = 16
+    generation_queue_timeout: float = 30.0
+    generation_retry_after: int = 5
+    # seconds a whole chat request may take, retrieval included
+    chat_deadline: float = 60.0
+
+    # chat sessions
+    # unsummarized history above this many tokens is compacted
+    chat_history_token_threshold: int = 1500
+    chat_history_keep_turns: int = 2
+    chat_summary_max_tokens: int = 256
+    chat_followup_context_tokens: int = 500
+
+    # precomputed answers to common first questions
+    faq_enabled: bool = False
+    faq_questions: list[str] = [
+        "Summarize this document.",
+        "What are the key dates in this document?",
+        "Who are the parties involved?"
+    ]
+    # minimum cosine similarity for a question to get the stored answer
+    faq_similarity: float = 0.9
+    # seconds between checks for a free generation slot
+    faq_idle_poll: float = 2.0
+
+    # bulk question answering
+    # generations a job runs at once, each under the generation gateway
+    qa_job_concurrency: int = 1
+    qa_job_max_attempts: int = 20
+
+    # extractive answers
+    extractive_top_sentences: int = 3
+    extractive_min_sentence_chars: int = 20
+    extractive_cache_max_entries: int = 20000
+    # answer extractively instead of shedding when generation is saturated
+    extractive_fallback: bool = True
+
+    # reranking
+    rerank_enabled: bool = False
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 30
+    rerank_top_k: int = 3
+    rerank_batch_size: int = 8
+    rerank_budget_ms: int = 250
+
+    # diversity (maximal marginal relevance)
+    mmr_enabled: bool = False
+    mmr_lambda: float = 0.5
+    mmr_candidates: int = 20
+
+    # answer cache
+    answer_cache_enabled: bool = False
+    answer_cache_max_entries: int = 1024
+    answer_cache_similarity: float = 0.95
 
     model_config = SettingsConfigDict(
         env_file=".env",
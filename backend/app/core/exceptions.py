@@ -8,6 +8,7 @@ class CustomException(Exception):
     code = HTTPStatus.BAD_GATEWAY
     error_code = HTTPStatus.BAD_GATEWAY
     message = HTTPStatus.BAD_GATEWAY.description
+    headers = None
 
     def __init__(self, message=None):
         if message:
@@ -55,6 +56,35 @@ class ValidationException(CustomException):
     error_code = HTTPStatus.UNPROCESSABLE_ENTITY
     message = "Validation error"
 
+
+class GatewayTimeoutException(CustomException):
+    code = HTTPStatus.GATEWAY_TIMEOUT
+    error_code = HTTPStatus.GATEWAY_TIMEOUT
+    message = HTTPStatus.GATEWAY_TIMEOUT.description
+
+
+class ServiceUnavailableException(CustomException):
+    code = HTTPStatus.SERVICE_UNAVAILABLE
+    error_code = HTTPStatus.SERVICE_UNAVAILABLE
+    message = HTTPStatus.SERVICE_UNAVAILABLE.description
+
+    def __init__(self, message=None, retry_after=None):
+        super().__init__(message)
+        if retry_after is not None:
+            self.headers = {"Retry-After": str(retry_after)}
+
+
+
+class TooManyRequestsException(CustomException):
+    code = HTTPStatus.TOO_MANY_REQUESTS
+    error_code = HTTPStatus.TOO_MANY_REQUESTS
+    message = HTTPStatus.TOO_MANY_REQUESTS.description
+
+    def __init__(self, message=None, retry_after=None):
+        super().__init__(message)
+        if retry_after is not None:
+            self.headers = {"Retry-After": str(retry_after)}
+
     
 async def custom_exception_handler(
     request: Request, exc: CustomException
@@ -65,6 +95,7 @@ async def custom_exception_handler(
             "error_code": exc.error_code,
             "message": exc.message,
         },
+        headers=exc.headers,
     )
 
 async def validation_exception_handler(
@@ -1,11 +1,29 @@
+from functools import lru_cache
+from typing import Optional
 from fastapi import Depends
 from app.core.config import get_settings
 from app.services.documents.documentservice import DocumentService, FileService
 from app.services.documents.embeddings import EmbeddingService
 from app.services.documents.chat_service import ChatService
 from app.services.documents.llm_service import LLMService
+from app.services.documents.model_warmup import ModelWarmer, build_model_warmer
+from app.services.documents.reranker import Reranker, build_reranker
+from app.services.documents.answer_cache import AnswerCache, build_answer_cache
+from app.services.documents.extractive import (
+    ExtractiveAnswerer, SentenceEmbeddingCache, build_sentence_cache
+)
+from app.services.documents.generation_gateway import (
+    GenerationGateway, build_generation_gateway
+)
+from app.services.documents.faq import FAQService
+from app.services.documents.qa_jobs import QAJobService
+from app.services.documents.session_service import ChatSessionService, PrefillMetrics
 from app.controllers.documents.document_controller import DocumentController
+from app.core.factory.userfactory import get_rate_limiter
+from app.services.auth.rate_limiter import RateLimiter
+from app.repositories.documents.chat_sessions import ChatSessionRepository
 from app.repositories.documents.documents import DocumentRepository
+from app.repositories.documents.qa_jobs import QAJobRepository
 
 
 def get_document_repo() -> DocumentRepository:
@@ -17,6 +35,24 @@ def get_document_repo() -> DocumentRepository:
     """
     return DocumentRepository()
 
+def get_session_repo() -> ChatSessionRepository:
+    """
+    Get the chat session repository.
+
+    Returns:
+        ChatSessionRepository: The chat session repository.
+    """
+    return ChatSessionRepository()
+
+def get_qa_job_repo() -> QAJobRepository:
+    """
+    Get the QA job repository.
+
+    Returns:
+        QAJobRepository: The QA job repository.
+    """
+    return QAJobRepository()
+
 def get_file_service() -> FileService:
     """
     Get the file service.
@@ -44,30 +80,100 @@ def get_llm_service() -> LLMService:
     """
     return LLMService()
 
+@lru_cache
+def get_reranker() -> Optional[Reranker]:
+    """
+    Get the process-wide reranker, so the model is only loaded once.
 
-def get_document_service(
-    file_service: FileService = Depends(get_file_service),
-    document_repo: DocumentRepository = Depends(get_document_repo),
-    embedding_service: EmbeddingService = Depends(get_embedding_service)
-) -> DocumentService:
+    Returns:
+        Optional[Reranker]: The reranker, or None if reranking is disabled.
     """
-    Get the document service.
+    return build_reranker(get_settings())
+
+@lru_cache
+def get_answer_cache() -> Optional[AnswerCache]:
+    """
+    Get the process-wide answer cache.
+
+    Returns:
+        Optional[AnswerCache]: The answer cache, or None if it is disabled.
+    """
+    return build_answer_cache(get_settings())
+
+@lru_cache
+def get_generation_gateway() -> GenerationGateway:
+    """
+    Get the process-wide generation gateway, shared by all chat requests.
+
+    Returns:
+        GenerationGateway: The generation gateway.
+    """
+    return build_generation_gateway(get_settings())
+
+@lru_cache
+def get_sentence_cache() -> SentenceEmbeddingCache:
+    """
+    Get the process-wide cache of sentence embeddings.
+
+    Returns:
+        SentenceEmbeddingCache: The sentence embedding cache.
+    """
+    return build_sentence_cache(get_settings())
+
+
+@lru_cache
+def get_model_warmer() -> ModelWarmer:
+    """
+    Get the process-wide model warmer.
+
+    Returns:
+        ModelWarmer: The model warmer.
+    """
+    return build_model_warmer(get_settings())
+
+
+@lru_cache
+def get_prefill_metrics() -> PrefillMetrics:
+    """
+    Get the process-wide prefill metrics of chat sessions.
+
+    Returns:
+        PrefillMetrics: The prefill metrics.
+    """
+    return PrefillMetrics()
+
+
+def get_extractive_answerer(
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    cache: SentenceEmbeddingCache = Depends(get_sentence_cache)
+) -> ExtractiveAnswerer:
+    """
+    Get the extractive answerer.
 
     Args:
-        file_service (FileService): The file service instance.
-        document_repo (DocumentRepository): The document repository instance.
         embedding_service (EmbeddingService): The embedding service instance.
+        cache (SentenceEmbeddingCache): The sentence embedding cache.
 
     Returns:
-        DocumentService: The document service instance.
+        ExtractiveAnswerer: The extractive answerer instance.
     """
-    return DocumentService(file_service, document_repo, embedding_service)
+    settings = get_settings()
+    return ExtractiveAnswerer(
+        embedding_service,
+        cache,
+        top_sentences=settings.extractive_top_sentences,
+        min_sentence_chars=settings.extractive_min_sentence_chars
+    )
 
 
 def get_chat_services(
     document_repo: DocumentRepository = Depends(get_document_repo),
     embedding_service: EmbeddingService = Depends(get_embedding_service),
-    llm_service: LLMService = Depends(get_llm_service)
+    llm_service: LLMService = Depends(get_llm_service),
+    reranker: Optional[Reranker] = Depends(get_reranker),
+    answer_cache: Optional[AnswerCache] = Depends(get_answer_cache),
+    gateway: GenerationGateway = Depends(get_generation_gateway),
+    extractor: ExtractiveAnswerer = Depends(get_extractive_answerer)
 ) -> ChatService:
     """
     Get the chat service.
@@ -76,16 +182,119 @@ def get_chat_services(
         document_repo (DocumentRepository): The document repository instance.
         embedding_service (EmbeddingService): The embedding service instance.
         llm_service (LLMService): The LLM service instance.
+        reranker (Optional[Reranker]): The reranker instance, if enabled.
+        answer_cache (Optional[AnswerCache]): The answer cache, if enabled.
+        gateway (GenerationGateway): The generation admission control.
+        extractor (ExtractiveAnswerer): The extractive answerer.
 
     Returns:
         ChatService: The chat service instance.
     """
-    return ChatService(document_repo, embedding_service, llm_service)
+    return ChatService(
+        document_repo, embedding_service, llm_service, reranker, answer_cache, gateway,
+        extractor
+    )
+
+
+def get_faq_service(
+    chat_service: ChatService = Depends(get_chat_services),
+    gateway: GenerationGateway = Depends(get_generation_gateway)
+) -> Optional[FAQService]:
+    """
+    Get the FAQ precomputation service.
+
+    Args:
+        chat_service (ChatService): The chat service instance.
+        gateway (GenerationGateway): The generation admission control.
+
+    Returns:
+        Optional[FAQService]: The FAQ service, or None if disabled.
+    """
+    if not get_settings().faq_enabled:
+        return None
+    return FAQService(chat_service, gateway)
+
+
+def get_document_service(
+    file_service: FileService = Depends(get_file_service),
+    document_repo: DocumentRepository = Depends(get_document_repo),
+    embedding_service: EmbeddingService = Depends(get_embedding_service),
+    faq_service: Optional[FAQService] = Depends(get_faq_service),
+    rate_limiter: Optional[RateLimiter] = Depends(get_rate_limiter),
+    answer_cache: Optional[AnswerCache] = Depends(get_answer_cache)
+) -> DocumentService:
+    """
+    Get the document service.
+
+    Args:
+        file_service (FileService): The file service instance.
+        document_repo (DocumentRepository): The document repository instance.
+        embedding_service (EmbeddingService): The embedding service instance.
+        faq_service (Optional[FAQService]): The FAQ service, if enabled.
+        rate_limiter (Optional[RateLimiter]): The per-user rate limiter,
+        if enabled.
+        answer_cache (Optional[AnswerCache]): The answer cache, if enabled.
+
+    Returns:
+        DocumentService: The document service instance.
+    """
+    return DocumentService(
+        file_service, document_repo, embedding_service, faq_service, rate_limiter,
+        answer_cache, get_settings().document_delete_batch_size
+    )
+
+
+def get_chat_session_service(
+    session_repo: ChatSessionRepository = Depends(get_session_repo),
+    chat_service: ChatService = Depends(get_chat_services),
+    llm_service: LLMService = Depends(get_llm_service),
+    gateway: GenerationGateway = Depends(get_generation_gateway),
+    metrics: PrefillMetrics = Depends(get_prefill_metrics)
+) -> ChatSessionService:
+    """
+    Get the chat session service.
+
+    Args:
+        session_repo (ChatSessionRepository): The chat session repository.
+        chat_service (ChatService): The chat service instance.
+        llm_service (LLMService): The LLM service instance.
+        gateway (GenerationGateway): The generation admission control.
+        metrics (PrefillMetrics): The prefill metrics.
+
+    Returns:
+        ChatSessionService: The chat session service instance.
+    """
+    return ChatSessionService(session_repo, chat_service, llm_service, gateway, metrics)
+
+
+def get_qa_job_service(
+    job_repo: QAJobRepository = Depends(get_qa_job_repo),
+    chat_service: ChatService = Depends(get_chat_services),
+    gateway: GenerationGateway = Depends(get_generation_gateway),
+    rate_limiter: Optional[RateLimiter] = Depends(get_rate_limiter)
+) -> QAJobService:
+    """
+    Get the QA job service.
+
+    Args:
+        job_repo (QAJobRepository): The QA job repository.
+        chat_service (ChatService): The chat service instance.
+        gateway (GenerationGateway): The generation admission control.
+        rate_limiter (Optional[RateLimiter]): The per-user rate limiter,
+        if enabled.
+
+    Returns:
+        QAJobService: The QA job service instance.
+    """
+    return QAJobService(job_repo, chat_service, gateway, rate_limiter)
 
 
 def get_document_controller(
     document_service: DocumentService = Depends(get_document_service),
-    chat_service: ChatService = Depends(get_chat_services)
+    chat_service: ChatService = Depends(get_chat_services),
+    session_service: ChatSessionService = Depends(get_chat_session_service),
+    qa_job_service: QAJobService = Depends(get_qa_job_service),
+    rate_limiter: Optional[RateLimiter] = Depends(get_rate_limiter)
 ) -> DocumentController:
     """
     Get the document controller.
@@ -93,10 +302,17 @@ def get_document_controller(
     Args:
         document_service (DocumentService): The document service instance.
         chat_service (ChatService): The chat service instance.
+        session_service (ChatSessionService): The chat session service instance.
+        qa_job_service (QAJobService): The QA job service instance.
+        rate_limiter (Optional[RateLimiter]): The per-user rate limiter,
+        if enabled.
 
     Returns:
         DocumentController: The document controller instance.
     """
-    return DocumentController(document_service, chat_service)
+    return DocumentController(
+        document_service, chat_service, session_service, qa_job_service,
+        rate_limiter
+    )
 
     
\ No newline at end of file
@@ -1,9 +1,15 @@
+from functools import lru_cache
+from typing import Optional
 from fastapi import Depends
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.repositories.users.users import UserRepository
 from app.repositories.users.tokens import TokenRepository
 from app.controllers.users.auth_controller import AuthController
+from app.core.config import get_settings
 from app.db.base import get_db
+from app.services.auth.rate_limiter import RateLimiter, build_rate_limiter
+from app.services.auth.revocation_poller import RevocationPoller, build_revocation_poller
+from app.services.auth.token_sweeper import TokenSweeper, build_token_sweeper
 
 
 def get_user_repo(
@@ -49,3 +55,34 @@ def get_auth_controller(
         AuthController: The authentication controller instance.
     """
     return AuthController(user_repo, token_repo)
+
+@lru_cache
+def get_token_sweeper() -> TokenSweeper:
+    """
+    Get the process-wide token sweeper.
+
+    Returns:
+        TokenSweeper: The token sweeper.
+    """
+    return build_token_sweeper(get_settings())
+
+@lru_cache
+def get_revocation_poller() -> RevocationPoller:
+    """
+    Get the process-wide poller of revoked access tokens.
+
+    Returns:
+        RevocationPoller: The revocation poller.
+    """
+    return build_revocation_poller(get_settings())
+
+@lru_cache
+def get_rate_limiter() -> Optional[RateLimiter]:
+    """
+    Get the process-wide per-user rate limiter.
+
+    Returns:
+        Optional[RateLimiter]: The rate limiter, or None if rate limiting
+        is disabled.
+    """
+    return build_rate_limiter(get_settings())
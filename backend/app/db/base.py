@@ -2,9 +2,19 @@ from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import declarative_base
 from app.core.config import get_settings
+from app.db.pool import engine_options
+from app.db.replicas import ReplicaSet
 
 settings = get_settings()
-engine = create_async_engine(settings.database_url)
+engine = create_async_engine(settings.database_url, **engine_options(settings))
+replicas = ReplicaSet(
+    [
+        create_async_engine(url, **engine_options(settings))
+        for url in settings.database_replica_urls
+    ],
+    max_lag=settings.db_replica_max_lag,
+    poll_interval=settings.db_replica_poll_interval
+)
 Base = declarative_base()
 
 
@@ -13,6 +23,15 @@ async def get_db():
         yield session
 
 
+async def get_read_db():
+    """
+    Yield a session for read-only queries, on a read replica within the
+    lag limit, or on the primary if there is none.
+    """
+    async with AsyncSession(replicas.pick() or engine) as session:
+        yield session
+
+
 @asynccontextmanager
 async def get_db_session():
     db_gen = get_db()
@@ -20,4 +39,14 @@ async def get_db_session():
     try:
         yield session
     finally:
-        await session.close()
\ No newline at end of file
+        await session.close()
+
+
+@asynccontextmanager
+async def get_read_db_session():
+    db_gen = get_read_db()
+    session = await db_gen.__anext__()
+    try:
+        yield session
+    finally:
+        await session.close()
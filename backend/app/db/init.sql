@@ -3,6 +3,7 @@ CREATE EXTENSION IF NOT EXISTS vector;
 
 -- Create custom ENUM type
 CREATE TYPE statusenum AS ENUM ('FAILED', 'SUCCESS', 'PROCESSING');
+CREATE TYPE qajobstatusenum AS ENUM ('PENDING', 'RUNNING', 'SUCCESS', 'FAILED');
 
 -- Create users table
 CREATE TABLE IF NOT EXISTS users (
@@ -20,8 +21,10 @@ CREATE TABLE IF NOT EXISTS token (
     user_id INTEGER NOT NULL REFERENCES users(id),
     access_token VARCHAR(450) UNIQUE NOT NULL,
     refresh_token VARCHAR(450) NOT NULL,
+    jti VARCHAR(32) UNIQUE,
     status BOOLEAN DEFAULT TRUE,
-    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    revoked_at TIMESTAMPTZ
 );
 
 -- Create documents table
@@ -38,15 +41,98 @@ CREATE TABLE IF NOT EXISTS documents (
 CREATE TABLE IF NOT EXISTS document_chunks (
     id SERIAL PRIMARY KEY,
     document_id INTEGER NOT NULL REFERENCES documents(id),
+    ordinal INTEGER,
     content TEXT NOT NULL,
+    token_count INTEGER,
     embedding vector(2048) NOT NULL
 );
 
+-- Create document_faqs table
+CREATE TABLE IF NOT EXISTS document_faqs (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    question TEXT NOT NULL,
+    answer TEXT NOT NULL,
+    sources TEXT[],
+    embedding vector(2048) NOT NULL
+);
+
+-- Create chat session tables
+CREATE TABLE IF NOT EXISTS chat_sessions (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    context_passages TEXT[],
+    context_tokens INTEGER,
+    summary TEXT,
+    summarized_through INTEGER,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+    id SERIAL PRIMARY KEY,
+    session_id INTEGER NOT NULL REFERENCES chat_sessions(id),
+    role VARCHAR(16) NOT NULL,
+    content TEXT NOT NULL,
+    context TEXT,
+    token_count INTEGER NOT NULL,
+    prompt_eval_count INTEGER,
+    prefill_ms DOUBLE PRECISION,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Create QA job tables
+CREATE TABLE IF NOT EXISTS qa_jobs (
+    id SERIAL PRIMARY KEY,
+    document_id INTEGER NOT NULL REFERENCES documents(id),
+    user_id INTEGER NOT NULL REFERENCES users(id),
+    status qajobstatusenum NOT NULL DEFAULT 'PENDING',
+    total INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS qa_job_answers (
+    id SERIAL PRIMARY KEY,
+    job_id INTEGER NOT NULL REFERENCES qa_jobs(id),
+    ordinal INTEGER NOT NULL,
+    question TEXT NOT NULL,
+    answer TEXT,
+    sources TEXT[],
+    error TEXT
+);
+
+-- Create rate_limit_buckets table
+CREATE TABLE IF NOT EXISTS rate_limit_buckets (
+    key VARCHAR(100) PRIMARY KEY,
+    tokens DOUBLE PRECISION NOT NULL,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
 -- Create indexes
 CREATE INDEX IF NOT EXISTS idx_token_user_status ON token(user_id, status);
+CREATE UNIQUE INDEX IF NOT EXISTS ix_token_refresh_token ON token(refresh_token);
+CREATE INDEX IF NOT EXISTS ix_token_created_at ON token(created_at);
+CREATE INDEX IF NOT EXISTS ix_token_revoked_at ON token(revoked_at);
 CREATE INDEX IF NOT EXISTS idx_document_user ON documents(user_id);
+CREATE INDEX IF NOT EXISTS ix_document_user_created_id ON documents(user_id, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_users_email ON users(email);
 CREATE INDEX IF NOT EXISTS idx_users_username ON users(username);
+CREATE INDEX IF NOT EXISTS ix_document_chunks_document_ordinal ON document_chunks(document_id, ordinal);
+-- pgvector cannot index vector(2048) directly; index a halfvec cast instead
+CREATE INDEX IF NOT EXISTS ix_document_chunks_embedding ON document_chunks
+    USING hnsw ((embedding::halfvec(2048)) halfvec_cosine_ops);
+CREATE INDEX IF NOT EXISTS ix_document_faqs_document ON document_faqs(document_id);
+CREATE INDEX IF NOT EXISTS ix_chat_sessions_user_document ON chat_sessions(user_id, document_id);
+CREATE INDEX IF NOT EXISTS ix_chat_messages_session ON chat_messages(session_id, id);
+CREATE INDEX IF NOT EXISTS ix_qa_jobs_user_document ON qa_jobs(user_id, document_id);
+CREATE INDEX IF NOT EXISTS ix_qa_job_answers_job_ordinal ON qa_job_answers(job_id, ordinal);
+
+-- deleted documents leave dead chunks in the heap and the HNSW index until
+-- they are vacuumed; vacuum once 2% of the chunks changed instead of 20%
+ALTER TABLE document_chunks SET (autovacuum_vacuum_scale_factor = 0.02);
 
 CREATE USER app_user WITH PASSWORD 'app_password';
 GRANT CONNECT ON DATABASE voiceai TO app_user;
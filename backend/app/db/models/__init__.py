@@ -1,2 +1,5 @@
 from .documents import *  # noqa: F403
-from .users import *  # noqa: F403
\ No newline at end of file
+from .users import *  # noqa: F403
+from .chat import *  # noqa: F403
+from .jobs import *  # noqa: F403
+from .rate_limits import *  # noqa: F403
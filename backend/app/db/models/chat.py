@@ -0,0 +1,65 @@
+from datetime import datetime, timezone
+from sqlalchemy import Column
+from sqlalchemy import Integer, Float
+from sqlalchemy import String, Text
+from sqlalchemy import DateTime
+from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy import ARRAY
+
+from app.db.base import Base
+
+
+class ChatSession(Base):
+    """
+    A multi-turn conversation about one document.
+
+    The context retrieved for the first question is pinned to the session
+    and sent unchanged with every later turn, so consecutive prompts share
+    a prefix. Turns older than ``summarized_through`` are replaced in the
+    prompt by ``summary``.
+    """
+    __tablename__ = "chat_sessions"
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    context_passages = Column(ARRAY(Text), nullable=True)
+    context_tokens = Column(Integer, nullable=True)
+    summary = Column(Text, nullable=True)
+    summarized_through = Column(Integer, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
+
+    __table_args__ = (
+        Index('ix_chat_sessions_user_document', 'user_id', 'document_id'),
+    )
+
+
+class ChatMessage(Base):
+    """
+    A question or answer in a chat session.
+
+    A follow-up question stores the passages sent along with it in
+    ``context``, so the prompt of the next turn can repeat it verbatim.
+    Answers record how long Ollama spent evaluating their prompt.
+    """
+    __tablename__ = "chat_messages"
+
+    id = Column(Integer, primary_key=True)
+    session_id = Column(Integer, ForeignKey("chat_sessions.id"), nullable=False)
+    role = Column(String(16), nullable=False)
+    content = Column(Text, nullable=False)
+    context = Column(Text, nullable=True)
+    token_count = Column(Integer, nullable=False)
+    prompt_eval_count = Column(Integer, nullable=True)
+    prefill_ms = Column(Float, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    __table_args__ = (
+        Index('ix_chat_messages_session', 'session_id', 'id'),
+    )
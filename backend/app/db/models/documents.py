@@ -1,17 +1,20 @@
 import enum
 from datetime import datetime, timezone
 from pgvector.sqlalchemy import Vector
-from sqlalchemy import Column
+from sqlalchemy import Column, text
 from sqlalchemy import Integer 
 from sqlalchemy import String, Text
 from sqlalchemy import DateTime
 from sqlalchemy import ForeignKey
 from sqlalchemy import Index
 from sqlalchemy import Enum
+from sqlalchemy import ARRAY
 from sqlalchemy.orm import relationship
 
 from app.db.base import Base
 
+EMBEDDING_DIMENSIONS = 2048
+
 
 class StatusEnum(enum.Enum):
     FAILED = "Failed"
@@ -28,17 +31,19 @@ class Document(Base):
     user_id = Column(Integer, ForeignKey("users.id"), index=True, nullable=False)
     user = relationship("User", back_populates="documents")
     status = Column(Enum(StatusEnum), nullable=True, default=StatusEnum.PROCESSING)
-    created_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc))
-    updated_at = Column(DateTime(timezone=True), default=datetime.now(timezone.utc))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    # Bumped whenever the row changes, including when processing finishes
+    # writing its chunks; cached answers are keyed on it.
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
     
     __table_args__ = (
         Index('ix_document_user', 'user_id'),
-        # Index(
-        #     'ix_document_embedding',
-        #     'embedding',
-        #     postgresql_using='ivfflat',
-        #     postgresql_ops={'embedding': 'vector_l2_ops'}
-        # ),
+        # keyset pagination of a user's documents, newest first
+        Index('ix_document_user_created_id', 'user_id', 'created_at', 'id'),
     )
 
 
@@ -46,5 +51,35 @@ class DocumentChunk(Base):
     __tablename__ = "document_chunks"
     id = Column(Integer, primary_key=True)
     document_id = Column(Integer, ForeignKey("documents.id"))
+    ordinal = Column(Integer, nullable=True)
     content = Column(Text)
-    embedding = Column(Vector(2048), nullable=False)
\ No newline at end of file
+    token_count = Column(Integer, nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
+
+    __table_args__ = (
+        Index('ix_document_chunks_document_ordinal', 'document_id', 'ordinal'),
+        # pgvector cannot index vectors over 2000 dimensions, so the HNSW
+        # index is built on a half-precision cast of the embedding.
+        Index(
+            'ix_document_chunks_embedding',
+            text(f'(embedding::halfvec({EMBEDDING_DIMENSIONS})) halfvec_cosine_ops'),
+            postgresql_using='hnsw'
+        ),
+    )
+
+
+class DocumentFAQ(Base):
+    """
+    An answer generated during ingestion for a common first question.
+    """
+    __tablename__ = "document_faqs"
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=False)
+    sources = Column(ARRAY(Text), nullable=True)
+    embedding = Column(Vector(EMBEDDING_DIMENSIONS), nullable=False)
+
+    __table_args__ = (
+        Index('ix_document_faqs_document', 'document_id'),
+    )
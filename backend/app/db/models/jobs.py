@@ -0,0 +1,65 @@
+import enum
+from datetime import datetime, timezone
+from sqlalchemy import Column
+from sqlalchemy import Integer
+from sqlalchemy import Text
+from sqlalchemy import DateTime
+from sqlalchemy import ForeignKey
+from sqlalchemy import Index
+from sqlalchemy import Enum
+from sqlalchemy import ARRAY
+
+from app.db.base import Base
+
+
+class QAJobStatusEnum(enum.Enum):
+    PENDING = "Pending"
+    RUNNING = "Running"
+    SUCCESS = "Success"
+    FAILED = "Failed"
+
+
+class QAJob(Base):
+    """
+    A batch of questions answered about one document in the background.
+    """
+    __tablename__ = "qa_jobs"
+
+    id = Column(Integer, primary_key=True)
+    document_id = Column(Integer, ForeignKey("documents.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    status = Column(Enum(QAJobStatusEnum), nullable=False, default=QAJobStatusEnum.PENDING)
+    total = Column(Integer, nullable=False)
+    completed = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+    updated_at = Column(
+        DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        onupdate=lambda: datetime.now(timezone.utc)
+    )
+
+    __table_args__ = (
+        Index('ix_qa_jobs_user_document', 'user_id', 'document_id'),
+    )
+
+
+class QAJobAnswer(Base):
+    """
+    A question of a QA job, with its answer once generated.
+
+    ``answer`` stays empty until the question is answered; ``error`` is
+    set instead when no answer could be generated.
+    """
+    __tablename__ = "qa_job_answers"
+
+    id = Column(Integer, primary_key=True)
+    job_id = Column(Integer, ForeignKey("qa_jobs.id"), nullable=False)
+    ordinal = Column(Integer, nullable=False)
+    question = Column(Text, nullable=False)
+    answer = Column(Text, nullable=True)
+    sources = Column(ARRAY(Text), nullable=True)
+    error = Column(Text, nullable=True)
+
+    __table_args__ = (
+        Index('ix_qa_job_answers_job_ordinal', 'job_id', 'ordinal'),
+    )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column
+from sqlalchemy import String
+from sqlalchemy import Float
+from sqlalchemy import DateTime
+from sqlalchemy import func
+
+from app.db.base import Base
+
+
+class RateLimitBucket(Base):
+    """
+    The token bucket of one user and resource, shared by all workers.
+
+    Attributes:
+        key (str): The resource and user, e.g. ``llm_tokens:42``.
+        tokens (float): The tokens left at ``updated_at``; negative while
+        the user pays off a cost charged after the fact.
+        updated_at (datetime): Database time of the last charge.
+    """
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String(100), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(DateTime(timezone=True), nullable=False, server_default=func.now())
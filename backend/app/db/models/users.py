@@ -42,8 +42,10 @@ class TokenTable(Base):
         user_id (int): ID of the user associated with the token.
         access_token (str): The JWT access token.
         refresh_token (str): The refresh token.
+        jti (str): The ID carried by the access token, if any.
         status (bool): True if token is active; False otherwise.
         created_at (datetime): Timestamp when the token was created.
+        revoked_at (datetime): Database time when the token was revoked.
     """
     __tablename__ = "token"
     
@@ -51,9 +53,17 @@ class TokenTable(Base):
     user_id = Column(Integer, index=True, nullable=False)
     access_token = Column(String(450), unique=True, index=True, nullable=False)
     refresh_token = Column(String(450), nullable=False)
+    jti = Column(String(32), unique=True, nullable=True)
     status = Column(Boolean, default=True, index=True)
     created_at = Column(DateTime, default=datetime.datetime.utcnow)
+    revoked_at = Column(DateTime(timezone=True), nullable=True)
     
     __table_args__ = (
         Index("ix_user_status", "user_id", "status"),
+        # refresh and logout look tokens up by refresh token
+        Index("ix_token_refresh_token", "refresh_token", unique=True),
+        # the sweeper deletes tokens by age
+        Index("ix_token_created_at", "created_at"),
+        # workers poll for revocations newer than the last one they saw
+        Index("ix_token_revoked_at", "revoked_at"),
     )
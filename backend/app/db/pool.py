@@ -0,0 +1,154 @@
+import time
+from functools import lru_cache
+from typing import Iterator
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily, Metric
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import Settings
+from app.utils.metrics import Histogram
+
+
+# checkout wait, in milliseconds
+WAIT_BUCKETS = [1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+
+
+class PoolMetrics:
+    """
+    Connection checkout wait times of the engine's pool.
+
+    Attributes:
+        wait_ms (Histogram): The time spent waiting for a connection.
+        checkouts (int): The connections handed out.
+        timeouts (int): The checkouts that gave up after ``pool_timeout``.
+    """
+
+    def __init__(self):
+        self.wait_ms = Histogram(WAIT_BUCKETS)
+        self.checkouts = 0
+        self.timeouts = 0
+
+    def observe(self, wait: float, timed_out: bool = False):
+        """
+        Record a checkout.
+
+        Args:
+            wait (float): The time spent waiting, in seconds.
+            timed_out (bool): Whether no connection became free in time.
+        """
+        self.wait_ms.observe(wait * 1000)
+        if timed_out:
+            self.timeouts += 1
+        else:
+            self.checkouts += 1
+
+    def stats(self, pool) -> dict:
+        """
+        Get the pool utilisation and the checkout wait times.
+
+        Args:
+            pool (AsyncAdaptedQueuePool): The engine's pool.
+
+        Returns:
+            dict: The pool size, the connections in use, idle and in
+            overflow, the share of the maximum in use, and the checkout
+            counts and wait-time histogram.
+        """
+        capacity = pool.size() + pool._max_overflow
+        in_use = pool.checkedout()
+        return {
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "in_use": in_use,
+            "idle": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "utilisation": in_use / capacity if capacity > 0 else 0.0,
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_ms": self.wait_ms.snapshot()
+        }
+
+    def collect(self, pool) -> Iterator[Metric]:
+        """
+        Export the same statistics for Prometheus, with the checkout wait
+        in seconds.
+
+        Args:
+            pool (AsyncAdaptedQueuePool): The engine's pool.
+
+        Yields:
+            Metric: The pool metric families.
+        """
+        yield GaugeMetricFamily("db_pool_size", "Connections kept in the pool.", value=pool.size())
+        yield GaugeMetricFamily("db_pool_in_use", "Connections checked out.", value=pool.checkedout())
+        yield GaugeMetricFamily("db_pool_idle", "Connections idle in the pool.", value=pool.checkedin())
+        yield GaugeMetricFamily(
+            "db_pool_overflow", "Connections open beyond the pool size.", value=max(pool.overflow(), 0)
+        )
+        yield CounterMetricFamily("db_pool_checkouts", "Connections checked out of the pool.", value=self.checkouts)
+        yield CounterMetricFamily(
+            "db_pool_timeouts", "Checkouts that timed out waiting for a connection.", value=self.timeouts
+        )
+        wait = HistogramMetricFamily("db_pool_wait_seconds", "Time spent waiting to check out a connection.")
+        self.wait_ms.add_to(wait, divisor=1000)
+        yield wait
+
+
+@lru_cache
+def get_pool_metrics() -> PoolMetrics:
+    """
+    Get the process-wide connection pool metrics.
+
+    Returns:
+        PoolMetrics: The pool metrics.
+    """
+    return PoolMetrics()
+
+
+class InstrumentedPool(AsyncAdaptedQueuePool):
+    """
+    The default async queue pool, timing how long each checkout waits.
+
+    SQLAlchemy's pool events only fire once a connection is handed out,
+    so the wait is measured around ``_do_get``, where the pool blocks
+    while every connection is in use.
+    """
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            get_pool_metrics().observe(time.perf_counter() - started, timed_out=True)
+            raise
+        get_pool_metrics().observe(time.perf_counter() - started)
+        return connection
+
+
+def engine_options(settings: Settings) -> dict:
+    """
+    Build the keyword arguments of create_async_engine from the settings.
+
+    asyncpg runs every statement as a prepared statement, and SQLAlchemy
+    keeps the prepared statements of each connection in an LRU cache
+    keyed by SQL text. Hot queries are built so their text does not vary
+    between calls, and the cache is sized so that they stay in it.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        dict: The pool and connection options.
+    """
+    return {
+        "poolclass": InstrumentedPool,
+        "pool_size": settings.db_pool_size,
+        "max_overflow": settings.db_max_overflow,
+        "pool_timeout": settings.db_pool_timeout,
+        "pool_recycle": settings.db_pool_recycle,
+        "pool_pre_ping": settings.db_pool_pre_ping,
+        "connect_args": {
+            "prepared_statement_cache_size": settings.db_statement_cache_size
+        },
+    }
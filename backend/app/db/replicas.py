@@ -0,0 +1,118 @@
+import asyncio
+import itertools
+import logging
+from typing import Dict, Iterator, List, Optional
+
+from prometheus_client.core import GaugeMetricFamily, Metric
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+
+logger = logging.getLogger(__name__)
+
+# zero once the replica has replayed everything it received, otherwise
+# the age of the last transaction it replayed
+REPLICATION_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+class ReplicaSet:
+    """
+    Read replicas of the primary, picked round-robin among those whose
+    replication lag is known and within ``max_lag``.
+
+    The lag of each replica is measured every ``poll_interval`` seconds.
+    A replica that cannot be reached, or lags further behind, is skipped
+    until it catches up; with no replica usable, reads go to the primary.
+
+    Attributes:
+        engines (List[AsyncEngine]): The replica engines.
+        max_lag (float): The largest lag a replica is used with, in seconds.
+        poll_interval (float): Seconds between lag measurements.
+        lag (Dict[int, Optional[float]]): The last measured lag of each
+            replica, by index; None if it could not be measured.
+    """
+
+    def __init__(self, engines: List[AsyncEngine], max_lag: float, poll_interval: float):
+        self.engines = engines
+        self.max_lag = max_lag
+        self.poll_interval = poll_interval
+        self.lag: Dict[int, Optional[float]] = {index: None for index in range(len(engines))}
+        self._turn = itertools.count()
+
+    def pick(self) -> Optional[AsyncEngine]:
+        """
+        Pick the replica for the next read.
+
+        Returns:
+            Optional[AsyncEngine]: A replica within the lag limit, or None
+            if reads should go to the primary.
+        """
+        usable = [
+            self.engines[index] for index, lag in self.lag.items()
+            if lag is not None and lag <= self.max_lag
+        ]
+        if not usable:
+            return None
+        return usable[next(self._turn) % len(usable)]
+
+    async def check(self):
+        """
+        Measure the replication lag of every replica.
+        """
+        async def measure(index: int, engine: AsyncEngine):
+            try:
+                async with engine.connect() as connection:
+                    lag = (await connection.execute(REPLICATION_LAG)).scalar()
+                self.lag[index] = float(lag) if lag is not None else None
+            except Exception as e:
+                if self.lag[index] is not None:
+                    logger.warning(f"Read replica {index} is unavailable: {e}")
+                self.lag[index] = None
+
+        await asyncio.gather(*(
+            measure(index, engine) for index, engine in enumerate(self.engines)
+        ))
+
+    async def run(self):
+        """
+        Measure the lag every ``poll_interval`` seconds until cancelled.
+        """
+        while True:
+            await self.check()
+            await asyncio.sleep(self.poll_interval)
+
+    def stats(self) -> dict:
+        """
+        Get the lag of each replica.
+
+        Returns:
+            dict: The lag limit and the last measured lag of each replica.
+        """
+        return {
+            "max_lag": self.max_lag,
+            "replicas": [
+                {"index": index, "lag": lag, "usable": lag is not None and lag <= self.max_lag}
+                for index, lag in self.lag.items()
+            ]
+        }
+
+    def collect(self) -> Iterator[Metric]:
+        """
+        Export the lag of each replica for Prometheus.
+
+        Yields:
+            Metric: The replica metric families, labelled by replica index.
+        """
+        lag = GaugeMetricFamily("db_replica_lag_seconds", "Last measured lag of the replica.", labels=["replica"])
+        usable = GaugeMetricFamily(
+            "db_replica_usable", "Whether reads are sent to the replica.", labels=["replica"]
+        )
+        for index, replica_lag in self.lag.items():
+            if replica_lag is not None:
+                lag.add_metric([str(index)], replica_lag)
+            usable.add_metric([str(index)], int(replica_lag is not None and replica_lag <= self.max_lag))
+        yield lag
+        yield usable
@@ -1,10 +1,11 @@
+import asyncio
 import logging
+from contextlib import asynccontextmanager, suppress
 from pathlib import Path
 from fastapi import FastAPI
 from fastapi_csrf_protect import CsrfProtect
 from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.responses import JSONResponse
 
 from slowapi import Limiter
@@ -12,15 +13,21 @@ from slowapi.middleware import SlowAPIMiddleware
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 
+from .api.health import router as health_router
+from .api.metrics import router as metrics_router
 from .api.v1.router import api_router
 from .core.config import (
     get_settings,
     get_csrf_settings
 )
+from .core.factory.documentfactory import get_model_warmer
+from .core.factory.userfactory import get_revocation_poller, get_token_sweeper
+from .db.base import replicas
 from .core.exceptions import (
     custom_exception_handler, CustomException,
     validation_exception_handler
 )
+from .middlewares.gzip import StreamingAwareGZipMiddleware
 from .middlewares.security_headers import SecurityHeadersMiddleware
 
 # from starlette.middleware.httpsredirect import HTTPSRedirectMiddleware
@@ -32,9 +39,32 @@ LOGS_DIR = BASE_DIR / "logs"
 LOGS_DIR.mkdir(parents=True, exist_ok=True) 
 
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm the Ollama models in the background and keep them loaded, keep
+    the revocation filter up to date, periodically delete expired
+    tokens and track the lag of the read replicas.
+    """
+    tasks = []
+    if replicas.engines:
+        tasks.append(asyncio.create_task(replicas.run()))
+    if settings.model_warmup_enabled:
+        tasks.append(asyncio.create_task(get_model_warmer().run()))
+    if settings.revocation_filter_enabled:
+        tasks.append(asyncio.create_task(get_revocation_poller().run()))
+    if settings.token_sweep_enabled:
+        tasks.append(asyncio.create_task(get_token_sweeper().run()))
+    yield
+    for task in tasks:
+        task.cancel()
+        with suppress(asyncio.CancelledError):
+            await task
+
+
 def create_app() -> FastAPI:
     """Initialize FastAPI application."""
-    app = FastAPI()
+    app = FastAPI(lifespan=lifespan)
     configure_logging()
     configure_cors(app)
     configure_middlewares(app)
@@ -83,7 +113,7 @@ def configure_cors(app: FastAPI):
 def configure_middlewares(app: FastAPI):
     """Configure additional security middlewares."""
     app.add_middleware(SecurityHeadersMiddleware)
-    app.add_middleware(GZipMiddleware, minimum_size=1000)
+    app.add_middleware(StreamingAwareGZipMiddleware, minimum_size=1000)
     # app.add_middleware(HTTPSRedirectMiddleware)
     
     
@@ -101,6 +131,9 @@ def configure_rate_limiter(app: FastAPI):
 def configure_routes(app: FastAPI):
     """Include API routes."""
     app.include_router(api_router, prefix="/api/v1")
+    app.include_router(health_router, tags=["health"])
+    if settings.metrics_enabled:
+        app.include_router(metrics_router, tags=["metrics"])
 
 
 def configure_exception_handlers(app: FastAPI):
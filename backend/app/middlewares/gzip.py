@@ -0,0 +1,33 @@
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, GZipResponder
+from starlette.types import Message, Receive, Scope, Send
+
+STREAMING_CONTENT_TYPES = ("text/event-stream",)
+
+
+class StreamingAwareGZipResponder(GZipResponder):
+    async def send_with_gzip(self, message: Message) -> None:
+        await super().send_with_gzip(message)
+        if message["type"] == "http.response.start":
+            content_type = Headers(raw=message["headers"]).get("content-type", "")
+            if content_type.startswith(STREAMING_CONTENT_TYPES):
+                # Pass event streams through untouched: compressing them
+                # would hold tokens back in the gzip buffer.
+                self.content_encoding_set = True
+
+
+class StreamingAwareGZipMiddleware(GZipMiddleware):
+    """
+    GZip middleware that leaves Server-Sent Event streams uncompressed.
+    """
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http":
+            headers = Headers(scope=scope)
+            if "gzip" in headers.get("Accept-Encoding", ""):
+                responder = StreamingAwareGZipResponder(
+                    self.app, self.minimum_size, compresslevel=self.compresslevel
+                )
+                await responder(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -0,0 +1,117 @@
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models.chat import ChatMessage, ChatSession
+from app.core.exceptions import NotFoundException
+
+
+class ChatSessionRepository:
+    """
+    Repository for chat session related operations
+    """
+
+    async def create(
+        self,
+        user_id: int,
+        document_id: int,
+        session: AsyncSession
+    ) -> ChatSession:
+        """
+        Create a new chat session
+
+        Args:
+            user_id (int): The user id
+            document_id (int): The document id
+            session (AsyncSession): The database session
+
+        Returns:
+            ChatSession: The created chat session
+        """
+        chat_session = ChatSession(user_id=user_id, document_id=document_id)
+        session.add(chat_session)
+        await session.commit()
+        await session.refresh(chat_session)
+        return chat_session
+
+    async def get(
+        self,
+        user_id: int,
+        document_id: int,
+        session_id: int,
+        session: AsyncSession
+    ) -> ChatSession:
+        """
+        Get a chat session of a user about a document
+
+        Args:
+            user_id (int): The user id
+            document_id (int): The document id
+            session_id (int): The chat session id
+            session (AsyncSession): The database session
+
+        Returns:
+            ChatSession: The chat session
+
+        Raises:
+            NotFoundException: If the user has no such session
+        """
+        query = select(ChatSession).where(
+            ChatSession.id == session_id,
+            ChatSession.user_id == user_id,
+            ChatSession.document_id == document_id
+        )
+        result = await session.execute(query)
+        chat_session = result.scalar_one_or_none()
+
+        if not chat_session:
+            raise NotFoundException(message="Chat session not found")
+
+        return chat_session
+
+    async def get_messages(
+        self,
+        session_id: int,
+        session: AsyncSession,
+        after_id: Optional[int] = None
+    ) -> list[ChatMessage]:
+        """
+        Get the messages of a chat session in the order they were sent
+
+        Args:
+            session_id (int): The chat session id
+            session (AsyncSession): The database session
+            after_id (int, optional): Only return messages after this one
+
+        Returns:
+            list[ChatMessage]: The messages, oldest first
+        """
+        query = select(ChatMessage).where(ChatMessage.session_id == session_id)
+        if after_id is not None:
+            query = query.where(ChatMessage.id > after_id)
+        result = await session.execute(query.order_by(ChatMessage.id))
+        return list(result.scalars().all())
+
+    async def add_turn(
+        self,
+        chat_session: ChatSession,
+        question: dict,
+        answer: dict,
+        session: AsyncSession
+    ) -> None:
+        """
+        Store a question and its answer, along with any change to the session
+
+        Args:
+            chat_session (ChatSession): The chat session
+            question (dict): The question message data
+            answer (dict): The answer message data
+            session (AsyncSession): The database session
+        """
+        session.add_all([
+            ChatMessage(session_id=chat_session.id, role="user", **question),
+            ChatMessage(session_id=chat_session.id, role="assistant", **answer)
+        ])
+        chat_session.updated_at = func.now()
+        session.add(chat_session)
+        await session.commit()
@@ -1,11 +1,177 @@
-from typing import List
+from datetime import datetime
+from typing import List, NamedTuple, Optional, Tuple
+from pgvector.sqlalchemy import HALFVEC
+from pgvector.utils import Vector
+from sqlalchemy import ARRAY, Row, Text, bindparam, cast, delete, func, true, tuple_
 from sqlalchemy.future import select
 from sqlalchemy.orm import load_only
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.models.documents import Document, DocumentChunk
+from app.db.models.chat import ChatMessage, ChatSession
+from app.db.models.documents import (
+    Document, DocumentChunk, DocumentFAQ, EMBEDDING_DIMENSIONS, StatusEnum
+)
+from app.db.models.jobs import QAJob, QAJobAnswer
 from app.core.exceptions import NotFoundException
 
 
+class ScoredChunk(NamedTuple):
+    """
+    A retrieved chunk with its cosine distance to the query.
+    """
+    id: int
+    content: str
+    distance: float
+    ordinal: Optional[int] = None
+    embedding: Optional[list] = None
+    token_count: Optional[int] = None
+
+
+class FAQAnswer(NamedTuple):
+    """
+    A precomputed answer with the cosine distance of its question to the
+    query.
+    """
+    question: str
+    response: str
+    sources: list
+    distance: float
+
+
+def nearest_chunks_query(
+    document_id: int,
+    query_embedding: list,
+    k: int,
+    threshold: Optional[float] = None,
+    include_embeddings: bool = False
+):
+    """
+    Build the k-nearest-chunks query for a document
+
+    Args:
+        document_id (int): The document id
+        query_embedding (list): The query embedding
+        k (int): The maximum number of results
+        threshold (float, optional): The maximum cosine distance
+        include_embeddings (bool): Also select the chunk embeddings
+
+    Returns:
+        Select: The query selecting id, ordinal, content, token count
+        and distance
+    """
+    distance = cast(DocumentChunk.embedding, HALFVEC(EMBEDDING_DIMENSIONS)).cosine_distance(
+        cast(query_embedding, HALFVEC(EMBEDDING_DIMENSIONS))
+    ).label("distance")
+    columns = [
+        DocumentChunk.id,
+        DocumentChunk.ordinal,
+        DocumentChunk.content,
+        DocumentChunk.token_count,
+        distance
+    ]
+    if include_embeddings:
+        columns.append(DocumentChunk.embedding)
+
+    nearest = select(*columns).where(
+                DocumentChunk.document_id == document_id
+            ).order_by(distance).limit(k).subquery()
+    query = select(nearest).order_by(nearest.c.distance)
+    if threshold is not None:
+        query = query.where(nearest.c.distance < threshold)
+    return query
+
+
+def batch_nearest_chunks_query(
+    document_id: int,
+    query_embeddings: list[list],
+    k: int,
+    threshold: Optional[float] = None
+):
+    """
+    Build one query running a k-nearest-chunks search per query embedding
+
+    The embeddings are passed as a single array and unnested with their
+    position; a LATERAL subquery runs the same ordered, limited search as
+    nearest_chunks_query for each of them.
+
+    Args:
+        document_id (int): The document id
+        query_embeddings (list[list]): The query embeddings
+        k (int): The maximum number of results per query
+        threshold (float, optional): The maximum cosine distance
+
+    Returns:
+        Select: The query selecting the query position and the chunk columns
+    """
+    queries = func.unnest(
+        bindparam(
+            "query_embeddings",
+            [Vector(embedding).to_text() for embedding in query_embeddings],
+            type_=ARRAY(Text)
+        )
+    ).table_valued("embedding", with_ordinality="query_index").render_derived(name="queries")
+
+    distance = cast(DocumentChunk.embedding, HALFVEC(EMBEDDING_DIMENSIONS)).cosine_distance(
+        cast(queries.c.embedding, HALFVEC(EMBEDDING_DIMENSIONS))
+    ).label("distance")
+    nearest = select(
+                DocumentChunk.id, DocumentChunk.ordinal, DocumentChunk.content, distance
+            ).where(
+                DocumentChunk.document_id == document_id
+            ).order_by(distance).limit(k).lateral("nearest")
+
+    query = select(
+                queries.c.query_index, nearest
+            ).select_from(
+                queries.join(nearest, true())
+            ).order_by(queries.c.query_index, nearest.c.distance)
+    if threshold is not None:
+        query = query.where(nearest.c.distance < threshold)
+    return query
+
+
+async def apply_search_settings(
+    session: AsyncSession,
+    k: int,
+    probes: Optional[int] = None,
+    ef_search: Optional[int] = None,
+    iterative_scan: Optional[str] = None,
+    statement_timeout_ms: Optional[int] = None
+):
+    """
+    Apply the vector index settings for the current search transaction
+
+    The HNSW index covers the chunks of every document, and the
+    document filter is applied to the rows it returns. Iterative scans
+    (pgvector 0.8+) keep scanning the index until enough rows pass the
+    filter, so a document whose chunks are not among the nearest in the
+    whole table still gets its k results.
+
+    Args:
+        session (AsyncSession): The database session
+        k (int): The number of results the search needs
+        probes (int, optional): The ivfflat.probes to use
+        ef_search (int, optional): The hnsw.ef_search to use, raised to k
+        iterative_scan (str, optional): The hnsw.iterative_scan mode,
+            e.g. "relaxed_order"
+        statement_timeout_ms (int, optional): The statement timeout for
+            the rest of the transaction, in milliseconds
+    """
+    knobs = {}
+    if probes is not None:
+        knobs["ivfflat.probes"] = probes
+    if ef_search is not None:
+        knobs["hnsw.ef_search"] = max(ef_search, k)
+    if iterative_scan is not None:
+        knobs["hnsw.iterative_scan"] = iterative_scan
+    if statement_timeout_ms is not None:
+        knobs["statement_timeout"] = f"{statement_timeout_ms}ms"
+    if knobs:
+        # one round trip for all of them
+        await session.execute(select(*(
+            func.set_config(name, str(value), True) for name, value in knobs.items()
+        )))
+
+
 class DocumentRepository:
     """
     Repository for document related operations
@@ -53,23 +219,184 @@ class DocumentRepository:
     async def get_documents_by_user(
         self, 
         user_id: int,
-        session: AsyncSession
-    ) -> list[Document]:
+        session: AsyncSession,
+        limit: int,
+        after: Optional[Tuple[datetime, int]] = None,
+        status: Optional[StatusEnum] = None
+    ) -> list[Row]:
         """
-        Get a list of all documents for the current user
+        Get a page of the user's documents, newest first
+
+        Only the listed columns are selected, and the page starts after
+        the (created_at, id) of the previous page's last row, so every
+        page is a range scan of ix_document_user_created_id.
 
         Args:
             user_id (int): The user id
             session (AsyncSession): The database session
+            limit (int): The maximum number of documents
+            after (Tuple[datetime, int], optional): The created_at and id
+                of the last document of the previous page
+            status (StatusEnum, optional): Only documents with this status
 
         Returns:
-            list[Document]: A list of documents for the current user
+            list[Row]: The id, file name, user id, status, created_at and
+            updated_at of the documents
         """
-        query = select(Document).where(Document.user_id == user_id)
+        query = select(
+            Document.id,
+            Document.file_name,
+            Document.user_id,
+            Document.status,
+            Document.created_at,
+            Document.updated_at
+        ).where(Document.user_id == user_id)
+        if status is not None:
+            query = query.where(Document.status == status)
+        if after is not None:
+            query = query.where(tuple_(Document.created_at, Document.id) < tuple_(*after))
+        query = query.order_by(Document.created_at.desc(), Document.id.desc()).limit(limit)
         result = await session.execute(query)
-        documents = result.scalars().all()
-        return documents
+        return result.all()
+
+    async def count_documents_by_user(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        status: Optional[StatusEnum] = None
+    ) -> int:
+        """
+        Count the user's documents
+
+        Args:
+            user_id (int): The user id
+            session (AsyncSession): The database session
+            status (StatusEnum, optional): Only documents with this status
+
+        Returns:
+            int: The number of documents
+        """
+        query = select(func.count()).select_from(Document).where(Document.user_id == user_id)
+        if status is not None:
+            query = query.where(Document.status == status)
+        result = await session.execute(query)
+        return result.scalar_one()
     
+    async def get_document_ids_by_user(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        document_ids: Optional[List[int]] = None
+    ) -> List[int]:
+        """
+        Get the ids of the user's documents
+
+        Args:
+            user_id (int): The user id
+            session (AsyncSession): The database session
+            document_ids (List[int], optional): Only those of these ids
+                that belong to the user
+
+        Returns:
+            List[int]: The document ids
+        """
+        query = select(Document.id).where(Document.user_id == user_id)
+        if document_ids is not None:
+            query = query.where(Document.id.in_(document_ids))
+        result = await session.execute(query.order_by(Document.id))
+        return list(result.scalars())
+
+    async def delete_chunks(
+        self,
+        document_ids: List[int],
+        batch_size: int,
+        session: AsyncSession
+    ) -> int:
+        """
+        Delete the chunks of documents, one batch per transaction
+
+        Each batch is looked up through ix_document_chunks_document_ordinal
+        and committed on its own, so the row locks and the WAL of a large
+        document are spread over many short transactions.
+
+        Args:
+            document_ids (List[int]): The document ids
+            batch_size (int): The maximum number of chunks per transaction
+            session (AsyncSession): The database session
+
+        Returns:
+            int: The number of chunks deleted
+        """
+        batch = select(DocumentChunk.id).where(
+            DocumentChunk.document_id.in_(document_ids)
+        ).limit(batch_size).scalar_subquery()
+        statement = delete(DocumentChunk).where(
+            DocumentChunk.id.in_(batch)
+        ).execution_options(synchronize_session=False)
+
+        deleted = 0
+        while True:
+            result = await session.execute(statement)
+            await session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
+
+    async def delete_documents(
+        self,
+        user_id: int,
+        document_ids: List[int],
+        session: AsyncSession
+    ) -> int:
+        """
+        Delete the user's documents with their answers, chat sessions and
+        QA jobs, in one transaction
+
+        The chunks are expected to be gone already (see delete_chunks);
+        any written since, by an ingestion still running, are deleted here.
+        Chat sessions and QA jobs are only ever created by the owner of
+        their document, so they are found through their
+        (user_id, document_id) indexes.
+
+        Args:
+            user_id (int): The user id
+            document_ids (List[int]): The document ids
+            session (AsyncSession): The database session
+
+        Returns:
+            int: The number of documents deleted
+        """
+        owned = select(Document.id).where(
+            Document.user_id == user_id,
+            Document.id.in_(document_ids)
+        )
+        chat_sessions = select(ChatSession.id).where(
+            ChatSession.user_id == user_id,
+            ChatSession.document_id.in_(document_ids)
+        )
+        jobs = select(QAJob.id).where(
+            QAJob.user_id == user_id,
+            QAJob.document_id.in_(document_ids)
+        )
+        statements = [
+            delete(ChatMessage).where(ChatMessage.session_id.in_(chat_sessions)),
+            delete(ChatSession).where(ChatSession.id.in_(chat_sessions)),
+            delete(QAJobAnswer).where(QAJobAnswer.job_id.in_(jobs)),
+            delete(QAJob).where(QAJob.id.in_(jobs)),
+            delete(DocumentFAQ).where(DocumentFAQ.document_id.in_(owned)),
+            delete(DocumentChunk).where(DocumentChunk.document_id.in_(owned)),
+        ]
+        for statement in statements:
+            await session.execute(statement.execution_options(synchronize_session=False))
+        result = await session.execute(
+            delete(Document).where(
+                Document.user_id == user_id,
+                Document.id.in_(document_ids)
+            ).execution_options(synchronize_session=False)
+        )
+        await session.commit()
+        return result.rowcount
+
     async def get_document_by_user_and_id(
         self, 
         user_id: int,
@@ -89,7 +416,7 @@ class DocumentRepository:
         """
         result = await session.execute(
             select(Document)
-            .options(load_only(Document.id, Document.status))
+            .options(load_only(Document.id, Document.status, Document.updated_at))
             .where(
                 Document.id == document_id,
                 Document.user_id == user_id
@@ -102,6 +429,111 @@ class DocumentRepository:
             
         return document
     
+    async def search_chunks(
+        self,
+        document_id: int,
+        query_embedding: list,
+        session: AsyncSession,
+        k: int = 5,
+        threshold: Optional[float] = None,
+        probes: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        include_embeddings: bool = False,
+        iterative_scan: Optional[str] = None,
+        statement_timeout_ms: Optional[int] = None,
+    ) -> list[ScoredChunk]:
+        """
+        Find the chunks of a document nearest to a query, with their scores
+
+        The distance is evaluated once per row: the inner query orders by
+        it and applies the limit, which lets pgvector serve it from the
+        HNSW index, and the threshold is applied to the k nearest rows
+        afterwards.
+
+        Args:
+            document_id (int): The document id
+            query_embedding (list): The query embedding
+            session (AsyncSession): The database session
+            k (int): The maximum number of results
+            threshold (float, optional): The maximum cosine distance
+            probes (int, optional): The ivfflat.probes to use for this search
+            ef_search (int, optional): The hnsw.ef_search to use for this search
+            include_embeddings (bool): Also return the chunk embeddings
+            iterative_scan (str, optional): The hnsw.iterative_scan mode
+            statement_timeout_ms (int, optional): The statement timeout for
+                the search, in milliseconds
+
+        Returns:
+            list[ScoredChunk]: The nearest chunks, closest first
+        """
+        await apply_search_settings(
+            session, k, probes, ef_search, iterative_scan, statement_timeout_ms
+        )
+
+        query = nearest_chunks_query(
+            document_id, query_embedding, k, threshold, include_embeddings
+        )
+        result = await session.execute(query)
+        return [
+            ScoredChunk(
+                id=row.id,
+                content=row.content,
+                distance=row.distance,
+                ordinal=row.ordinal,
+                embedding=row.embedding if include_embeddings else None,
+                token_count=row.token_count
+            )
+            for row in result
+        ]
+
+    async def search_chunks_batch(
+        self,
+        document_id: int,
+        query_embeddings: list[list],
+        session: AsyncSession,
+        k: int = 5,
+        threshold: Optional[float] = None,
+        probes: Optional[int] = None,
+        ef_search: Optional[int] = None,
+        iterative_scan: Optional[str] = None,
+    ) -> list[list[ScoredChunk]]:
+        """
+        Run a nearest-chunks search for several queries in one statement
+
+        Args:
+            document_id (int): The document id
+            query_embeddings (list[list]): The query embeddings
+            session (AsyncSession): The database session
+            k (int): The maximum number of results per query
+            threshold (float, optional): The maximum cosine distance
+            probes (int, optional): The ivfflat.probes to use for this search
+            ef_search (int, optional): The hnsw.ef_search to use for this search
+            iterative_scan (str, optional): The hnsw.iterative_scan mode
+
+        Returns:
+            list[list[ScoredChunk]]: The nearest chunks of each query, in
+            the order of the query embeddings
+        """
+        await apply_search_settings(session, k, probes, ef_search, iterative_scan)
+
+        results: list[list[ScoredChunk]] = [[] for _ in query_embeddings]
+        if not query_embeddings:
+            return results
+
+        result = await session.execute(
+            batch_nearest_chunks_query(document_id, query_embeddings, k, threshold)
+        )
+        for row in result:
+            results[row.query_index - 1].append(
+                ScoredChunk(
+                    id=row.id,
+                    content=row.content,
+                    distance=row.distance,
+                    ordinal=row.ordinal
+                )
+            )
+        return results
+
     async def find_similar_content(
         self,
         document_id: int,
@@ -123,15 +555,90 @@ class DocumentRepository:
         Returns:
             list[str]: A list of similar content
         """
-        query = select(DocumentChunk.content).where(
-                    DocumentChunk.document_id == document_id,
-                    DocumentChunk.embedding.cosine_distance(
-                        query_embedding
-                    ) < threshold
-                ).order_by(
-                    DocumentChunk.embedding.cosine_distance(
-                        query_embedding
-                        )
-                ).limit(limit)
-        result = await session.execute(query)
-        return result.scalars().all()
+        chunks = await self.search_chunks(
+            document_id=document_id,
+            query_embedding=query_embedding,
+            session=session,
+            k=limit,
+            threshold=threshold
+        )
+        return [chunk.content for chunk in chunks]
+
+    async def get_chunks_by_ordinals(
+        self,
+        document_id: int,
+        ordinals: list[int],
+        session: AsyncSession,
+    ) -> dict[int, str]:
+        """
+        Get the content of several chunks of a document by ordinal
+
+        Args:
+            document_id (int): The document id
+            ordinals (list[int]): The chunk ordinals
+            session (AsyncSession): The database session
+
+        Returns:
+            dict[int, str]: The chunk content keyed by ordinal
+        """
+        if not ordinals:
+            return {}
+        result = await session.execute(
+            select(DocumentChunk.ordinal, DocumentChunk.content).where(
+                DocumentChunk.document_id == document_id,
+                DocumentChunk.ordinal.in_(ordinals)
+            )
+        )
+        return {row.ordinal: row.content for row in result}
+
+    async def bulk_create_faqs(self, faqs: List[dict], session: AsyncSession):
+        """
+        Store the precomputed answers of a document
+
+        Args:
+            faqs (List[dict]): The document id, question, answer, sources
+                and question embedding of each answer
+            session (AsyncSession): The database session
+        """
+        session.add_all([DocumentFAQ(**faq) for faq in faqs])
+        await session.commit()
+
+    async def find_faq_answer(
+        self,
+        document_id: int,
+        query_embedding: list,
+        max_distance: float,
+        session: AsyncSession
+    ) -> Optional[FAQAnswer]:
+        """
+        Find the precomputed answer whose question is closest to a query
+
+        A document only has a handful of precomputed answers, so they are
+        compared exhaustively without a vector index.
+
+        Args:
+            document_id (int): The document id
+            query_embedding (list): The query embedding
+            max_distance (float): The maximum cosine distance
+            session (AsyncSession): The database session
+
+        Returns:
+            Optional[FAQAnswer]: The closest answer, or None if no
+            question is close enough
+        """
+        distance = DocumentFAQ.embedding.cosine_distance(query_embedding).label("distance")
+        result = await session.execute(
+            select(DocumentFAQ.question, DocumentFAQ.answer, DocumentFAQ.sources, distance)
+            .where(DocumentFAQ.document_id == document_id)
+            .order_by(distance)
+            .limit(1)
+        )
+        row = result.first()
+        if row is None or row.distance > max_distance:
+            return None
+        return FAQAnswer(
+            question=row.question,
+            response=row.answer,
+            sources=row.sources or [],
+            distance=row.distance
+        )
@@ -0,0 +1,156 @@
+from typing import List, Optional
+from sqlalchemy import update
+from sqlalchemy.future import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models.jobs import QAJob, QAJobAnswer, QAJobStatusEnum
+from app.core.exceptions import NotFoundException
+
+
+class QAJobRepository:
+    """
+    Repository for question-answering job related operations
+    """
+
+    async def create(
+        self,
+        user_id: int,
+        document_id: int,
+        questions: List[str],
+        session: AsyncSession
+    ) -> QAJob:
+        """
+        Create a new QA job with its questions
+
+        Args:
+            user_id (int): The user id
+            document_id (int): The document id
+            questions (List[str]): The questions, in order
+            session (AsyncSession): The database session
+
+        Returns:
+            QAJob: The created job
+        """
+        job = QAJob(
+            user_id=user_id,
+            document_id=document_id,
+            status=QAJobStatusEnum.PENDING,
+            total=len(questions),
+            completed=0
+        )
+        session.add(job)
+        await session.flush()
+        session.add_all([
+            QAJobAnswer(job_id=job.id, ordinal=ordinal, question=question)
+            for ordinal, question in enumerate(questions)
+        ])
+        await session.commit()
+        await session.refresh(job)
+        return job
+
+    async def get(
+        self,
+        job_id: int,
+        session: AsyncSession,
+        user_id: Optional[int] = None,
+        document_id: Optional[int] = None
+    ) -> QAJob:
+        """
+        Get a QA job, optionally only if it belongs to a user and document
+
+        Args:
+            job_id (int): The job id
+            session (AsyncSession): The database session
+            user_id (int, optional): The user the job must belong to
+            document_id (int, optional): The document the job must be about
+
+        Returns:
+            QAJob: The job
+
+        Raises:
+            NotFoundException: If there is no such job
+        """
+        query = select(QAJob).where(QAJob.id == job_id)
+        if user_id is not None:
+            query = query.where(QAJob.user_id == user_id)
+        if document_id is not None:
+            query = query.where(QAJob.document_id == document_id)
+        result = await session.execute(query)
+        job = result.scalar_one_or_none()
+
+        if not job:
+            raise NotFoundException(message="QA job not found")
+
+        return job
+
+    async def get_answers(
+        self,
+        job_id: int,
+        session: AsyncSession
+    ) -> list[QAJobAnswer]:
+        """
+        Get the questions of a QA job and their answers so far
+
+        Args:
+            job_id (int): The job id
+            session (AsyncSession): The database session
+
+        Returns:
+            list[QAJobAnswer]: The questions, in the order they were sent
+        """
+        result = await session.execute(
+            select(QAJobAnswer)
+            .where(QAJobAnswer.job_id == job_id)
+            .order_by(QAJobAnswer.ordinal)
+        )
+        return list(result.scalars().all())
+
+    async def set_status(
+        self,
+        job_id: int,
+        status: QAJobStatusEnum,
+        session: AsyncSession
+    ) -> None:
+        """
+        Update the status of a QA job
+
+        Args:
+            job_id (int): The job id
+            status (QAJobStatusEnum): The new status
+            session (AsyncSession): The database session
+        """
+        await session.execute(
+            update(QAJob).where(QAJob.id == job_id).values(status=status)
+        )
+        await session.commit()
+
+    async def save_answer(
+        self,
+        job_id: int,
+        ordinal: int,
+        session: AsyncSession,
+        answer: Optional[str] = None,
+        sources: Optional[List[str]] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Store the answer to a question of a QA job and count it as completed
+
+        Args:
+            job_id (int): The job id
+            ordinal (int): The position of the question in the job
+            session (AsyncSession): The database session
+            answer (str, optional): The answer
+            sources (List[str], optional): The sources shown with the answer
+            error (str, optional): Why no answer could be generated
+        """
+        await session.execute(
+            update(QAJobAnswer)
+            .where(QAJobAnswer.job_id == job_id, QAJobAnswer.ordinal == ordinal)
+            .values(answer=answer, sources=sources, error=error)
+        )
+        await session.execute(
+            update(QAJob)
+            .where(QAJob.id == job_id)
+            .values(completed=QAJob.completed + 1)
+        )
+        await session.commit()
@@ -0,0 +1,83 @@
+from typing import Optional
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.db.models.rate_limits import RateLimitBucket
+
+
+class RateLimitRepository:
+    """
+    Repository for rate limit bucket related operations
+    """
+
+    @staticmethod
+    def _refilled(capacity: float, refill_rate: float):
+        elapsed = func.extract("epoch", func.now() - RateLimitBucket.updated_at)
+        return func.least(capacity, RateLimitBucket.tokens + elapsed * refill_rate)
+
+    async def take(
+        self,
+        key: str,
+        cost: float,
+        capacity: float,
+        refill_rate: float,
+        session: AsyncSession,
+        force: bool = False
+    ) -> Optional[float]:
+        """
+        Take tokens from a bucket in one atomic statement
+
+        The bucket is refilled for the time since its last charge, and
+        created full if it does not exist yet.
+
+        Args:
+            key (str): The bucket key
+            cost (float): The tokens to take
+            capacity (float): The maximum tokens in the bucket
+            refill_rate (float): The tokens added per second
+            session (AsyncSession): The database session
+            force (bool): Take the tokens even if the bucket runs into debt;
+            a negative cost gives tokens back, up to the capacity
+
+        Returns:
+            Optional[float]: The tokens left, or None if there were not
+            enough
+        """
+        refilled = self._refilled(capacity, refill_rate)
+        stmt = insert(RateLimitBucket).values(
+            key=key, tokens=min(capacity, capacity - cost), updated_at=func.now()
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[RateLimitBucket.key],
+            set_={"tokens": func.least(capacity, refilled - cost), "updated_at": func.now()},
+            where=None if force else refilled >= cost
+        ).returning(RateLimitBucket.tokens)
+        result = await session.execute(stmt)
+        await session.commit()
+        return result.scalar_one_or_none()
+
+    async def level(
+        self,
+        key: str,
+        capacity: float,
+        refill_rate: float,
+        session: AsyncSession
+    ) -> float:
+        """
+        Get the tokens currently in a bucket
+
+        Args:
+            key (str): The bucket key
+            capacity (float): The maximum tokens in the bucket
+            refill_rate (float): The tokens added per second
+            session (AsyncSession): The database session
+
+        Returns:
+            float: The tokens in the bucket, capacity if it does not exist
+        """
+        result = await session.execute(
+            select(self._refilled(capacity, refill_rate)).where(RateLimitBucket.key == key)
+        )
+        level = result.scalar_one_or_none()
+        return capacity if level is None else float(level)
@@ -1,7 +1,11 @@
+from datetime import datetime
+from typing import List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import update
+from sqlalchemy import and_, delete, func, or_, update
 from app.db.models.users import TokenTable
+from app.services.auth.revocation import get_revocation_filter
+from app.services.auth.token_cache import get_token_cache
 
 class TokenRepository:
     """
@@ -37,20 +41,45 @@ class TokenRepository:
         )
         return result.scalars().first()
 
+    async def is_active(self, jti: str) -> bool:
+        """
+        Check whether the access token with the given ID is active
+
+        Args:
+            jti (str): The ID of the access token
+
+        Returns:
+            bool: True if the token exists and is not revoked
+        """
+        result = await self.session.execute(
+            select(TokenTable.id).filter(TokenTable.jti == jti, TokenTable.status)
+        )
+        return result.first() is not None
+
     async def invalidate_all_tokens(
         self, user_id: int
     ) -> None:
         """
         Invalidate all tokens for the given user
 
+        The user's access tokens are also dropped from the token cache and
+        added to the revocation filter of this process.
+
         Args:
             user_id (int): The user id
         """
         stmt = update(TokenTable).filter(
-            TokenTable.user_id == user_id
-        ).values(status=False)
-        await self.session.execute(stmt)
+            TokenTable.user_id == user_id,
+            TokenTable.status
+        ).values(status=False, revoked_at=func.now()).returning(TokenTable.jti)
+        result = await self.session.execute(stmt)
+        jtis = result.scalars().all()
         await self.session.commit()
+        get_token_cache().invalidate_user(user_id)
+        revocations = get_revocation_filter()
+        for jti in jtis:
+            if jti:
+                revocations.add(jti)
 
     async def invalidate_token(
         self, refresh_token: str
@@ -58,11 +87,91 @@ class TokenRepository:
         """
         Invalidate the given token
 
+        The matching access tokens are also dropped from the token cache
+        and added to the revocation filter of this process.
+
         Args:
             refresh_token (str): The refresh token
         """
         stmt = update(TokenTable).filter(
-            TokenTable.refresh_token == refresh_token
-        ).values(status=False)
-        await self.session.execute(stmt)
+            TokenTable.refresh_token == refresh_token,
+            TokenTable.status
+        ).values(status=False, revoked_at=func.now()).returning(
+            TokenTable.access_token, TokenTable.jti
+        )
+        result = await self.session.execute(stmt)
+        revoked = result.all()
         await self.session.commit()
+        token_cache = get_token_cache()
+        revocations = get_revocation_filter()
+        for access_token, jti in revoked:
+            token_cache.invalidate(access_token)
+            if jti:
+                revocations.add(jti)
+
+    async def get_revoked_jtis(
+        self, since: Optional[datetime] = None
+    ) -> List[Tuple[str, datetime]]:
+        """
+        Get the IDs of revoked access tokens that are still stored
+
+        Args:
+            since (datetime, optional): Only tokens revoked after this
+                database time
+
+        Returns:
+            List[Tuple[str, datetime]]: The token IDs with their revocation
+            time
+        """
+        query = select(TokenTable.jti, TokenTable.revoked_at).filter(
+            TokenTable.status.is_(False),
+            TokenTable.jti.is_not(None),
+            TokenTable.revoked_at.is_not(None)
+        )
+        if since is not None:
+            query = query.filter(TokenTable.revoked_at > since)
+        result = await self.session.execute(query)
+        return [tuple(row) for row in result.all()]
+
+    async def delete_expired(
+        self, expired_before: datetime, revoked_before: datetime,
+        batch_size: int
+    ) -> int:
+        """
+        Delete one batch of expired tokens
+
+        A revoked row is kept until its access token has expired, since
+        other workers learn about the revocation from it; after that the
+        token is rejected whether or not its row exists.
+
+        Args:
+            expired_before (datetime): Tokens created before this time
+                have expired
+            revoked_before (datetime): Revoked tokens created before this
+                time have an expired access token
+            batch_size (int): The maximum number of rows to delete
+
+        Returns:
+            int: The number of deleted rows
+        """
+        batch = select(TokenTable.id).where(
+            or_(
+                and_(TokenTable.status.is_(False), TokenTable.created_at < revoked_before),
+                TokenTable.created_at < expired_before
+            )
+        ).limit(batch_size)
+        result = await self.session.execute(
+            delete(TokenTable).where(TokenTable.id.in_(batch.scalar_subquery()))
+        )
+        await self.session.commit()
+        return result.rowcount
+
+    async def count(self) -> int:
+        """
+        Count the stored tokens
+
+        Returns:
+            int: The number of rows in the token table
+        """
+        result = await self.session.execute(select(func.count(TokenTable.id)))
+        return result.scalar_one()
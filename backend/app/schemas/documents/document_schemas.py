@@ -1,6 +1,8 @@
 from datetime import datetime
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+
+from app.db.models.jobs import QAJobStatusEnum
 
 
 class DocumentOut(BaseModel):
@@ -15,10 +17,128 @@ class DocumentOut(BaseModel):
         from_attributes = True
 
 
+class DocumentPage(BaseModel):
+    items: List[DocumentOut]
+    total: int
+    next_cursor: Optional[str] = None
+
+
+class DocumentDeleteRequest(BaseModel):
+    document_ids: List[int] = Field(..., min_length=1, max_length=500)
+
+
+class DocumentDeleteResponse(BaseModel):
+    deleted: int
+
+
 class ChatRequest(BaseModel):
     query: str
+    stream: bool = False
+    mode: Literal["generative", "extractive"] = "generative"
+
+
+class Highlight(BaseModel):
+    passage: int
+    start: int
+    end: int
+    text: str
+    score: float
 
 
 class ChatResponse(BaseModel):
     response: str
     sources: Optional[List[str]] = None
+    cached: bool = False
+    mode: str = "generative"
+    highlights: Optional[List[Highlight]] = None
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1, max_length=100)
+    k: int = Field(5, ge=1, le=50)
+    threshold: Optional[float] = Field(None, gt=0, le=2)
+
+
+class SearchHit(BaseModel):
+    chunk_id: int
+    content: str
+    distance: float
+
+
+class SearchResult(BaseModel):
+    query: str
+    hits: List[SearchHit]
+
+
+class BatchSearchResponse(BaseModel):
+    results: List[SearchResult]
+
+
+class ChatSessionOut(BaseModel):
+    id: int
+    document_id: int
+    summary: Optional[str] = None
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ChatMessageOut(BaseModel):
+    id: int
+    role: str
+    content: str
+    prompt_eval_count: Optional[int] = None
+    prefill_ms: Optional[float] = None
+    created_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class ChatSessionDetail(ChatSessionOut):
+    messages: List[ChatMessageOut]
+
+
+class SessionChatRequest(BaseModel):
+    query: str
+
+
+class SessionChatResponse(ChatResponse):
+    follow_up: bool
+    compacted: bool = False
+    prompt_eval_count: Optional[int] = None
+    prefill_ms: Optional[float] = None
+
+
+class QAJobRequest(BaseModel):
+    questions: List[str] = Field(..., min_length=1, max_length=200)
+
+
+class QAJobOut(BaseModel):
+    id: int
+    document_id: int
+    status: QAJobStatusEnum
+    total: int
+    completed: int
+    created_at: datetime
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+
+
+class QAJobAnswerOut(BaseModel):
+    ordinal: int
+    question: str
+    answer: Optional[str] = None
+    sources: Optional[List[str]] = None
+    error: Optional[str] = None
+
+    class Config:
+        from_attributes = True
+
+
+class QAJobDetail(QAJobOut):
+    answers: List[QAJobAnswerOut]
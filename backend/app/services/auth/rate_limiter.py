@@ -0,0 +1,253 @@
+import math
+import time
+import logging
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from app.core.config import Settings
+from app.core.exceptions import TooManyRequestsException
+from app.db.base import get_db_session
+from app.repositories.users.rate_limits import RateLimitRepository
+from app.utils.tokens import estimate_tokens
+
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_BYTES = "upload_bytes"
+EMBEDDING_CHUNKS = "embedding_chunks"
+LLM_TOKENS = "llm_tokens"
+
+
+@dataclass
+class BucketLimit:
+    """
+    The size and refill rate of a token bucket.
+
+    Attributes:
+        capacity (float): The largest burst, in units of the resource.
+        refill_rate (float): The units added back per second.
+    """
+    capacity: float
+    refill_rate: float
+
+
+class MemoryRateLimitStore:
+    """
+    Token buckets held in this process.
+
+    Stands in for PostgresRateLimitStore in tests and single-worker
+    setups; limits are not shared between workers.
+    """
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(
+        self, key: str, cost: float, limit: BucketLimit, force: bool = False
+    ) -> float:
+        """
+        Take tokens from a bucket.
+
+        Args:
+            key (str): The bucket key.
+            cost (float): The tokens to take.
+            limit (BucketLimit): The bucket size and refill rate.
+            force (bool): Take the tokens even if the bucket runs into debt.
+            A negative cost gives tokens back, up to the capacity.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds until
+            enough are available.
+        """
+        now = time.monotonic()
+        tokens, updated_at = self._buckets.get(key, (limit.capacity, now))
+        tokens = min(limit.capacity, tokens + (now - updated_at) * limit.refill_rate)
+        if not force and tokens < cost:
+            self._buckets[key] = (tokens, now)
+            return (cost - tokens) / limit.refill_rate
+        self._buckets[key] = (min(limit.capacity, tokens - cost), now)
+        return 0.0
+
+
+class PostgresRateLimitStore:
+    """
+    Token buckets in the rate_limit_buckets table, shared by all workers.
+
+    Each charge is a single upsert that refills and debits the bucket
+    atomically, on a short session of its own so it never joins the
+    transaction of the request.
+
+    Attributes:
+        repository (RateLimitRepository): The rate limit repository.
+    """
+
+    def __init__(self, repository: RateLimitRepository):
+        self.repository = repository
+
+    async def take(
+        self, key: str, cost: float, limit: BucketLimit, force: bool = False
+    ) -> float:
+        """
+        Take tokens from a bucket.
+
+        Args:
+            key (str): The bucket key.
+            cost (float): The tokens to take.
+            limit (BucketLimit): The bucket size and refill rate.
+            force (bool): Take the tokens even if the bucket runs into debt.
+            A negative cost gives tokens back, up to the capacity.
+
+        Returns:
+            float: 0 if the tokens were taken, otherwise the seconds until
+            enough are available.
+        """
+        async with get_db_session() as session:
+            left = await self.repository.take(
+                key, cost, limit.capacity, limit.refill_rate, session, force=force
+            )
+            if left is not None:
+                return 0.0
+            level = await self.repository.level(
+                key, limit.capacity, limit.refill_rate, session
+            )
+        return max(cost - level, 0.0) / limit.refill_rate
+
+
+class RateLimiter:
+    """
+    Per-user token buckets charged by the estimated cost of a request.
+
+    Each resource has its own bucket per user: bytes uploaded, chunks
+    embedded and LLM tokens (prompt plus completion). A request is
+    refused with a 429 when its bucket cannot cover the cost. Costs only
+    known after the request was accepted, like the chunks of an upload,
+    are charged afterwards and may put the bucket into debt, which
+    delays the user's next request instead. Chats reserve their estimated
+    tokens and are settled to the tokens the model reported, so answers
+    that skip the model cost nothing.
+
+    Attributes:
+        store: The bucket store, memory or Postgres.
+        limits (Dict[str, BucketLimit]): The bucket of each resource.
+        chat_overhead_tokens (int): The tokens of a chat request besides
+            the question: the retrieved context and the answer.
+    """
+
+    def __init__(self, store, limits: Dict[str, BucketLimit], chat_overhead_tokens: int):
+        self.store = store
+        self.limits = limits
+        self.chat_overhead_tokens = chat_overhead_tokens
+
+    async def acquire(self, user_id: int, resource: str, cost: float) -> float:
+        """
+        Charge a request up front, refusing it if the bucket is short.
+
+        A cost larger than the bucket is capped at its capacity, so the
+        request can still pass once the bucket is full.
+
+        Args:
+            user_id (int): The user id.
+            resource (str): The resource.
+            cost (float): The estimated cost.
+
+        Returns:
+            float: The cost charged.
+
+        Raises:
+            TooManyRequestsException: If the bucket cannot cover the cost.
+        """
+        limit = self.limits[resource]
+        cost = min(cost, limit.capacity)
+        wait = await self.store.take(f"{resource}:{user_id}", cost, limit)
+        if wait > 0:
+            logger.info(f"Rate limited user {user_id} on {resource} for {wait:.1f}s")
+            raise TooManyRequestsException(
+                message=f"Rate limit exceeded for {resource.replace('_', ' ')}",
+                retry_after=math.ceil(wait)
+            )
+        return cost
+
+    async def charge(self, user_id: int, resource: str, cost: float):
+        """
+        Charge a cost that was only known after the request was accepted.
+
+        Args:
+            user_id (int): The user id.
+            resource (str): The resource.
+            cost (float): The actual cost.
+        """
+        if cost > 0:
+            await self.store.take(
+                f"{resource}:{user_id}", cost, self.limits[resource], force=True
+            )
+
+    async def settle(self, user_id: int, resource: str, charged: float, cost: float):
+        """
+        Replace an up-front charge by the actual cost, giving back what
+        was overcharged or charging the rest.
+
+        Args:
+            user_id (int): The user id.
+            resource (str): The resource.
+            charged (float): The cost charged up front.
+            cost (float): The actual cost.
+        """
+        if cost != charged:
+            await self.store.take(
+                f"{resource}:{user_id}", cost - charged, self.limits[resource], force=True
+            )
+
+    async def acquire_chat(self, user_id: int, question: str, questions: int = 1) -> float:
+        """
+        Charge the estimated LLM tokens of one or more chat requests.
+
+        The estimate is only a reservation: once the request is answered,
+        settle it against the tokens the model reported.
+
+        Args:
+            user_id (int): The user id.
+            question (str): The question, or all questions of a batch.
+            questions (int): The number of questions.
+
+        Returns:
+            float: The tokens charged.
+
+        Raises:
+            TooManyRequestsException: If the bucket cannot cover the cost.
+        """
+        cost = estimate_tokens(question) + questions * self.chat_overhead_tokens
+        return await self.acquire(user_id, LLM_TOKENS, cost)
+
+
+def build_rate_limiter(settings: Settings) -> Optional[RateLimiter]:
+    """
+    Build the rate limiter from the settings.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        Optional[RateLimiter]: The rate limiter, or None if rate limiting
+        is disabled.
+    """
+    if not settings.user_rate_limit_enabled:
+        return None
+    if settings.user_rate_limit_store == "memory":
+        store = MemoryRateLimitStore()
+    else:
+        store = PostgresRateLimitStore(RateLimitRepository())
+    return RateLimiter(
+        store=store,
+        limits={
+            UPLOAD_BYTES: BucketLimit(
+                settings.upload_bytes_burst, settings.upload_bytes_per_hour / 3600
+            ),
+            EMBEDDING_CHUNKS: BucketLimit(
+                settings.embedding_chunks_burst, settings.embedding_chunks_per_hour / 3600
+            ),
+            LLM_TOKENS: BucketLimit(
+                settings.llm_tokens_burst, settings.llm_tokens_per_hour / 3600
+            ),
+        },
+        chat_overhead_tokens=settings.context_token_budget + settings.llm_num_predict
+    )
@@ -0,0 +1,210 @@
+import hashlib
+import math
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+from app.core.config import get_settings
+
+
+class BloomFilter:
+    """
+    A fixed-size bloom filter of strings.
+
+    The bit array and number of hashes are chosen for ``capacity`` items
+    at ``error_rate`` false positives. The hashes are derived from one
+    BLAKE2b digest by double hashing. Items cannot be removed; the filter
+    is rebuilt instead.
+
+    Attributes:
+        capacity (int): The number of items the filter is sized for.
+        size (int): The number of bits.
+        hashes (int): The number of bits set per item.
+        count (int): The number of items added.
+    """
+
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, math.ceil(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[bit >> 3] & (1 << (bit & 7)) for bit in self._positions(item))
+
+    @property
+    def saturated(self) -> bool:
+        """Whether more items were added than the filter is sized for."""
+        return self.count > self.capacity
+
+    def add(self, item: str):
+        """
+        Add an item.
+
+        Args:
+            item (str): The item.
+        """
+        for bit in self._positions(item):
+            self._bits[bit >> 3] |= 1 << (bit & 7)
+        self.count += 1
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + i * second) % self.size for i in range(self.hashes))
+
+
+class RevocationFilter:
+    """
+    Per-process bloom filter of the IDs of revoked access tokens.
+
+    JWTBearer only asks the database about a token whose ``jti`` is in
+    the filter: a miss means the token was not revoked, a hit may be a
+    false positive. The filter is filled from the token table by the
+    RevocationPoller, which fetches the revocations newer than the last
+    one it saw, and revocations made by this process are added right
+    away. Until the first load, or once no poll succeeded for
+    ``max_staleness`` seconds, every token counts as a hit.
+
+    Attributes:
+        capacity (int): The minimum number of IDs the filter is sized for.
+        error_rate (float): The target false positive rate.
+        max_staleness (float): How long the filter is trusted without a
+            successful poll, in seconds.
+        watermark (datetime): The latest revocation time loaded.
+        checks (int): The tokens checked against the filter.
+        hits (int): The checks that had to go to the database.
+    """
+
+    def __init__(self, capacity: int, error_rate: float, max_staleness: float):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.max_staleness = max_staleness
+        self.watermark: Optional[datetime] = None
+        self.checks = 0
+        self.hits = 0
+        self._filter: Optional[BloomFilter] = None
+        self._refreshed_at: Optional[float] = None
+
+    def __len__(self) -> int:
+        return self._filter.count if self._filter else 0
+
+    @property
+    def ready(self) -> bool:
+        """Whether the filter is loaded and recent enough to be trusted."""
+        return (
+            self._filter is not None
+            and time.monotonic() - self._refreshed_at <= self.max_staleness
+        )
+
+    @property
+    def saturated(self) -> bool:
+        """Whether the filter holds more IDs than it is sized for."""
+        return self._filter is not None and self._filter.saturated
+
+    def might_be_revoked(self, jti: str) -> bool:
+        """
+        Check whether an access token may have been revoked.
+
+        Args:
+            jti (str): The ID of the access token.
+
+        Returns:
+            bool: False if the token was certainly not revoked, True if
+            the database must be asked.
+        """
+        self.checks += 1
+        revoked = not self.ready or jti in self._filter
+        if revoked:
+            self.hits += 1
+        return revoked
+
+    def collect(self) -> Iterator[Metric]:
+        """
+        Export the filter's size, state and checks for Prometheus. Hits
+        over checks bound the false positive rate, since most tokens
+        checked were not revoked.
+
+        Yields:
+            Metric: The revocation filter metric families.
+        """
+        yield GaugeMetricFamily(
+            "revocation_filter_entries", "Revoked token IDs in the filter.", value=len(self)
+        )
+        yield GaugeMetricFamily(
+            "revocation_filter_ready", "Whether the filter is loaded and fresh.", value=int(self.ready)
+        )
+        yield GaugeMetricFamily(
+            "revocation_filter_saturated", "Whether the filter holds more IDs than it is sized for.",
+            value=int(self.saturated)
+        )
+        yield CounterMetricFamily(
+            "revocation_filter_checks", "Access tokens checked against the filter.", value=self.checks
+        )
+        yield CounterMetricFamily(
+            "revocation_filter_hits", "Checks that had to go to the database.", value=self.hits
+        )
+
+    def add(self, jti: str):
+        """
+        Add the ID of a token revoked by this process.
+
+        Args:
+            jti (str): The ID of the access token.
+        """
+        if self._filter is not None:
+            self._filter.add(jti)
+
+    def replace(self, jtis: Iterable[str], watermark: Optional[datetime]):
+        """
+        Rebuild the filter from every stored revocation.
+
+        The new filter is sized for at least twice the loaded IDs, so it
+        has room for the revocations until the next rebuild.
+
+        Args:
+            jtis (Iterable[str]): The IDs of the revoked access tokens.
+            watermark (datetime, optional): The latest revocation time.
+        """
+        jtis = list(jtis)
+        bloom = BloomFilter(max(self.capacity, 2 * len(jtis)), self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+        self._filter = bloom
+        self.watermark = watermark
+        self._refreshed_at = time.monotonic()
+
+    def extend(self, jtis: Iterable[str], watermark: Optional[datetime]):
+        """
+        Add the revocations found by a poll.
+
+        Args:
+            jtis (Iterable[str]): The IDs of the revoked access tokens.
+            watermark (datetime, optional): The latest revocation time.
+        """
+        for jti in jtis:
+            self._filter.add(jti)
+        if watermark is not None and (self.watermark is None or watermark > self.watermark):
+            self.watermark = watermark
+        self._refreshed_at = time.monotonic()
+
+
+@lru_cache
+def get_revocation_filter() -> RevocationFilter:
+    """
+    Get the process-wide filter of revoked access tokens.
+
+    Returns:
+        RevocationFilter: The revocation filter.
+    """
+    settings = get_settings()
+    return RevocationFilter(
+        capacity=settings.revocation_filter_capacity,
+        error_rate=settings.revocation_filter_error_rate,
+        max_staleness=settings.revocation_max_staleness
+    )
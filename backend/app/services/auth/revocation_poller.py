@@ -0,0 +1,102 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+from typing import Optional
+
+from app.core.config import Settings
+from app.db.base import get_db_session
+from app.repositories.users.tokens import TokenRepository
+from .revocation import RevocationFilter, get_revocation_filter
+
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationPoller:
+    """
+    Keeps the revocation filter of this process in step with the token
+    table.
+
+    Every ``poll_interval`` seconds the revocations newer than the
+    filter's watermark are added to it. Revocation times come from the
+    database clock, so workers on different hosts agree on them; the
+    ``overlap`` covers transactions that committed after a later one was
+    already seen. Every ``rebuild_interval`` seconds, or once the filter
+    is saturated, it is rebuilt from scratch, which drops the IDs of
+    tokens the sweeper has deleted.
+
+    Attributes:
+        revocation_filter (RevocationFilter): The filter to fill.
+        poll_interval (float): Seconds between polls.
+        overlap (float): Seconds before the watermark to poll from.
+        rebuild_interval (int): Seconds between full rebuilds.
+    """
+
+    def __init__(
+        self,
+        revocation_filter: RevocationFilter,
+        poll_interval: float,
+        overlap: float,
+        rebuild_interval: int
+    ):
+        self.revocation_filter = revocation_filter
+        self.poll_interval = poll_interval
+        self.overlap = overlap
+        self.rebuild_interval = rebuild_interval
+        self._rebuilt_at: Optional[float] = None
+
+    async def poll(self, token_repo: TokenRepository):
+        """
+        Load new revocations into the filter, or rebuild it when due.
+
+        Args:
+            token_repo (TokenRepository): The token repository.
+        """
+        revocations = self.revocation_filter
+        rebuild = (
+            self._rebuilt_at is None
+            or revocations.saturated
+            or time.monotonic() - self._rebuilt_at >= self.rebuild_interval
+        )
+        since = None
+        if not rebuild and revocations.watermark is not None:
+            since = revocations.watermark - timedelta(seconds=self.overlap)
+        rows = await token_repo.get_revoked_jtis(since)
+        watermark = max((revoked_at for _, revoked_at in rows), default=None)
+        if rebuild:
+            revocations.replace((jti for jti, _ in rows), watermark)
+            self._rebuilt_at = time.monotonic()
+            logger.info(f"Loaded {len(rows)} revoked access tokens")
+        else:
+            revocations.extend((jti for jti, _ in rows), watermark)
+
+    async def run(self):
+        """
+        Poll every ``poll_interval`` seconds until cancelled.
+        """
+        while True:
+            try:
+                async with get_db_session() as session:
+                    await self.poll(TokenRepository(session))
+            except Exception as e:
+                logger.warning(f"Polling for revoked tokens failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+
+def build_revocation_poller(settings: Settings) -> RevocationPoller:
+    """
+    Build the revocation poller from the settings.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        RevocationPoller: The revocation poller.
+    """
+    return RevocationPoller(
+        revocation_filter=get_revocation_filter(),
+        poll_interval=settings.revocation_poll_interval,
+        overlap=settings.revocation_poll_overlap,
+        rebuild_interval=settings.revocation_rebuild_interval
+    )
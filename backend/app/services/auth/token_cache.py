@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Dict, Iterator, Optional, Tuple
+
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily, Metric
+
+from app.core.config import get_settings
+
+
+class TokenCache:
+    """
+    In-memory LRU cache of access tokens found active in the token table.
+
+    JWTBearer checks this cache before querying the database. An entry is
+    dropped after ``ttl`` seconds or at the token's ``exp``, whichever
+    comes first, and as soon as the token is revoked through
+    TokenRepository. Revocations made by another worker are only noticed
+    once the entry expires, so ``ttl`` bounds how long they go unseen.
+
+    Attributes:
+        max_entries (int): The maximum number of cached tokens.
+        ttl (float): The maximum time a token is trusted, in seconds.
+        hits (int): The lookups answered from the cache.
+        misses (int): The lookups that had to go to the database.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Tuple[float, dict]]" = OrderedDict()
+        self._by_user: Dict[str, Dict[str, None]] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, access_token: str) -> Optional[dict]:
+        """
+        Get the payload of a cached access token.
+
+        Args:
+            access_token (str): The access token.
+
+        Returns:
+            Optional[dict]: The decoded payload, or None if the token is
+            not cached or its entry expired.
+        """
+        entry = self._entries.get(access_token)
+        if entry is not None and entry[0] <= time.time():
+            self._remove(access_token)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(access_token)
+        return entry[1]
+
+    def put(self, access_token: str, payload: dict):
+        """
+        Cache an active access token, evicting the least recently used
+        ones if needed.
+
+        Args:
+            access_token (str): The access token.
+            payload (dict): The decoded payload, with ``sub`` and ``exp``.
+        """
+        expires_at = time.time() + self.ttl
+        if payload.get("exp") is not None:
+            expires_at = min(expires_at, float(payload["exp"]))
+        if access_token in self._entries:
+            self._remove(access_token)
+        self._entries[access_token] = (expires_at, payload)
+        self._by_user.setdefault(str(payload.get("sub")), {})[access_token] = None
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, access_token: str):
+        """
+        Drop a revoked access token.
+
+        Args:
+            access_token (str): The access token.
+        """
+        if access_token in self._entries:
+            self._remove(access_token)
+
+    def invalidate_user(self, user_id: int):
+        """
+        Drop every cached access token of a user.
+
+        Args:
+            user_id (int): The user id.
+        """
+        for access_token in list(self._by_user.get(str(user_id), ())):
+            self._remove(access_token)
+
+    def clear(self):
+        """
+        Drop every cached access token.
+        """
+        self._entries.clear()
+        self._by_user.clear()
+
+    def collect(self) -> Iterator[Metric]:
+        """
+        Export the cache size and its hits and misses for Prometheus, so
+        the database lookups it saves can be followed.
+
+        Yields:
+            Metric: The token cache metric families.
+        """
+        yield GaugeMetricFamily("token_cache_entries", "Access tokens cached.", value=len(self))
+        yield CounterMetricFamily(
+            "token_cache_hits", "Token lookups answered from the cache.", value=self.hits
+        )
+        yield CounterMetricFamily(
+            "token_cache_misses", "Token lookups that went to the database.", value=self.misses
+        )
+
+    def _remove(self, access_token: str):
+        _, payload = self._entries.pop(access_token)
+        user = str(payload.get("sub"))
+        tokens = self._by_user[user]
+        del tokens[access_token]
+        if not tokens:
+            del self._by_user[user]
+
+
+@lru_cache
+def get_token_cache() -> TokenCache:
+    """
+    Get the process-wide cache of validated access tokens.
+
+    Returns:
+        TokenCache: The token cache.
+    """
+    settings = get_settings()
+    return TokenCache(
+        max_entries=settings.token_cache_max_entries,
+        ttl=settings.token_cache_ttl
+    )
@@ -0,0 +1,104 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+
+from app.core.config import Settings
+from app.db.base import get_db_session
+from app.repositories.users.tokens import TokenRepository
+
+
+logger = logging.getLogger(__name__)
+
+
+class TokenSweeper:
+    """
+    Deletes expired and revoked rows from the token table.
+
+    Every login and refresh inserts a row, so without compaction the
+    table, and the indexes refresh and logout go through, only grows. A
+    row has expired once its refresh token has, i.e.
+    ``refresh_token_minutes`` after it was created, and a revoked row
+    once its access token has, since workers read revocations from it.
+    Rows are deleted in batches of ``batch_size``, each in its own
+    transaction, so the sweep never holds locks on a large part of the
+    table.
+
+    Attributes:
+        interval (int): Seconds between sweeps.
+        batch_size (int): The maximum number of rows per delete.
+        refresh_token_minutes (int): The lifetime of a refresh token.
+        access_token_minutes (int): The lifetime of an access token.
+    """
+
+    def __init__(
+        self,
+        interval: int,
+        batch_size: int,
+        refresh_token_minutes: int,
+        access_token_minutes: int
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.refresh_token_minutes = refresh_token_minutes
+        self.access_token_minutes = access_token_minutes
+
+    async def sweep(self) -> int:
+        """
+        Delete every expired or revoked token, one batch at a time.
+
+        Returns:
+            int: The number of deleted rows.
+        """
+        started = time.perf_counter()
+        # created_at is stored as naive UTC
+        now = datetime.utcnow()
+        expired_before = now - timedelta(minutes=self.refresh_token_minutes)
+        revoked_before = now - timedelta(minutes=self.access_token_minutes)
+        deleted = 0
+        async with get_db_session() as session:
+            token_repo = TokenRepository(session)
+            while True:
+                batch = await token_repo.delete_expired(
+                    expired_before, revoked_before, self.batch_size
+                )
+                deleted += batch
+                if batch < self.batch_size:
+                    break
+                # let other transactions through between batches
+                await asyncio.sleep(0)
+            remaining = await token_repo.count()
+        logger.info(
+            f"Swept {deleted} expired or revoked tokens in "
+            f"{(time.perf_counter() - started) * 1000:.0f} ms, {remaining} remain"
+        )
+        return deleted
+
+    async def run(self):
+        """
+        Sweep every ``interval`` seconds until cancelled.
+        """
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                logger.warning(f"Sweeping the token table failed: {e}")
+            await asyncio.sleep(self.interval)
+
+
+def build_token_sweeper(settings: Settings) -> TokenSweeper:
+    """
+    Build the token sweeper from the settings.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        TokenSweeper: The token sweeper.
+    """
+    return TokenSweeper(
+        interval=settings.token_sweep_interval,
+        batch_size=settings.token_sweep_batch_size,
+        refresh_token_minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES,
+        access_token_minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
+    )
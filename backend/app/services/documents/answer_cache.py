@@ -0,0 +1,154 @@
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Sequence
+
+import numpy as np
+
+from app.core.config import Settings
+from .mmr import normalize
+
+
+@dataclass
+class CachedAnswer:
+    """
+    An answer stored in the answer cache.
+
+    Attributes:
+        document_id (int): The document the answer was generated from.
+        version (Hashable): The document version the answer is valid for.
+        embedding (np.ndarray): The normalized embedding of the question.
+        response (str): The generated answer.
+        sources (List[str]): The sources shown with the answer.
+    """
+    document_id: int
+    version: Hashable
+    embedding: np.ndarray
+    response: str
+    sources: List[str]
+
+
+class AnswerCache:
+    """
+    In-memory semantic cache of generated answers.
+
+    Answers are looked up by document version and question embedding: a
+    question hits when its cosine similarity to a cached question about
+    the same version of the same document reaches the threshold. Entries
+    for an older version are dropped as soon as they are seen, and the
+    least recently used entries are evicted beyond the size bound.
+
+    Attributes:
+        max_entries (int): The maximum number of cached answers.
+        similarity_threshold (float): The minimum cosine similarity for a hit.
+    """
+
+    def __init__(self, max_entries: int, similarity_threshold: float):
+        self.max_entries = max_entries
+        self.similarity_threshold = similarity_threshold
+        self._entries: "OrderedDict[int, CachedAnswer]" = OrderedDict()
+        self._by_document: Dict[int, Dict[int, None]] = {}
+        self._next_key = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(
+        self,
+        document_id: int,
+        version: Hashable,
+        query_embedding: Sequence[float]
+    ) -> Optional[CachedAnswer]:
+        """
+        Find a cached answer to a similar question.
+
+        Args:
+            document_id (int): The document id.
+            version (Hashable): The current document version.
+            query_embedding (Sequence[float]): The question embedding.
+
+        Returns:
+            Optional[CachedAnswer]: The most similar cached answer, or None
+            if no cached question is similar enough.
+        """
+        keys = list(self._by_document.get(document_id, ()))
+        stale = [key for key in keys if self._entries[key].version != version]
+        for key in stale:
+            self._remove(key)
+        keys = [key for key in keys if key not in stale]
+        if not keys:
+            return None
+
+        embeddings = np.stack([self._entries[key].embedding for key in keys])
+        similarities = embeddings @ normalize(query_embedding)
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+
+        self._entries.move_to_end(keys[best])
+        return self._entries[keys[best]]
+
+    def put(
+        self,
+        document_id: int,
+        version: Hashable,
+        query_embedding: Sequence[float],
+        response: str,
+        sources: List[str]
+    ):
+        """
+        Cache an answer, evicting the least recently used ones if needed.
+
+        Args:
+            document_id (int): The document id.
+            version (Hashable): The document version the answer was built from.
+            query_embedding (Sequence[float]): The question embedding.
+            response (str): The generated answer.
+            sources (List[str]): The sources shown with the answer.
+        """
+        key = self._next_key
+        self._next_key += 1
+        self._entries[key] = CachedAnswer(
+            document_id=document_id,
+            version=version,
+            embedding=normalize(query_embedding),
+            response=response,
+            sources=sources
+        )
+        self._by_document.setdefault(document_id, {})[key] = None
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def invalidate(self, document_id: int):
+        """
+        Drop every cached answer for a document.
+
+        Args:
+            document_id (int): The document id.
+        """
+        for key in list(self._by_document.get(document_id, ())):
+            self._remove(key)
+
+    def _remove(self, key: int):
+        entry = self._entries.pop(key)
+        keys = self._by_document[entry.document_id]
+        del keys[key]
+        if not keys:
+            del self._by_document[entry.document_id]
+
+
+def build_answer_cache(settings: Settings) -> Optional[AnswerCache]:
+    """
+    Build the configured answer cache.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        Optional[AnswerCache]: The answer cache, or None if it is disabled.
+    """
+    if not settings.answer_cache_enabled:
+        return None
+    return AnswerCache(
+        max_entries=settings.answer_cache_max_entries,
+        similarity_threshold=settings.answer_cache_similarity
+    )
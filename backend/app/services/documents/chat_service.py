@@ -1,13 +1,47 @@
+import json
+import time
 import logging
+from contextlib import nullcontext
+from dataclasses import asdict
+from typing import AsyncIterator, Hashable, List, Optional, Tuple, Union
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.repositories.documents.documents import DocumentRepository
+from app.core.config import get_settings
+from app.core.exceptions import (
+    BadRequestException, GatewayTimeoutException, ServiceUnavailableException
+)
+from app.repositories.documents.documents import DocumentRepository, FAQAnswer, ScoredChunk
+from app.utils.deadline import Deadline
+from app.utils.metrics import CHAT_STAGE_SECONDS
+from app.utils.tokens import estimate_tokens
+from .answer_cache import AnswerCache, CachedAnswer
+from .context import PackedContext, expand_context, neighbour_ordinals, pack_context
 from .embeddings import EmbeddingService
+from .extractive import ExtractiveAnswerer, render_answer
+from .generation_gateway import GenerationGateway
 from .llm_service import LLMService
+from .mmr import mmr_select
+from .reranker import Reranker
 
 
 logger = logging.getLogger(__name__)
 
+NO_CONTEXT_RESPONSE = "I couldn’t find any relevant information in the document."
+
+
+def format_sse(event: str, data: dict) -> str:
+    """
+    Encode a Server-Sent Event.
+
+    Args:
+        event (str): The event name.
+        data (dict): The JSON payload.
+
+    Returns:
+        str: The encoded event.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
 
 class ChatService:
     """
@@ -17,65 +51,676 @@ class ChatService:
         document_repo (DocumentRepository): The document repository instance.
         embedding_service (EmbeddingService): The embedding service instance.
         llm_service (LLMService): The LLM service instance.
+        reranker (Reranker, optional): The reranking stage applied to the
+        retrieved candidates before generation.
+        answer_cache (AnswerCache, optional): The cache of answers to
+        similar questions about the same document version.
+        gateway (GenerationGateway, optional): The admission control
+        limiting concurrent generations.
+        extractor (ExtractiveAnswerer, optional): The extractive answerer,
+        used for extractive chats and, if enabled, instead of shedding
+        chats when generation is saturated.
     """
 
     def __init__(
         self,
         document_repo: DocumentRepository,
         embedding_service: EmbeddingService,
-        llm_service: LLMService
+        llm_service: LLMService,
+        reranker: Optional[Reranker] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        gateway: Optional[GenerationGateway] = None,
+        extractor: Optional[ExtractiveAnswerer] = None
     ):
         self.document_repo = document_repo
         self.embedding_service = embedding_service
         self.llm_service = llm_service
+        self.reranker = reranker
+        self.answer_cache = answer_cache
+        self.gateway = gateway
+        self.extractor = extractor
+        self.settings = get_settings()
 
     async def process_chat(
         self,
         document_id: int,
         message: str,
-        session: AsyncSession
+        session: AsyncSession,
+        document_version: Optional[Hashable] = None,
+        query_embedding: Optional[list] = None,
+        deadline: Optional[Deadline] = None,
+        mode: str = "generative"
     ) -> dict:
         """
         Process a chat message.
 
         Finds similar document sections to the given message
-        and uses the LLM model to generate a response.
+        and uses the LLM model to generate a response. When the document
+        version is given, answers are reused for similar questions about
+        the same version, and answers precomputed during ingestion are
+        served for close enough questions. In extractive mode, or when generation is
+        saturated and the extractive fallback is enabled, the answer is
+        made of the retrieved sentences closest to the message instead.
 
         Args:
             document_id (int): The document id.
             message (str): The message.
             session (AsyncSession): The database session.
+            document_version (Hashable, optional): The document version,
+            changing whenever its chunks change.
+            query_embedding (list, optional): The message embedding, if
+            already computed.
+            deadline (Deadline, optional): The request deadline, also
+            applied as the statement timeout of the retrieval queries.
+            mode (str): "generative" or "extractive".
 
         Returns:
-            dict: A response dict with the response and sources.
+            dict: A response dict with the response, sources, whether
+            it was served from the cache, the answer mode and, for
+            extractive answers, the highlighted sentences.
+
+        Raises:
+            BadRequestException: If extractive answers are not available.
+            ServiceUnavailableException: If generation is overloaded.
         """
-        query_embedding = await self.embedding_service.generate_embedding(message)
-        
-        chunks = await self.document_repo.find_similar_content(
-            document_id=document_id,
-            query_embedding=query_embedding,
-            threshold=0.7,
-            limit=5,
-            session=session
+        extractive = mode == "extractive"
+        if extractive and self.extractor is None:
+            raise BadRequestException(message="Extractive answers are not available")
+        if query_embedding is None:
+            query_embedding = await self.embed_query(message)
+        cached = None
+        if not extractive:
+            cached = await self._get_answer(
+                document_id, document_version, query_embedding, session
+            )
+        if cached:
+            return {
+                "response": cached.response,
+                "sources": cached.sources,
+                "cached": True
+            }
+
+        context = await self.find_context(
+            document_id, message, query_embedding, session, deadline
         )
-        if not chunks:
+        if not context.passages:
             return {
-                "response": "I couldn’t find any relevant information in the document.",
-                "sources": []
+                "response": NO_CONTEXT_RESPONSE,
+                "sources": [],
+                "cached": False
             }
-        
-        context = "\n\n".join(chunks)
-        sources = [chunk[:50] + "..." for chunk in chunks]
-        
+
+        sources = [chunk[:50] + "..." for chunk in context.passages]
+        if extractive:
+            return await self._extractive_response(query_embedding, context, sources)
+
+        try:
+            async with self._generation_slot():
+                try:
+                    with CHAT_STAGE_SECONDS.labels("generation", self.llm_service.llm.model).time():
+                        response = await self.llm_service.generate_response(
+                            query=message,
+                            context="\n\n".join(context.passages),
+                            context_tokens=context.tokens
+                        )
+                except Exception as e:
+                    logger.error(f"Error processing chat: {e}")
+                    return {
+                        "response": "Sorry, I encountered an error processing your request.",
+                        "sources": [],
+                        "cached": False
+                    }
+        except ServiceUnavailableException:
+            if not self._falls_back():
+                raise
+            logger.info(f"Generation saturated, answering extractively for document {document_id}")
+            return await self._extractive_response(query_embedding, context, sources)
+        self._cache_answer(document_id, document_version, query_embedding, response, sources)
+        return {
+            "response": response,
+            "sources": sources,
+            "cached": False
+        }
+
+    async def stream_chat(
+        self,
+        document_id: int,
+        message: str,
+        session: AsyncSession,
+        document_version: Optional[Hashable] = None,
+        query_embedding: Optional[list] = None,
+        deadline: Optional[Deadline] = None,
+        mode: str = "generative"
+    ) -> AsyncIterator[str]:
+        """
+        Process a chat message, streaming the answer as Server-Sent Events.
+
+        Retrieval runs before this returns, so the database session is no
+        longer needed once the stream starts. The first event carries the
+        sources, followed by one event per generated token and a final
+        event with the time to first token. A cached answer is sent as a
+        single token event, and so is an extractive answer, whose done
+        event carries the highlighted sentences. If the deadline passes
+        while streaming, the stream ends with an error event.
+
+        Args:
+            document_id (int): The document id.
+            message (str): The message.
+            session (AsyncSession): The database session.
+            document_version (Hashable, optional): The document version,
+            changing whenever its chunks change.
+            query_embedding (list, optional): The message embedding, if
+            already computed.
+            deadline (Deadline, optional): The request deadline.
+            mode (str): "generative" or "extractive".
+
+        Returns:
+            AsyncIterator[str]: The encoded Server-Sent Events.
+
+        Raises:
+            BadRequestException: If extractive answers are not available.
+            ServiceUnavailableException: If the generation queue is full.
+        """
+        started = time.perf_counter()
+        extractive = mode == "extractive"
+        if extractive and self.extractor is None:
+            raise BadRequestException(message="Extractive answers are not available")
+        if query_embedding is None:
+            query_embedding = await self.embed_query(message)
+        cached = None
+        if not extractive:
+            cached = await self._get_answer(
+                document_id, document_version, query_embedding, session
+            )
+        if cached:
+            return self._cached_events(cached)
+
+        context = await self.find_context(
+            document_id, message, query_embedding, session, deadline
+        )
+        if context.passages and self.gateway and self.gateway.saturated and self._falls_back():
+            logger.info(f"Generation saturated, answering extractively for document {document_id}")
+            extractive = True
+        if extractive and context.passages:
+            return self._extractive_events(query_embedding, context)
+        if self.gateway and context.passages:
+            self.gateway.check_admission()
+        return self._stream_events(
+            document_id, document_version, message, query_embedding, context, started, deadline
+        )
+
+    async def _cached_events(
+        self,
+        cached: Union[CachedAnswer, FAQAnswer]
+    ) -> AsyncIterator[str]:
+        yield format_sse("sources", {"sources": cached.sources})
+        yield format_sse("token", {"token": cached.response})
+        yield format_sse("done", {"time_to_first_token_ms": None, "cached": True})
+
+    async def _extractive_events(
+        self,
+        query_embedding: list,
+        context: PackedContext,
+        send_sources: bool = True
+    ) -> AsyncIterator[str]:
+        sources = [chunk[:50] + "..." for chunk in context.passages]
+        if send_sources:
+            yield format_sse("sources", {"sources": sources})
+        answer = await self._extractive_response(query_embedding, context, sources)
+        yield format_sse("token", {"token": answer["response"]})
+        yield format_sse("done", {
+            "time_to_first_token_ms": None,
+            "cached": False,
+            "mode": "extractive",
+            "highlights": answer["highlights"]
+        })
+
+    async def _stream_events(
+        self,
+        document_id: int,
+        document_version: Optional[Hashable],
+        message: str,
+        query_embedding: list,
+        context: PackedContext,
+        started: float,
+        deadline: Optional[Deadline] = None
+    ) -> AsyncIterator[str]:
+        if not context.passages:
+            yield format_sse("sources", {"sources": []})
+            yield format_sse("token", {"token": NO_CONTEXT_RESPONSE})
+            yield format_sse("done", {"time_to_first_token_ms": None, "cached": False})
+            return
+
+        sources = [chunk[:50] + "..." for chunk in context.passages]
+        yield format_sse("sources", {"sources": sources})
+
+        first_token_ms = None
+        tokens: List[str] = []
         try:
-            response = await self.llm_service.generate_response(query=message, context=context)
+            async with self._within(deadline), self._generation_slot():
+                generation_started = time.perf_counter()
+                async for token in self.llm_service.stream_response(
+                    query=message,
+                    context="\n\n".join(context.passages),
+                    context_tokens=context.tokens
+                ):
+                    if first_token_ms is None:
+                        first_token_ms = (time.perf_counter() - started) * 1000
+                        logger.info(
+                            f"Time to first token for document {document_id}: "
+                            f"{first_token_ms:.0f} ms"
+                        )
+                    tokens.append(token)
+                    yield format_sse("token", {"token": token})
+                CHAT_STAGE_SECONDS.labels("generation", self.llm_service.llm.model).observe(
+                    time.perf_counter() - generation_started
+                )
+        except ServiceUnavailableException as e:
+            if self._falls_back():
+                logger.info(
+                    f"Generation saturated, answering extractively for document {document_id}"
+                )
+                async for event in self._extractive_events(
+                    query_embedding, context, send_sources=False
+                ):
+                    yield event
+                return
+            yield format_sse("error", {
+                "message": e.message,
+                "retry_after": self.gateway.retry_after
+            })
+            return
+        except GatewayTimeoutException as e:
+            logger.warning(f"Streamed chat for document {document_id} hit its deadline")
+            yield format_sse("error", {"message": e.message})
+            return
         except Exception as e:
-            logger.error(f"Error processing chat: {e}")
+            logger.error(f"Error streaming chat: {e}")
+            yield format_sse("error", {
+                "message": "Sorry, I encountered an error processing your request."
+            })
+            return
+        self._cache_answer(
+            document_id, document_version, query_embedding, "".join(tokens), sources
+        )
+        yield format_sse("done", {"time_to_first_token_ms": first_token_ms, "cached": False})
+
+    async def embed_query(self, message: str) -> list:
+        """
+        Embed a chat message for retrieval.
+
+        Args:
+            message (str): The message.
+
+        Returns:
+            list: The message embedding.
+        """
+        model = self.embedding_service.model_name
+        with CHAT_STAGE_SECONDS.labels("query_embed", model).time():
+            return await self.embedding_service.generate_embedding(message)
+
+    async def _extractive_response(
+        self,
+        query_embedding: list,
+        context: PackedContext,
+        sources: List[str]
+    ) -> dict:
+        """
+        Answer with the retrieved sentences closest to the message.
+
+        The highlights refer to the sources by their index.
+        """
+        try:
+            highlights = await self.extractor.select(query_embedding, context.passages)
+        except Exception as e:
+            logger.error(f"Error processing extractive chat: {e}")
             return {
                 "response": "Sorry, I encountered an error processing your request.",
-                "sources": []
+                "sources": [],
+                "cached": False,
+                "mode": "extractive",
+                "highlights": []
             }
         return {
-            "response": response,
-            "sources": sources
+            "response": render_answer(highlights) if highlights else NO_CONTEXT_RESPONSE,
+            "sources": sources,
+            "cached": False,
+            "mode": "extractive",
+            "highlights": [asdict(highlight) for highlight in highlights]
         }
+
+    def _falls_back(self) -> bool:
+        """
+        Whether saturated generation is answered extractively.
+        """
+        return self.extractor is not None and self.settings.extractive_fallback
+
+    def _within(self, deadline: Optional[Deadline]):
+        """
+        Limit a block to the request deadline, if there is one.
+        """
+        return deadline.limit() if deadline else nullcontext()
+
+    def _generation_slot(self):
+        """
+        Hold a generation slot from the gateway, if one is configured.
+        """
+        return self.gateway.slot() if self.gateway else nullcontext()
+
+    async def _get_answer(
+        self,
+        document_id: int,
+        document_version: Optional[Hashable],
+        query_embedding: list,
+        session: AsyncSession
+    ) -> Optional[Union[CachedAnswer, FAQAnswer]]:
+        """
+        Look up a cached answer, then a precomputed one if enabled.
+        """
+        cached = self._get_cached(document_id, document_version, query_embedding)
+        if cached or not self.settings.faq_enabled:
+            return cached
+        answer = await self.document_repo.find_faq_answer(
+            document_id=document_id,
+            query_embedding=query_embedding,
+            max_distance=1 - self.settings.faq_similarity,
+            session=session
+        )
+        if answer:
+            logger.info(
+                f"Precomputed answer to {answer.question!r} served for document {document_id}"
+            )
+        return answer
+
+    def _get_cached(
+        self,
+        document_id: int,
+        document_version: Optional[Hashable],
+        query_embedding: list
+    ) -> Optional[CachedAnswer]:
+        """
+        Look up a cached answer, only when the document version is known.
+        """
+        if self.answer_cache is None or document_version is None:
+            return None
+        cached = self.answer_cache.get(document_id, document_version, query_embedding)
+        if cached:
+            logger.info(f"Answer cache hit for document {document_id}")
+        return cached
+
+    def _cache_answer(
+        self,
+        document_id: int,
+        document_version: Optional[Hashable],
+        query_embedding: list,
+        response: str,
+        sources: List[str]
+    ):
+        """
+        Cache a generated answer, only when the document version is known.
+        """
+        if self.answer_cache is None or document_version is None:
+            return
+        self.answer_cache.put(document_id, document_version, query_embedding, response, sources)
+
+    async def find_context(
+        self,
+        document_id: int,
+        message: str,
+        query_embedding: list,
+        session: AsyncSession,
+        deadline: Optional[Deadline] = None
+    ) -> PackedContext:
+        """
+        Retrieve the context passages for a message.
+
+        The passages are packed into the context token budget in relevance
+        order.
+
+        Args:
+            document_id (int): The document id.
+            message (str): The message.
+            query_embedding (list): The message embedding.
+            session (AsyncSession): The database session.
+            deadline (Deadline, optional): The request deadline.
+
+        Returns:
+            PackedContext: The context passages, empty if nothing relevant
+            was found, and their estimated token count.
+        """
+        with CHAT_STAGE_SECONDS.labels("retrieval", "").time():
+            hits = await self._retrieve(document_id, message, query_embedding, session, deadline)
+            if not hits:
+                return PackedContext([], 0)
+            passages = await self._build_context(document_id, hits, session)
+        context = pack_context(passages, self.settings.context_token_budget)
+        if len(context.passages) < len(passages):
+            logger.info(
+                f"Packed {len(context.passages)} of {len(passages)} passages into "
+                f"{context.tokens}/{self.settings.context_token_budget} context tokens"
+            )
+        return context
+
+    async def find_contexts(
+        self,
+        document_id: int,
+        query_embeddings: List[list],
+        session: AsyncSession
+    ) -> List[PackedContext]:
+        """
+        Retrieve the context passages for several messages at once.
+
+        All messages are searched in one SQL statement, so reranking and
+        MMR, which need the candidates of each message, are not applied.
+        Neighbour expansion and packing work as in find_context.
+
+        Args:
+            document_id (int): The document id.
+            query_embeddings (List[list]): The message embeddings.
+            session (AsyncSession): The database session.
+
+        Returns:
+            List[PackedContext]: The context of each message, in the order
+            of the embeddings.
+        """
+        results = await self.document_repo.search_chunks_batch(
+            document_id=document_id,
+            query_embeddings=query_embeddings,
+            session=session,
+            k=self.settings.chat_top_k,
+            threshold=self.settings.similarity_threshold,
+            probes=self.settings.ivfflat_probes,
+            ef_search=self.settings.hnsw_ef_search,
+            iterative_scan=self.settings.hnsw_iterative_scan
+        )
+        contexts = []
+        for hits in results:
+            if not hits:
+                contexts.append(PackedContext([], 0))
+                continue
+            passages = await self._build_context(document_id, hits, session)
+            contexts.append(pack_context(passages, self.settings.context_token_budget))
+        return contexts
+
+    async def search(
+        self,
+        document_id: int,
+        queries: List[str],
+        k: int,
+        threshold: Optional[float],
+        session: AsyncSession
+    ) -> List[dict]:
+        """
+        Search a document for several queries at once.
+
+        All queries are embedded in one embedding call and searched in one
+        SQL statement.
+
+        Args:
+            document_id (int): The document id.
+            queries (List[str]): The queries.
+            k (int): The maximum number of hits per query.
+            threshold (Optional[float]): The maximum cosine distance,
+            defaults to the configured similarity threshold.
+            session (AsyncSession): The database session.
+
+        Returns:
+            List[dict]: The hits of each query, in the order of the queries.
+        """
+        started = time.perf_counter()
+        query_embeddings = await self.embedding_service.generate_embeddings(queries)
+        results = await self.document_repo.search_chunks_batch(
+            document_id=document_id,
+            query_embeddings=query_embeddings,
+            session=session,
+            k=k,
+            threshold=threshold if threshold is not None else self.settings.similarity_threshold,
+            probes=self.settings.ivfflat_probes,
+            ef_search=self.settings.hnsw_ef_search,
+            iterative_scan=self.settings.hnsw_iterative_scan
+        )
+        logger.info(
+            f"Searched document {document_id} for {len(queries)} queries in "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return [
+            {
+                "query": query,
+                "hits": [
+                    {"chunk_id": hit.id, "content": hit.content, "distance": hit.distance}
+                    for hit in hits
+                ]
+            }
+            for query, hits in zip(queries, results)
+        ]
+
+    async def _retrieve(
+        self,
+        document_id: int,
+        message: str,
+        query_embedding: list,
+        session: AsyncSession,
+        deadline: Optional[Deadline] = None
+    ) -> List[ScoredChunk]:
+        """
+        Retrieve the chunks to pass to the LLM.
+
+        Fetches enough candidates for the enabled selection stages, scores
+        them with the reranker if one is configured (falling back to vector
+        order when it runs out of time) and, when MMR is enabled, drops
+        near-duplicate candidates. The estimated context tokens against the
+        plain top-k vector selection are logged.
+
+        Args:
+            document_id (int): The document id.
+            message (str): The user message.
+            query_embedding (list): The query embedding.
+            session (AsyncSession): The database session.
+            deadline (Deadline, optional): The request deadline, set as the
+            statement timeout of the search transaction.
+
+        Returns:
+            List[ScoredChunk]: The selected chunks, most relevant first.
+        """
+        top_k = self.reranker.top_k if self.reranker else self.settings.chat_top_k
+        limit = self.settings.chat_top_k
+        if self.reranker:
+            limit = max(limit, self.reranker.candidates)
+        if self.settings.mmr_enabled:
+            limit = max(limit, self.settings.mmr_candidates)
+
+        candidates = await self.document_repo.search_chunks(
+            document_id=document_id,
+            query_embedding=query_embedding,
+            session=session,
+            k=limit,
+            threshold=self.settings.similarity_threshold,
+            probes=self.settings.ivfflat_probes,
+            ef_search=self.settings.hnsw_ef_search,
+            include_embeddings=self.settings.mmr_enabled,
+            iterative_scan=self.settings.hnsw_iterative_scan,
+            statement_timeout_ms=deadline.remaining_ms() if deadline else None
+        )
+        chunks = [candidate.content for candidate in candidates]
+        if not chunks:
+            return []
+
+        started = time.perf_counter()
+        scores = None
+        if self.reranker:
+            scores = await self.reranker.score(message, chunks)
+
+        if self.settings.mmr_enabled:
+            order = mmr_select(
+                query_embedding,
+                [candidate.embedding for candidate in candidates],
+                top_k,
+                lambda_mult=self.settings.mmr_lambda,
+                relevance=scores
+            )
+        elif scores is not None:
+            order = sorted(range(len(chunks)), key=lambda i: scores[i], reverse=True)[:top_k]
+        else:
+            order = range(min(top_k, len(chunks)))
+        selected = [candidates[i] for i in order]
+
+        if len(chunks) > len(selected):
+            baseline_tokens = sum(
+                estimate_tokens(chunk) for chunk in chunks[:self.settings.chat_top_k]
+            )
+            selected_tokens = sum(estimate_tokens(hit.content) for hit in selected)
+            logger.info(
+                f"Selected {len(selected)} of {len(chunks)} candidates in "
+                f"{(time.perf_counter() - started) * 1000:.1f} ms "
+                f"(rerank: {'off' if not self.reranker else 'fallback' if scores is None else 'scored'}, "
+                f"mmr: {'on' if self.settings.mmr_enabled else 'off'}); "
+                f"context tokens {baseline_tokens} -> {selected_tokens}"
+            )
+        return selected
+
+    async def _build_context(
+        self,
+        document_id: int,
+        hits: List[ScoredChunk],
+        session: AsyncSession
+    ) -> List[Tuple[str, int]]:
+        """
+        Build the context passages from the selected chunks.
+
+        When neighbour expansion is enabled, the chunks just before and
+        after each hit are fetched in one query and merged into
+        overlapping-free windows within the character budget. Plain hits
+        use the token count stored at ingest; merged windows are counted.
+
+        Args:
+            document_id (int): The document id.
+            hits (List[ScoredChunk]): The selected chunks.
+            session (AsyncSession): The database session.
+
+        Returns:
+            List[Tuple[str, int]]: The context passages with their token
+            counts, most relevant first.
+        """
+        neighbours = self.settings.context_neighbours
+        if neighbours <= 0:
+            return [
+                (
+                    hit.content,
+                    hit.token_count if hit.token_count is not None
+                    else estimate_tokens(hit.content)
+                )
+                for hit in hits
+            ]
+
+        chunks_by_ordinal = await self.document_repo.get_chunks_by_ordinals(
+            document_id=document_id,
+            ordinals=neighbour_ordinals(hits, neighbours),
+            session=session
+        )
+        passages = expand_context(
+            hits,
+            chunks_by_ordinal,
+            neighbours,
+            self.settings.context_char_budget
+        )
+        return [(passage, estimate_tokens(passage)) for passage in passages]
@@ -0,0 +1,181 @@
+from typing import Dict, List, NamedTuple, Sequence, Tuple
+
+from app.repositories.documents.documents import ScoredChunk
+from app.utils.tokens import estimate_tokens, truncate_to_tokens
+
+# Chunks are split with a 200 character overlap; allow some slack for
+# the whitespace normalisation applied when they are cleaned.
+MAX_CHUNK_OVERLAP = 400
+
+# Passages are joined with a blank line, which costs about one token.
+PASSAGE_SEPARATOR_TOKENS = 1
+
+
+class PackedContext(NamedTuple):
+    """
+    The context passages sent to the LLM with their estimated token count.
+    """
+    passages: List[str]
+    tokens: int
+
+
+def neighbour_ordinals(hits: Sequence[ScoredChunk], neighbours: int) -> List[int]:
+    """
+    Get the ordinals of the chunks around each hit.
+
+    Args:
+        hits (Sequence[ScoredChunk]): The retrieved chunks.
+        neighbours (int): The number of chunks to take on each side.
+
+    Returns:
+        List[int]: The sorted ordinals to fetch, hits included.
+    """
+    ordinals = set()
+    for hit in hits:
+        if hit.ordinal is not None:
+            ordinals.update(
+                range(max(0, hit.ordinal - neighbours), hit.ordinal + neighbours + 1)
+            )
+    return sorted(ordinals)
+
+
+def join_overlapping(first: str, second: str) -> str:
+    """
+    Join two consecutive chunks, dropping the text they share.
+
+    Args:
+        first (str): The earlier chunk.
+        second (str): The chunk that follows it.
+
+    Returns:
+        str: The joined text.
+    """
+    for size in range(min(len(first), len(second), MAX_CHUNK_OVERLAP), 0, -1):
+        if first.endswith(second[:size]):
+            return first + second[size:]
+    return f"{first} {second}"
+
+
+def merge_windows(
+    hits: Sequence[ScoredChunk],
+    neighbours: int
+) -> List[Tuple[int, int]]:
+    """
+    Build the ordinal window around each hit and merge overlapping ones.
+
+    Windows keep the relevance rank of their best hit. Hits without an
+    ordinal get no window.
+
+    Args:
+        hits (Sequence[ScoredChunk]): The retrieved chunks, most relevant first.
+        neighbours (int): The number of chunks to take on each side.
+
+    Returns:
+        List[Tuple[int, int]]: Inclusive (start, end) ordinals, most
+        relevant window first.
+    """
+    windows: List[List[int]] = []
+    for rank, hit in enumerate(hits):
+        if hit.ordinal is None:
+            continue
+        windows.append([max(0, hit.ordinal - neighbours), hit.ordinal + neighbours, rank])
+
+    merged: List[List[int]] = []
+    for start, end, rank in sorted(windows):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+            merged[-1][2] = min(merged[-1][2], rank)
+        else:
+            merged.append([start, end, rank])
+    return [(start, end) for start, end, _ in sorted(merged, key=lambda w: w[2])]
+
+
+def expand_context(
+    hits: Sequence[ScoredChunk],
+    chunks_by_ordinal: Dict[int, str],
+    neighbours: int,
+    char_budget: int
+) -> List[str]:
+    """
+    Replace each hit with the merged window of its neighbouring chunks.
+
+    Windows are added in relevance order while they fit in the character
+    budget; a window that does not fit, or whose chunks were not found, is
+    reduced to its best hit alone. Empty passages are never added. Hits
+    stored without an ordinal are passed through unchanged.
+
+    Args:
+        hits (Sequence[ScoredChunk]): The retrieved chunks, most relevant first.
+        chunks_by_ordinal (Dict[int, str]): The fetched neighbour chunks.
+        neighbours (int): The number of chunks taken on each side.
+        char_budget (int): The maximum total length of the context.
+
+    Returns:
+        List[str]: The context passages, most relevant first.
+    """
+    passages: List[str] = []
+    used = 0
+
+    def add(text: str) -> bool:
+        nonlocal used
+        if used + len(text) > char_budget:
+            return False
+        passages.append(text)
+        used += len(text)
+        return True
+
+    for start, end in merge_windows(hits, neighbours):
+        text = ""
+        for ordinal in range(start, end + 1):
+            chunk = chunks_by_ordinal.get(ordinal)
+            if chunk:
+                text = join_overlapping(text, chunk) if text else chunk
+        if text and add(text):
+            continue
+        best = next(
+            hit for hit in hits
+            if hit.ordinal is not None and start <= hit.ordinal <= end
+        )
+        if best.content:
+            add(best.content)
+
+    for hit in hits:
+        if hit.ordinal is None:
+            add(hit.content)
+    return passages
+
+
+def pack_context(
+    passages: Sequence[Tuple[str, int]],
+    token_budget: int
+) -> PackedContext:
+    """
+    Fill the token budget with passages in relevance order.
+
+    A passage that does not fit is skipped, so a shorter, less relevant
+    one may still use the remaining budget. When no passage fits at all,
+    the most relevant one is truncated to the budget rather than
+    answering without context.
+
+    Args:
+        passages (Sequence[Tuple[str, int]]): The passages with their
+        token counts, most relevant first.
+        token_budget (int): The maximum number of context tokens.
+
+    Returns:
+        PackedContext: The packed passages, most relevant first.
+    """
+    packed: List[str] = []
+    used = 0
+    for text, tokens in passages:
+        cost = tokens + (PASSAGE_SEPARATOR_TOKENS if packed else 0)
+        if used + cost > token_budget:
+            continue
+        packed.append(text)
+        used += cost
+
+    if not packed and passages:
+        text = truncate_to_tokens(passages[0][0], token_budget)
+        if text:
+            return PackedContext([text], estimate_tokens(text))
+    return PackedContext(packed, used)
@@ -1,10 +1,12 @@
 import os
 import re
 import uuid
+import base64
 import asyncio
 import aiofiles
 import aiofiles.os as aios
-from typing import List
+from datetime import datetime
+from typing import List, Optional, Tuple
 import logging
 
 import concurrent.futures
@@ -22,15 +24,62 @@ from langchain.text_splitter import RecursiveCharacterTextSplitter
 from app.db.base import get_db_session
 from app.db.models.documents import Document, StatusEnum
 from app.core.config import Settings
-from app.core.exceptions import BadRequestException
+from app.core.exceptions import BadRequestException, NotFoundException
 from app.repositories.documents.documents import DocumentRepository
+from app.services.auth.rate_limiter import EMBEDDING_CHUNKS, UPLOAD_BYTES, RateLimiter
+from app.utils.metrics import (
+    INGEST_STAGE_SECONDS, INGESTED_BYTES, INGESTED_CHUNKS, INGESTED_DOCUMENTS,
+    INGESTED_TOKENS, INGESTIONS_IN_PROGRESS, file_type
+)
+from app.utils.tokens import estimate_tokens
+from .answer_cache import AnswerCache
 from .embeddings import EmbeddingService
+from .faq import FAQService
 
 
 logger = logging.getLogger(__name__)
 
 TEMP_UPLOAD_DIR = "temp_uploads"
 
+# documents deleted per round of chunk batches and final transaction
+DELETE_GROUP_SIZE = 100
+
+
+def encode_cursor(created_at: datetime, document_id: int) -> str:
+    """
+    Encode the position after a document as an opaque page cursor.
+
+    Args:
+        created_at (datetime): The creation time of the document.
+        document_id (int): The id of the document.
+
+    Returns:
+        str: The cursor.
+    """
+    raw = f"{created_at.isoformat()}|{document_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Decode a page cursor from encode_cursor.
+
+    Args:
+        cursor (str): The cursor.
+
+    Returns:
+        Tuple[datetime, int]: The creation time and id of the document.
+
+    Raises:
+        BadRequestException: If the cursor is malformed.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, document_id = raw.split("|")
+        return datetime.fromisoformat(created_at), int(document_id)
+    except ValueError:
+        raise BadRequestException(message="Invalid cursor")
+
 
 # async def save_upload_file_async(
 #     upload_file: UploadFile,
@@ -165,10 +214,24 @@ class FileService:
         Args:
             file (UploadFile): The uploaded file.
         """
-        file.file.seek(0, os.SEEK_END)
-        if file.file.tell() > self.max_size:
+        if self.get_size(file) > self.max_size:
             raise BadRequestException(message="File too large")
+
+    @staticmethod
+    def get_size(file: UploadFile) -> int:
+        """
+        Get the size of the uploaded file.
+
+        Args:
+            file (UploadFile): The uploaded file.
+
+        Returns:
+            int: The size of the file in bytes.
+        """
+        file.file.seek(0, os.SEEK_END)
+        size = file.file.tell()
         file.file.seek(0)
+        return size
 
     def get_user_temp_dir(self, user_id: int) -> str:
         """
@@ -224,7 +287,11 @@ class DocumentService:
         self,
         file_service: FileService,
         document_repo: DocumentRepository,
-        embedding_service: EmbeddingService
+        embedding_service: EmbeddingService,
+        faq_service: Optional[FAQService] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        answer_cache: Optional[AnswerCache] = None,
+        delete_batch_size: int = 1000
     ):
         """
         Initialize the DocumentService.
@@ -236,29 +303,64 @@ class DocumentService:
             instance for database interactions.
             embedding_service (EmbeddingService): The embedding service
             instance for generating embeddings.
+            faq_service (FAQService, optional): The service precomputing
+            answers to common questions once a document is processed.
+            rate_limiter (RateLimiter, optional): The per-user limits on
+            uploaded bytes and embedded chunks.
+            answer_cache (AnswerCache, optional): The cache of answers,
+            cleared of deleted documents.
+            delete_batch_size (int): The maximum number of chunks deleted
+            per transaction.
         """
         self.file_service = file_service
         self.document_repo = document_repo
         self.embedding_service = embedding_service
+        self.faq_service = faq_service
+        self.rate_limiter = rate_limiter
+        self.answer_cache = answer_cache
+        self.delete_batch_size = delete_batch_size
         
     async def get_documents(
         self,
         user_id: int,
-        session: AsyncSession
-    ):
+        session: AsyncSession,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        status: Optional[StatusEnum] = None
+    ) -> dict:
         """
-        Retrieve a list of documents for a specific user.
+        Retrieve a page of documents for a specific user, newest first.
+
+        One row more than the page is fetched, so a cursor is only
+        returned when there is a next page.
 
         Args:
             user_id (int): The ID of the user.
             session (AsyncSession): The database session.
+            limit (int): The maximum number of documents in the page.
+            cursor (str, optional): The next_cursor of the previous page.
+            status (StatusEnum, optional): Only documents with this status.
 
         Returns:
-            list[Document]: A list of documents belonging to the user.
+            dict: The documents of the page, the total number of the
+            user's documents with the status, and the cursor of the next
+            page or None.
+
+        Raises:
+            BadRequestException: If the cursor is malformed.
         """
-        return await self.document_repo.get_documents_by_user(
-            user_id, session
+        after = decode_cursor(cursor) if cursor else None
+        rows = await self.document_repo.get_documents_by_user(
+            user_id, session, limit=limit + 1, after=after, status=status
         )
+        total = await self.document_repo.count_documents_by_user(
+            user_id, session, status=status
+        )
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        return {"items": rows, "total": total, "next_cursor": next_cursor}
         
     async def get_user_document(
         self,
@@ -293,6 +395,72 @@ class DocumentService:
             
         return document
 
+    async def delete_documents(
+        self,
+        user_id: int,
+        session: AsyncSession,
+        document_ids: Optional[List[int]] = None
+    ) -> int:
+        """
+        Delete the user's documents and everything derived from them.
+
+        The documents are deleted a group at a time: their chunks in
+        batches of delete_batch_size, each committed on its own so a large
+        document never holds its locks for long, then their precomputed
+        answers, chat sessions, QA jobs and the documents themselves in
+        one transaction. Their answers are then dropped from this
+        process's answer cache; other workers' entries can no longer be
+        reached, since chat checks the document first, and are evicted
+        as the cache fills.
+
+        Args:
+            user_id (int): The ID of the user.
+            session (AsyncSession): The database session.
+            document_ids (List[int], optional): The documents to delete;
+            those not belonging to the user are ignored. All of the user's
+            documents if omitted.
+
+        Returns:
+            int: The number of documents deleted.
+        """
+        document_ids = await self.document_repo.get_document_ids_by_user(
+            user_id, session, document_ids
+        )
+        deleted = 0
+        for start in range(0, len(document_ids), DELETE_GROUP_SIZE):
+            group = document_ids[start:start + DELETE_GROUP_SIZE]
+            chunks = await self.document_repo.delete_chunks(
+                group, self.delete_batch_size, session
+            )
+            deleted += await self.document_repo.delete_documents(user_id, group, session)
+            if self.answer_cache:
+                for document_id in group:
+                    self.answer_cache.invalidate(document_id)
+            logger.info(
+                f"Deleted {len(group)} documents with {chunks} chunks (user {user_id})"
+            )
+        return deleted
+
+    async def delete_document(
+        self,
+        user_id: int,
+        document_id: int,
+        session: AsyncSession
+    ):
+        """
+        Delete one of the user's documents and everything derived from it.
+
+        Args:
+            user_id (int): The ID of the user.
+            document_id (int): The ID of the document.
+            session (AsyncSession): The database session.
+
+        Raises:
+            NotFoundException: If the user has no such document.
+        """
+        if not await self.delete_documents(user_id, session, [document_id]):
+            raise NotFoundException(message="Document not found")
+
     async def handle_upload(
         self, user_id: int,
         files: list[UploadFile],
@@ -302,16 +470,27 @@ class DocumentService:
         Handle the upload of a list of files.
 
         This method validates and saves the uploaded files to a temporary directory
-        and schedules their processing.
+        and schedules their processing. The upload is charged its size and
+        one embedded chunk per file up front; the remaining chunks are
+        charged once the files are split.
 
         Args:
             user_id (int): The ID of the user uploading the files.
             files (list[UploadFile]): The list of files to be uploaded.
             background_tasks (BackgroundTasks): The background tasks
             manager for scheduling async tasks.
+
+        Raises:
+            TooManyRequestsException: If the user is over their limits.
         """
         for file in files:
             await self.file_service.validate_file(file)
+
+        if self.rate_limiter:
+            await self.rate_limiter.acquire(
+                user_id, UPLOAD_BYTES, sum(self.file_service.get_size(file) for file in files)
+            )
+            await self.rate_limiter.acquire(user_id, EMBEDDING_CHUNKS, len(files))
         
         user_temp_dir = self.file_service.get_user_temp_dir(user_id)
         
@@ -334,27 +513,38 @@ class DocumentService:
         Process the uploaded document file.
 
         This method processes the content of the document, generates embeddings,
-        and stores the processed chunks in the database.
+        and stores the processed chunks in the database. Answers to common
+        questions are then precomputed in the background, if enabled, so
+        the next upload is not held up by them. The time of each stage and
+        the bytes, chunks and tokens ingested are recorded by file type.
 
         Args:
             temp_path (str): The temporary path of the saved file.
             user_id (int): The ID of the user who uploaded the file.
             original_filename (str): The original name of the uploaded file.
         """
+        kind = file_type(original_filename)
+        INGESTIONS_IN_PROGRESS.labels(kind).inc()
         try:
             loop = asyncio.get_event_loop()
+            size = await aios.path.getsize(temp_path)
             
             # Load the file content using langchain loaders.
-            content_list = await loop.run_in_executor(
-                None,
-                FileProcessor.process,
-                temp_path
-            )
+            with INGEST_STAGE_SECONDS.labels("parse", kind).time():
+                content_list = await loop.run_in_executor(
+                    None,
+                    FileProcessor.process,
+                    temp_path
+                )
             
             content = "\n".join(content_list)
             
             # Split the content into chunks
-            chunks = self.chunk_document(content)
+            with INGEST_STAGE_SECONDS.labels("chunk", kind).time():
+                chunks = self.chunk_document(content)
+            if self.rate_limiter:
+                # one chunk was charged with the upload
+                await self.rate_limiter.charge(user_id, EMBEDDING_CHUNKS, len(chunks) - 1)
             document_data = {
                 "file_name": original_filename,
                 "user_id": user_id,
@@ -371,18 +561,25 @@ class DocumentService:
                 
                 document_id = document.id
                 
-                with concurrent.futures.ThreadPoolExecutor() as executor:
-                    cleaned_chunks = list(executor.map(ContentCleaner.clean, chunks))
+                with INGEST_STAGE_SECONDS.labels("clean", kind).time():
+                    with concurrent.futures.ThreadPoolExecutor() as executor:
+                        cleaned_chunks = list(executor.map(ContentCleaner.clean, chunks))
                 
-                embeddings = await self.embedding_service.generate_embeddings(cleaned_chunks)
+                with INGEST_STAGE_SECONDS.labels("embed", kind).time():
+                    embeddings = await self.embedding_service.generate_embeddings(cleaned_chunks)
                 
                 chunk_data = [{
                     "document_id": document_id,
+                    "ordinal": ordinal,
                     "content": chunk,
+                    "token_count": estimate_tokens(chunk),
                     "embedding": embedding
-                } for chunk, embedding in zip(cleaned_chunks, embeddings)]
+                } for ordinal, (chunk, embedding) in enumerate(
+                    zip(cleaned_chunks, embeddings)
+                )]
                 
-                await self.document_repo.bulk_create_chunks(chunk_data, session)
+                with INGEST_STAGE_SECONDS.labels("insert", kind).time():
+                    await self.document_repo.bulk_create_chunks(chunk_data, session)
                 
                 # Process each chunk and store in DocumentChunk table
                 # for chunk_content in chunks:
@@ -406,7 +603,15 @@ class DocumentService:
                 # Update document status to SUCCESS
                 document.status = StatusEnum.SUCCESS
                 await session.commit()
+
+            INGESTED_DOCUMENTS.labels(kind, "success").inc()
+            INGESTED_BYTES.labels(kind).inc(size)
+            INGESTED_CHUNKS.labels(kind).inc(len(chunk_data))
+            INGESTED_TOKENS.labels(kind).inc(sum(chunk["token_count"] for chunk in chunk_data))
+            if self.faq_service:
+                self.faq_service.schedule(document_id)
         except Exception as e:
+            INGESTED_DOCUMENTS.labels(kind, "failed").inc()
             logger.error(
                 f"Failed to process {original_filename} (user {user_id}): {str(e)}",
                 exc_info=True
@@ -414,6 +619,7 @@ class DocumentService:
             if session:
                 await session.rollback()
         finally:
+            INGESTIONS_IN_PROGRESS.labels(kind).dec()
             await self.file_service.cleanup_temp_file(temp_path)
             
     def chunk_document(self, content: str) -> List[str]:
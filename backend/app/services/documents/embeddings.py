@@ -1,7 +1,9 @@
 from typing import List
+from ollama import AsyncClient
 from langchain_ollama import OllamaEmbeddings
 
 from app.core.config import get_settings
+from app.utils.metrics import EMBEDDED_TEXTS
 
 class EmbeddingService:
     def __init__(self, model_name: str = "llama3.2:1b"):
@@ -15,6 +17,9 @@ class EmbeddingService:
         """
         settings = get_settings()
         base_url = settings.ollama_url
+        self.model_name = model_name
+        self.base_url = base_url
+        self.keep_alive = settings.ollama_keep_alive
         self.embeddings = OllamaEmbeddings(
             model=model_name,
             base_url=base_url
@@ -49,8 +54,23 @@ class EmbeddingService:
             list[float]: The embedding vector.
         """
         truncated_text = self.truncate_text(text)
+        EMBEDDED_TEXTS.labels(self.model_name).inc()
         return await self.embeddings.aembed_query(truncated_text)
 
     async def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
         truncated_texts = [self.truncate_text(text) for text in texts]
+        EMBEDDED_TEXTS.labels(self.model_name).inc(len(truncated_texts))
         return await self.embeddings.aembed_documents(truncated_texts)
+
+    async def warm_up(self):
+        """
+        Load the embedding model with a tiny request and keep it loaded.
+
+        OllamaEmbeddings has no keep_alive option, so the request goes
+        through the Ollama client directly.
+        """
+        await AsyncClient(host=self.base_url).embed(
+            model=self.model_name,
+            input="warm-up",
+            keep_alive=self.keep_alive
+        )
@@ -0,0 +1,235 @@
+import re
+import time
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import Settings
+from .embeddings import EmbeddingService
+from .mmr import normalize
+
+
+logger = logging.getLogger(__name__)
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+
+def split_sentences(text: str, min_chars: int = 0) -> List[Tuple[int, int]]:
+    """
+    Split a passage into sentences.
+
+    Sentences end at ``.``, ``!`` or ``?`` followed by whitespace, or at a
+    blank line, so list items and headings stay apart from the text around
+    them.
+
+    Args:
+        text (str): The passage.
+        min_chars (int): Sentences shorter than this are dropped.
+
+    Returns:
+        List[Tuple[int, int]]: The start and end offsets of each sentence
+        in the passage, leading and trailing whitespace excluded.
+    """
+    spans = []
+    start = 0
+    for match in SENTENCE_BOUNDARY.finditer(text):
+        spans.append((start, match.start()))
+        start = match.end()
+    spans.append((start, len(text)))
+
+    sentences = []
+    for start, end in spans:
+        sentence = text[start:end]
+        stripped = sentence.strip()
+        if len(stripped) < max(min_chars, 1):
+            continue
+        start += len(sentence) - len(sentence.lstrip())
+        sentences.append((start, start + len(stripped)))
+    return sentences
+
+
+class SentenceEmbeddingCache:
+    """
+    In-memory LRU cache of normalized sentence embeddings.
+
+    Retrieval keeps returning the same chunks for questions about a
+    document, so after the first extractive answer most sentences are
+    already embedded and only the new ones go to Ollama.
+
+    Attributes:
+        max_entries (int): The maximum number of cached embeddings.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, sentence: str) -> Optional[np.ndarray]:
+        """
+        Get the embedding of a sentence.
+
+        Args:
+            sentence (str): The sentence.
+
+        Returns:
+            Optional[np.ndarray]: The normalized embedding, or None if the
+            sentence is not cached.
+        """
+        embedding = self._entries.get(sentence)
+        if embedding is not None:
+            self._entries.move_to_end(sentence)
+        return embedding
+
+    def put(self, sentence: str, embedding: Sequence[float]):
+        """
+        Cache the embedding of a sentence, evicting the least recently
+        used ones if needed.
+
+        Args:
+            sentence (str): The sentence.
+            embedding (Sequence[float]): The sentence embedding.
+        """
+        self._entries[sentence] = normalize(embedding)
+        self._entries.move_to_end(sentence)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+@dataclass
+class Highlight:
+    """
+    A sentence selected for an extractive answer.
+
+    Attributes:
+        passage (int): The index of the passage the sentence comes from.
+        start (int): The offset of the sentence in the passage.
+        end (int): The offset just past the sentence in the passage.
+        text (str): The sentence.
+        score (float): The cosine similarity to the question.
+    """
+    passage: int
+    start: int
+    end: int
+    text: str
+    score: float
+
+
+class ExtractiveAnswerer:
+    """
+    Answers a question with the retrieved sentences closest to it,
+    without calling the LLM.
+
+    The retrieved passages are split into sentences, the sentences missing
+    from the cache are embedded in one batch, and all of them are scored
+    against the question embedding with a single matrix product.
+
+    Attributes:
+        embedding_service (EmbeddingService): The embedding service.
+        cache (SentenceEmbeddingCache): The sentence embedding cache.
+        top_sentences (int): The number of sentences in an answer.
+        min_sentence_chars (int): Shorter sentences are not considered.
+    """
+
+    def __init__(
+        self,
+        embedding_service: EmbeddingService,
+        cache: SentenceEmbeddingCache,
+        top_sentences: int,
+        min_sentence_chars: int
+    ):
+        self.embedding_service = embedding_service
+        self.cache = cache
+        self.top_sentences = top_sentences
+        self.min_sentence_chars = min_sentence_chars
+
+    async def select(
+        self,
+        query_embedding: Sequence[float],
+        passages: List[str]
+    ) -> List[Highlight]:
+        """
+        Select the sentences of the passages closest to the question.
+
+        A sentence repeated in several passages, e.g. by overlapping
+        chunks, is only considered once.
+
+        Args:
+            query_embedding (Sequence[float]): The question embedding.
+            passages (List[str]): The retrieved passages, most relevant first.
+
+        Returns:
+            List[Highlight]: The selected sentences, best first.
+        """
+        started = time.perf_counter()
+        candidates: List[Tuple[int, int, int, str]] = []
+        seen = set()
+        for index, passage in enumerate(passages):
+            for start, end in split_sentences(passage, self.min_sentence_chars):
+                sentence = passage[start:end]
+                if sentence not in seen:
+                    seen.add(sentence)
+                    candidates.append((index, start, end, sentence))
+        if not candidates:
+            return []
+
+        vectors = {sentence: self.cache.get(sentence) for _, _, _, sentence in candidates}
+        missing = [sentence for sentence, vector in vectors.items() if vector is None]
+        if missing:
+            embeddings = await self.embedding_service.generate_embeddings(missing)
+            for sentence, embedding in zip(missing, embeddings):
+                self.cache.put(sentence, embedding)
+                vectors[sentence] = normalize(embedding)
+
+        matrix = np.stack([vectors[sentence] for _, _, _, sentence in candidates])
+        scores = matrix @ normalize(query_embedding)
+        count = min(self.top_sentences, len(candidates))
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best])]
+
+        logger.info(
+            f"Scored {len(candidates)} sentences ({len(missing)} embedded) in "
+            f"{(time.perf_counter() - started) * 1000:.1f} ms"
+        )
+        return [
+            Highlight(
+                passage=candidates[i][0],
+                start=candidates[i][1],
+                end=candidates[i][2],
+                text=candidates[i][3],
+                score=float(scores[i])
+            )
+            for i in best
+        ]
+
+
+def render_answer(highlights: List[Highlight]) -> str:
+    """
+    Join the selected sentences in the order they appear in the document.
+
+    Args:
+        highlights (List[Highlight]): The selected sentences.
+
+    Returns:
+        str: The answer.
+    """
+    ordered = sorted(highlights, key=lambda highlight: (highlight.passage, highlight.start))
+    return " ".join(highlight.text for highlight in ordered)
+
+
+def build_sentence_cache(settings: Settings) -> SentenceEmbeddingCache:
+    """
+    Build the sentence embedding cache from the settings.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        SentenceEmbeddingCache: The sentence embedding cache.
+    """
+    return SentenceEmbeddingCache(max_entries=settings.extractive_cache_max_entries)
@@ -0,0 +1,127 @@
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import Optional, Set
+
+from app.core.config import get_settings
+from app.db.base import get_db_session
+from .chat_service import ChatService
+from .context import PackedContext
+from .generation_gateway import GenerationGateway
+
+
+logger = logging.getLogger(__name__)
+
+# Keeps scheduled precomputations referenced until they finish.
+_pending: Set[asyncio.Task] = set()
+
+
+class FAQService:
+    """
+    Service pre-generating answers to common first questions once a
+    document is ingested.
+
+    The configured questions are embedded in one call and retrieved in one
+    SQL statement, then answered one at a time. Each generation waits
+    until the generation gateway has a free slot and nobody queued, so
+    precomputation only uses spare capacity and never delays a live chat.
+    The answers are stored with their question embedding; chat serves one
+    when a question is close enough to it.
+
+    Args:
+        chat_service (ChatService): The chat service, used for retrieval
+        and generation.
+        gateway (GenerationGateway, optional): The admission control
+        limiting concurrent generations.
+    """
+
+    def __init__(
+        self,
+        chat_service: ChatService,
+        gateway: Optional[GenerationGateway] = None
+    ):
+        self.chat_service = chat_service
+        self.gateway = gateway
+        self.settings = get_settings()
+
+    def schedule(self, document_id: int) -> asyncio.Task:
+        """
+        Precompute the answers of a document in the background.
+
+        Args:
+            document_id (int): The document id.
+
+        Returns:
+            asyncio.Task: The precomputation.
+        """
+        task = asyncio.create_task(self.precompute(document_id))
+        _pending.add(task)
+        task.add_done_callback(_pending.discard)
+        return task
+
+    async def precompute(self, document_id: int):
+        """
+        Generate and store the answers to the configured questions.
+
+        Questions without relevant context or whose generation fails are
+        skipped. Failures are logged and never affect the document.
+
+        Args:
+            document_id (int): The document id.
+        """
+        questions = self.settings.faq_questions
+        if not questions:
+            return
+        try:
+            embeddings = await self.chat_service.embedding_service.generate_embeddings(questions)
+            async with get_db_session() as session:
+                contexts = await self.chat_service.find_contexts(
+                    document_id, embeddings, session
+                )
+
+            faqs = []
+            for question, embedding, context in zip(questions, embeddings, contexts):
+                if not context.passages:
+                    continue
+                answer = await self._generate(question, context)
+                if answer is None:
+                    continue
+                faqs.append({
+                    "document_id": document_id,
+                    "question": question,
+                    "answer": answer,
+                    "sources": [chunk[:50] + "..." for chunk in context.passages],
+                    "embedding": embedding
+                })
+
+            if faqs:
+                async with get_db_session() as session:
+                    await self.chat_service.document_repo.bulk_create_faqs(faqs, session)
+            logger.info(
+                f"Precomputed {len(faqs)} of {len(questions)} answers for document {document_id}"
+            )
+        except Exception as e:
+            logger.error(f"Failed to precompute answers for document {document_id}: {e}")
+
+    async def _generate(self, question: str, context: PackedContext) -> Optional[str]:
+        """
+        Generate one answer once the gateway has spare capacity.
+        """
+        while self.gateway and not self.gateway.has_spare_capacity:
+            await asyncio.sleep(self.settings.faq_idle_poll)
+        try:
+            async with self._generation_slot():
+                return await self.chat_service.llm_service.generate_response(
+                    query=question,
+                    context="\n\n".join(context.passages),
+                    context_tokens=context.tokens
+                )
+        except Exception as e:
+            logger.warning(f"Skipping precomputed answer to {question!r}: {e}")
+            return None
+
+    def _generation_slot(self):
+        """
+        Hold a generation slot from the gateway, if one is configured.
+        """
+        return self.gateway.slot() if self.gateway else nullcontext()
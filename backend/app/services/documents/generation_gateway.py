@@ -0,0 +1,189 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Iterator
+
+from prometheus_client.core import (
+    CounterMetricFamily, GaugeMetricFamily, HistogramMetricFamily, Metric
+)
+
+from app.core.config import Settings
+from app.core.exceptions import ServiceUnavailableException
+from app.utils.metrics import Histogram
+
+
+logger = logging.getLogger(__name__)
+
+WAIT_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+
+class GenerationGateway:
+    """
+    Admission control in front of the LLM.
+
+    At most ``max_concurrency`` generations run at once; further requests
+    wait in a bounded FIFO queue for at most ``queue_timeout`` seconds.
+    Requests arriving when the queue is full, or still waiting when their
+    timeout expires, are shed with a 503 and a Retry-After header, so
+    latency stays bounded instead of piling up inside Ollama.
+
+    Attributes:
+        max_concurrency (int): The maximum number of concurrent generations.
+        max_queue (int): The maximum number of waiting requests.
+        queue_timeout (float): The maximum wait for a slot, in seconds.
+        retry_after (int): The Retry-After sent with a 503, in seconds.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        max_queue: int,
+        queue_timeout: float,
+        retry_after: int
+    ):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.queue_depth = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.wait_ms = Histogram(WAIT_BUCKETS_MS)
+
+    def _overloaded(self, reason: str) -> ServiceUnavailableException:
+        logger.warning(
+            f"Shedding generation request ({reason}): "
+            f"{self.in_flight} in flight, {self.queue_depth} queued"
+        )
+        return ServiceUnavailableException(
+            message="The assistant is busy, please retry shortly",
+            retry_after=self.retry_after
+        )
+
+    @property
+    def saturated(self) -> bool:
+        """
+        Whether every slot is taken and the wait queue is full.
+        """
+        return self._semaphore.locked() and self.queue_depth >= self.max_queue
+
+    @property
+    def has_spare_capacity(self) -> bool:
+        """
+        Whether a slot is free and no request is waiting for one.
+        """
+        return not self._semaphore.locked() and self.queue_depth == 0
+
+    def check_admission(self):
+        """
+        Reject the request right away if the wait queue is full.
+
+        Raises:
+            ServiceUnavailableException: If the queue is full.
+        """
+        if self.saturated:
+            self.rejected += 1
+            raise self._overloaded("queue full")
+
+    async def _acquire(self):
+        """
+        Take a slot, waiting in the queue only when none is free.
+        """
+        started = time.perf_counter()
+        if not self._semaphore.locked():
+            # A free slot is taken without suspending, so it is never
+            # counted as queued.
+            await self._semaphore.acquire()
+            self.wait_ms.observe((time.perf_counter() - started) * 1000)
+            return
+
+        self.queue_depth += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            raise self._overloaded("queue timeout")
+        finally:
+            self.queue_depth -= 1
+            self.wait_ms.observe((time.perf_counter() - started) * 1000)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """
+        Hold a generation slot for the duration of the block.
+
+        Raises:
+            ServiceUnavailableException: If the queue is full or no slot
+            frees up within the queue timeout.
+        """
+        self.check_admission()
+        await self._acquire()
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """
+        Get the current load and the queue wait-time histogram.
+
+        Returns:
+            dict: The gateway statistics.
+        """
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_ms": self.wait_ms.snapshot()
+        }
+
+    def collect(self) -> Iterator[Metric]:
+        """
+        Export the same statistics for Prometheus, with the queue wait in
+        seconds.
+
+        Yields:
+            Metric: The gateway metric families.
+        """
+        yield GaugeMetricFamily(
+            "generation_max_concurrency", "Generations allowed to run at once.", value=self.max_concurrency
+        )
+        yield GaugeMetricFamily("generation_in_flight", "Generations running.", value=self.in_flight)
+        yield GaugeMetricFamily(
+            "generation_queue_depth", "Requests waiting for a generation slot.", value=self.queue_depth
+        )
+        yield CounterMetricFamily(
+            "generation_rejected", "Requests shed because the queue was full.", value=self.rejected
+        )
+        yield CounterMetricFamily(
+            "generation_timed_out", "Requests shed after waiting for a slot too long.", value=self.timed_out
+        )
+        wait = HistogramMetricFamily("generation_queue_wait_seconds", "Time spent waiting for a generation slot.")
+        self.wait_ms.add_to(wait, divisor=1000)
+        yield wait
+
+
+def build_generation_gateway(settings: Settings) -> GenerationGateway:
+    """
+    Build the generation gateway from the settings.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        GenerationGateway: The generation gateway.
+    """
+    return GenerationGateway(
+        max_concurrency=settings.generation_max_concurrency,
+        max_queue=settings.generation_max_queue,
+        queue_timeout=settings.generation_queue_timeout,
+        retry_after=settings.generation_retry_after
+    )
@@ -1,11 +1,31 @@
+import math
+from typing import AsyncIterator, List, Optional, Tuple
 from langchain_ollama import ChatOllama
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.output_parsers import StrOutputParser
 from app.core.config import get_settings
+from app.utils.metrics import LLM_TOKENS
+from app.utils.tokens import estimate_tokens, record_token_usage
 import logging
 
 logger = logging.getLogger(__name__)
 
+SESSION_SYSTEM_PROMPT = """Answer questions about a document succinctly in markdown format. Follow these rules:
+
+1. Base your answers solely on the context below and the conversation so far.
+2. If they do not provide enough information, respond with "I don't know" without any additional commentary.
+3. Keep your answers short and to the point.
+
+Context:
+{context}"""
+
+SUMMARY_PROMPT = """Summarize the conversation below in a few sentences, keeping the facts, names and numbers that later questions may refer to. Reply with the summary only.
+
+Earlier summary: {summary}
+
+Conversation:
+{transcript}"""
+
 
 class LLMService:
     """
@@ -13,13 +33,18 @@ class LLMService:
 
     It uses the langchain library to interact with the LLM model.
     The service provides a single method to generate a response based on a given query and context.
+    Every generation uses the same context window (num_ctx), so that
+    Ollama keeps the model loaded. The tokens Ollama reports are recorded
+    per model.
     """
     def __init__(self):
         settings = get_settings()
+        self.settings = settings
         self.llm = ChatOllama(
             model="llama3.2:1b",
             base_url=settings.ollama_url,
             temperature=0.7,
+            keep_alive=settings.ollama_keep_alive,
             system="You are a helpful AI assistant. Answer questions based on the provided context."
         )
         
@@ -39,11 +64,195 @@ class LLMService:
                 Answer:"""
         )
 
+    def request_options(self) -> dict:
+        """
+        Get the context window and answer length of a generation.
+
+        Chats, session turns, summaries and the warm-up all use the one
+        llm_num_ctx window. Ollama reloads the model whenever num_ctx
+        changes, which costs the load time and drops the cached prompt
+        prefix, so the window is not sized per prompt.
+
+        Returns:
+            dict: The num_ctx and num_predict to use.
+        """
+        return {
+            "num_ctx": self.settings.llm_num_ctx,
+            "num_predict": self.settings.llm_num_predict
+        }
+
+    def fits_window(
+        self,
+        query: str,
+        context_tokens: int,
+        custom_prompt: str = None
+    ) -> bool:
+        """
+        Check that a prompt and its answer fit the context window.
+
+        The prompt estimate is padded by llm_token_margin, since an
+        underestimate would make the model silently drop the start of the
+        prompt.
+
+        Args:
+            query (str): The question to answer.
+            context_tokens (int): The estimated tokens of the context.
+            custom_prompt (str, optional): The custom prompt, if any.
+
+        Returns:
+            bool: Whether the padded prompt and num_predict fit num_ctx.
+        """
+        template = custom_prompt or self.prompt_template.messages[0].prompt.template
+        prompt_tokens = estimate_tokens(template) + estimate_tokens(query) + context_tokens
+        prompt_tokens = math.ceil(prompt_tokens * (1 + self.settings.llm_token_margin))
+        return prompt_tokens + self.settings.llm_num_predict <= self.settings.llm_num_ctx
+
+    @staticmethod
+    def render_question(question: str, context: Optional[str] = None) -> str:
+        """
+        Render a session question, with the passages sent along with it.
+
+        Args:
+            question (str): The question.
+            context (str, optional): Passages retrieved for this question
+            that are not part of the session context.
+
+        Returns:
+            str: The user message.
+        """
+        if not context:
+            return question
+        return f"Additional context:\n{context}\n\nQuestion: {question}"
+
+    def session_messages(
+        self,
+        context: str,
+        summary: Optional[str],
+        history: List[Tuple[str, str]],
+        question: str
+    ) -> List[BaseMessage]:
+        """
+        Assemble the prompt of a session turn.
+
+        The messages always come in the same order: instructions with the
+        pinned context, the summary of compacted turns, the remaining
+        turns verbatim and the new question. The prompt of a turn is then
+        the prompt of the previous turn followed by its answer and the new
+        question, and Ollama only has to evaluate that suffix.
+
+        Args:
+            context (str): The session context.
+            summary (str, optional): The summary of compacted turns.
+            history (List[Tuple[str, str]]): The (role, content) of the
+            turns after the summary, user messages already rendered.
+            question (str): The rendered new question.
+
+        Returns:
+            List[BaseMessage]: The chat messages.
+        """
+        messages: List[BaseMessage] = [
+            SystemMessage(SESSION_SYSTEM_PROMPT.format(context=context))
+        ]
+        if summary:
+            messages.append(SystemMessage(f"Summary of the earlier conversation:\n{summary}"))
+        for role, content in history:
+            messages.append(HumanMessage(content) if role == "user" else AIMessage(content))
+        messages.append(HumanMessage(question))
+        return messages
+
+    async def generate_turn(self, messages: List[BaseMessage]) -> Tuple[str, dict]:
+        """
+        Generate the answer of a session turn.
+
+        Args:
+            messages (List[BaseMessage]): The prompt from session_messages.
+
+        Returns:
+            Tuple[str, dict]: The answer and Ollama's response metadata,
+            including prompt_eval_count and prompt_eval_duration.
+        """
+        llm = self.llm.model_copy(update=self.request_options())
+        message = await llm.ainvoke(messages)
+        self._record_usage(message)
+        return message.content, message.response_metadata
+
+    async def summarize(self, summary: Optional[str], history: List[Tuple[str, str]]) -> str:
+        """
+        Fold session turns into the running summary.
+
+        Args:
+            summary (str, optional): The current summary.
+            history (List[Tuple[str, str]]): The (role, content) of the
+            turns to fold in.
+
+        Returns:
+            str: The new summary.
+        """
+        options = {
+            **self.request_options(),
+            "num_predict": self.settings.chat_summary_max_tokens
+        }
+        llm = self.llm.model_copy(update=options)
+        transcript = "\n".join(f"{role.capitalize()}: {content}" for role, content in history)
+        message = await llm.ainvoke(SUMMARY_PROMPT.format(
+            summary=summary or "(none)", transcript=transcript
+        ))
+        self._record_usage(message)
+        return message.content.strip()
+
+    async def warm_up(self):
+        """
+        Load the chat model with a one-token generation.
+
+        The request uses the same context window as every chat, since
+        Ollama reloads the model when num_ctx changes.
+        """
+        llm = self.llm.model_copy(update={**self.request_options(), "num_predict": 1})
+        await llm.ainvoke("Hi")
+
+    def _record_usage(self, message: BaseMessage):
+        """
+        Count the prompt and completion tokens Ollama reported for a
+        generation; streamed generations report them on the last chunk.
+        They are also added to the request's tally, which the rate limiter
+        charges instead of its estimate.
+        """
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            prompt_tokens = usage.get("input_tokens", 0)
+            completion_tokens = usage.get("output_tokens", 0)
+            LLM_TOKENS.labels(self.llm.model, "prompt").inc(prompt_tokens)
+            LLM_TOKENS.labels(self.llm.model, "completion").inc(completion_tokens)
+            record_token_usage(prompt_tokens + completion_tokens)
+
+    def _build_chain(
+        self,
+        query: str,
+        context: str,
+        custom_prompt: Optional[str],
+        context_tokens: Optional[int]
+    ):
+        prompt = self.prompt_template
+        if custom_prompt:
+            prompt = ChatPromptTemplate.from_template(custom_prompt)
+
+        if context_tokens is None:
+            context_tokens = estimate_tokens(context)
+        if not self.fits_window(query, context_tokens, custom_prompt):
+            logger.warning(
+                f"Prompt of {context_tokens} context tokens may not fit "
+                f"num_ctx={self.settings.llm_num_ctx}"
+            )
+        # The copy shares the underlying HTTP clients.
+        llm = self.llm.model_copy(update=self.request_options())
+        return prompt | llm
+
     async def generate_response(
         self,
         query: str,
         context: str,
-        custom_prompt: str = None
+        custom_prompt: str = None,
+        context_tokens: Optional[int] = None
     ) -> str:
         """
         Generate a response using Llama model
@@ -52,22 +261,49 @@ class LLMService:
             query (str): The question to answer.
             context (str): The context to use when generating the response.
             custom_prompt (str, optional): The custom prompt to use when generating the response. Defaults to None.
+            context_tokens (int, optional): The estimated tokens of the context, estimated from it if not given.
 
         Returns:
             str: The generated response.
+
+        Raises:
+            Exception: If the model call fails, so that callers can tell a
+            failure apart from an answer.
+        """
+        chain = self._build_chain(query, context, custom_prompt, context_tokens)
+
+        message = await chain.ainvoke({
+            "context": context,
+            "question": query
+        })
+        self._record_usage(message)
+        return message.content
+
+    async def stream_response(
+        self,
+        query: str,
+        context: str,
+        custom_prompt: str = None,
+        context_tokens: Optional[int] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream a response from the Llama model token by token
+
+        Args:
+            query (str): The question to answer.
+            context (str): The context to use when generating the response.
+            custom_prompt (str, optional): The custom prompt to use when generating the response. Defaults to None.
+            context_tokens (int, optional): The estimated tokens of the context, estimated from it if not given.
+
+        Yields:
+            str: The generated tokens.
         """
-        try:
-            prompt = self.prompt_template
-            if custom_prompt:
-                prompt = ChatPromptTemplate.from_template(custom_prompt)
-                
-            chain = prompt | self.llm | StrOutputParser()
-            
-            return await chain.ainvoke({
-                "context": context,
-                "question": query
-            })
-            
-        except Exception as e:
-            logger.error(f"Exception : {e}")
-            return "Sorry, I encountered an error processing your request."
+        chain = self._build_chain(query, context, custom_prompt, context_tokens)
+
+        async for chunk in chain.astream({
+            "context": context,
+            "question": query
+        }):
+            self._record_usage(chunk)
+            if chunk.content:
+                yield chunk.content
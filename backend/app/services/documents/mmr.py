@@ -0,0 +1,82 @@
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+
+def _normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def normalize(vector: Sequence[float]) -> np.ndarray:
+    """
+    Scale an embedding to unit length, so that dot products are cosine
+    similarities. A zero vector is returned unchanged.
+
+    Args:
+        vector (Sequence[float]): The embedding.
+
+    Returns:
+        np.ndarray: The unit-length float32 embedding.
+    """
+    return _normalize_rows(np.asarray(vector, dtype=np.float32))
+
+
+def mmr_select(
+    query_embedding: Sequence[float],
+    candidate_embeddings: Sequence[Sequence[float]],
+    k: int,
+    lambda_mult: float = 0.5,
+    relevance: Optional[Sequence[float]] = None
+) -> List[int]:
+    """
+    Select candidates by maximal marginal relevance.
+
+    Each step picks the candidate maximising
+    ``lambda * relevance - (1 - lambda) * max_similarity_to_selected``,
+    so near-duplicate chunks (e.g. overlapping neighbours) are skipped
+    in favour of ones adding new information.
+
+    Args:
+        query_embedding (Sequence[float]): The query embedding.
+        candidate_embeddings (Sequence[Sequence[float]]): The candidate
+        embeddings, in retrieval order.
+        k (int): The number of candidates to select.
+        lambda_mult (float): Trade-off between relevance (1.0) and
+        diversity (0.0).
+        relevance (Sequence[float], optional): Relevance scores to use
+        instead of the cosine similarity to the query, e.g. reranker
+        scores. They are rescaled to [0, 1].
+
+    Returns:
+        List[int]: The indices of the selected candidates, in selection order.
+    """
+    n = len(candidate_embeddings)
+    if n == 0 or k <= 0:
+        return []
+
+    embeddings = _normalize_rows(np.asarray(candidate_embeddings, dtype=np.float32))
+    if relevance is None:
+        query = _normalize_rows(np.asarray(query_embedding, dtype=np.float32))
+        scores = embeddings @ query
+    else:
+        scores = np.asarray(relevance, dtype=np.float32)
+        spread = scores.max() - scores.min()
+        scores = (scores - scores.min()) / spread if spread > 0 else np.ones(n, dtype=np.float32)
+
+    pairwise = embeddings @ embeddings.T
+    max_similarity = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+    selected: List[int] = []
+
+    for _ in range(min(k, n)):
+        redundancy = np.where(np.isinf(max_similarity), 0.0, max_similarity)
+        marginal = lambda_mult * scores - (1 - lambda_mult) * redundancy
+        marginal[~available] = -np.inf
+        best = int(np.argmax(marginal))
+        selected.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, pairwise[best])
+
+    return selected
@@ -0,0 +1,148 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from ollama import AsyncClient
+
+from app.core.config import Settings
+from .embeddings import EmbeddingService
+from .llm_service import LLMService
+
+
+logger = logging.getLogger(__name__)
+
+
+class ModelWarmer:
+    """
+    Keeps the Ollama chat and embedding models loaded.
+
+    At startup both models are loaded with tiny requests, retrying until
+    they respond; the service is ready only from then on. Afterwards the
+    loaded models are checked every ``keep_warm_interval`` seconds and a
+    model is warmed again only when it has been unloaded or is about to
+    expire. Real traffic pushes the expiry forward, so the extra requests
+    only happen during idle periods.
+
+    Attributes:
+        llm_service (LLMService): The chat model service.
+        embedding_service (EmbeddingService): The embedding model service.
+        keep_warm_interval (int): Seconds between keep-warm checks.
+        retry_interval (int): Seconds between startup warm-up attempts.
+    """
+
+    def __init__(
+        self,
+        llm_service: LLMService,
+        embedding_service: EmbeddingService,
+        ollama_url: str,
+        keep_warm_interval: int,
+        retry_interval: int
+    ):
+        self.llm_service = llm_service
+        self.embedding_service = embedding_service
+        self.client = AsyncClient(host=ollama_url)
+        self.keep_warm_interval = keep_warm_interval
+        self.retry_interval = retry_interval
+        self.models = {"chat": False, "embedding": False}
+        self.last_warmed: Optional[datetime] = None
+
+    @property
+    def ready(self) -> bool:
+        return all(self.models.values())
+
+    async def warm(self, roles=("chat", "embedding")) -> bool:
+        """
+        Send a tiny request to each model so Ollama loads it.
+
+        Args:
+            roles (Iterable[str]): The models to warm.
+
+        Returns:
+            bool: Whether all models respond.
+        """
+        warmers = {
+            "chat": self.llm_service.warm_up,
+            "embedding": self.embedding_service.warm_up
+        }
+        results = await asyncio.gather(
+            *(warmers[role]() for role in roles), return_exceptions=True
+        )
+        for role, result in zip(roles, results):
+            self.models[role] = not isinstance(result, Exception)
+            if isinstance(result, Exception):
+                logger.warning(f"Warming the {role} model failed: {result}")
+        self.last_warmed = datetime.now(timezone.utc)
+        return self.ready
+
+    async def stale_models(self) -> list:
+        """
+        Find the models that are unloaded or expire before the next check.
+
+        Returns:
+            list: The roles of the models to warm.
+        """
+        horizon = datetime.now(timezone.utc) + timedelta(seconds=2 * self.keep_warm_interval)
+        loaded = {
+            model.model: model.expires_at
+            for model in (await self.client.ps()).models
+        }
+        names = {
+            "chat": self.llm_service.llm.model,
+            "embedding": self.embedding_service.model_name
+        }
+        return [
+            role for role, name in names.items()
+            if loaded.get(name) is None or loaded[name] < horizon
+        ]
+
+    async def run(self):
+        """
+        Warm the models until they respond, then keep them loaded.
+        """
+        while not await self.warm():
+            await asyncio.sleep(self.retry_interval)
+        logger.info("Chat and embedding models are warm")
+
+        while True:
+            await asyncio.sleep(self.keep_warm_interval)
+            try:
+                stale = await self.stale_models()
+            except Exception as e:
+                logger.warning(f"Checking the loaded models failed: {e}")
+                stale = list(self.models)
+            if stale:
+                logger.info(f"Keeping models warm: {', '.join(stale)}")
+                await self.warm(stale)
+
+    def status(self) -> dict:
+        """
+        Get the readiness of each model.
+
+        Returns:
+            dict: Whether each model responded to its last warm-up.
+        """
+        return {
+            "ready": self.ready,
+            "models": dict(self.models),
+            "last_warmed": self.last_warmed.isoformat() if self.last_warmed else None
+        }
+
+
+def build_model_warmer(settings: Settings) -> ModelWarmer:
+    """
+    Build the model warmer from the settings.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        ModelWarmer: The model warmer.
+    """
+    return ModelWarmer(
+        llm_service=LLMService(),
+        embedding_service=EmbeddingService(),
+        ollama_url=settings.ollama_url,
+        keep_warm_interval=settings.keep_warm_interval,
+        retry_interval=settings.model_warmup_retry
+    )
@@ -0,0 +1,229 @@
+import asyncio
+import logging
+from contextlib import nullcontext
+from typing import List, Optional, Tuple
+from fastapi import BackgroundTasks
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.core.exceptions import ServiceUnavailableException
+from app.db.base import get_db_session
+from app.db.models.jobs import QAJob, QAJobAnswer, QAJobStatusEnum
+from app.repositories.documents.qa_jobs import QAJobRepository
+from app.services.auth.rate_limiter import LLM_TOKENS, RateLimiter
+from app.utils.tokens import track_token_usage
+from .chat_service import NO_CONTEXT_RESPONSE, ChatService
+from .context import PackedContext
+from .generation_gateway import GenerationGateway
+
+
+logger = logging.getLogger(__name__)
+
+
+class QAJobService:
+    """
+    Service for answering a list of questions about a document in the
+    background.
+
+    All questions are embedded in one call and searched in one SQL
+    statement. Generations then run qa_job_concurrency at a time, each
+    holding a slot of the generation gateway like an interactive chat. A
+    job does not give up when the gateway sheds it: it waits Retry-After
+    and asks again, up to qa_job_max_attempts times, so a large checklist
+    yields to interactive traffic instead of crowding it out. Answers are
+    stored as they complete, so a job can be polled while it runs. The
+    LLM tokens reserved when the job was submitted are settled to those
+    the model reported once it ends.
+
+    Args:
+        job_repo (QAJobRepository): The QA job repository.
+        chat_service (ChatService): The chat service, used for retrieval
+        and generation.
+        gateway (GenerationGateway, optional): The admission control
+        limiting concurrent generations.
+        rate_limiter (RateLimiter, optional): The per-user limit the
+        reserved tokens were charged to.
+    """
+
+    def __init__(
+        self,
+        job_repo: QAJobRepository,
+        chat_service: ChatService,
+        gateway: Optional[GenerationGateway] = None,
+        rate_limiter: Optional[RateLimiter] = None
+    ):
+        self.job_repo = job_repo
+        self.chat_service = chat_service
+        self.gateway = gateway
+        self.rate_limiter = rate_limiter
+        self.settings = get_settings()
+
+    async def submit(
+        self,
+        user_id: int,
+        document_id: int,
+        questions: List[str],
+        background_tasks: BackgroundTasks,
+        session: AsyncSession,
+        reserved_tokens: float = 0
+    ) -> QAJob:
+        """
+        Store a QA job and schedule it.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            questions (List[str]): The questions.
+            background_tasks (BackgroundTasks): The background tasks
+            manager for scheduling the job.
+            session (AsyncSession): The database session.
+            reserved_tokens (float): The LLM tokens reserved for the job.
+
+        Returns:
+            QAJob: The pending job.
+        """
+        job = await self.job_repo.create(user_id, document_id, questions, session)
+        background_tasks.add_task(
+            self.run, job_id=job.id, user_id=user_id, reserved_tokens=reserved_tokens
+        )
+        return job
+
+    async def get_job(
+        self,
+        user_id: int,
+        document_id: int,
+        job_id: int,
+        session: AsyncSession
+    ) -> Tuple[QAJob, List[QAJobAnswer]]:
+        """
+        Get a QA job with its questions and the answers so far.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            job_id (int): The job id.
+            session (AsyncSession): The database session.
+
+        Returns:
+            Tuple[QAJob, List[QAJobAnswer]]: The job and its questions, in
+            the order they were sent.
+
+        Raises:
+            NotFoundException: If the user has no such job.
+        """
+        job = await self.job_repo.get(job_id, session, user_id=user_id, document_id=document_id)
+        answers = await self.job_repo.get_answers(job.id, session)
+        return job, answers
+
+    async def run(self, job_id: int, user_id: Optional[int] = None, reserved_tokens: float = 0):
+        """
+        Answer every question of a QA job.
+
+        A question that cannot be answered is stored with an error; the
+        job only fails if retrieval does.
+
+        Args:
+            job_id (int): The job id.
+            user_id (int, optional): The user the tokens were reserved for.
+            reserved_tokens (float): The LLM tokens reserved for the job.
+        """
+        with track_token_usage() as usage:
+            try:
+                await self._run(job_id)
+            finally:
+                if self.rate_limiter and reserved_tokens:
+                    await self.rate_limiter.settle(
+                        user_id, LLM_TOKENS, reserved_tokens, usage.tokens
+                    )
+
+    async def _run(self, job_id: int):
+        async with get_db_session() as session:
+            try:
+                job = await self.job_repo.get(job_id, session)
+                document_id = job.document_id
+                await self.job_repo.set_status(job_id, QAJobStatusEnum.RUNNING, session)
+                await self._answer_all(job_id, document_id, session)
+                await self.job_repo.set_status(job_id, QAJobStatusEnum.SUCCESS, session)
+            except Exception as e:
+                logger.error(f"QA job {job_id} failed: {e}", exc_info=True)
+                await session.rollback()
+                await self.job_repo.set_status(job_id, QAJobStatusEnum.FAILED, session)
+
+    async def _answer_all(self, job_id: int, document_id: int, session: AsyncSession):
+        """
+        Retrieve the context of every question, then generate and store
+        the answers as they complete.
+        """
+        answers = await self.job_repo.get_answers(job_id, session)
+        ordinals = [answer.ordinal for answer in answers]
+        questions = [answer.question for answer in answers]
+        embeddings = await self.chat_service.embedding_service.generate_embeddings(questions)
+        contexts = await self.chat_service.find_contexts(document_id, embeddings, session)
+        await session.commit()
+        logger.info(f"Retrieved context for {len(questions)} questions of QA job {job_id}")
+
+        limit = asyncio.Semaphore(self.settings.qa_job_concurrency)
+
+        async def answer(ordinal: int, question: str, context: PackedContext):
+            async with limit:
+                return ordinal, context, await self._generate(question, context)
+
+        pending = [
+            answer(ordinal, question, context)
+            for ordinal, question, context in zip(ordinals, questions, contexts)
+        ]
+        # Answers are stored one at a time, the session is not shared.
+        for finished in asyncio.as_completed(pending):
+            ordinal, context, (response, error) = await finished
+            await self.job_repo.save_answer(
+                job_id,
+                ordinal,
+                session,
+                answer=response,
+                sources=[chunk[:50] + "..." for chunk in context.passages] if response else None,
+                error=error
+            )
+
+    async def _generate(
+        self,
+        question: str,
+        context: PackedContext
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        Generate the answer to one question, waiting for the gateway to
+        admit it.
+
+        Returns:
+            Tuple[Optional[str], Optional[str]]: The answer, or the reason
+            there is none.
+        """
+        if not context.passages:
+            return NO_CONTEXT_RESPONSE, None
+
+        for _ in range(self.settings.qa_job_max_attempts):
+            try:
+                async with self._generation_slot():
+                    response = await self.chat_service.llm_service.generate_response(
+                        query=question,
+                        context="\n\n".join(context.passages),
+                        context_tokens=context.tokens
+                    )
+                return response, None
+            except ServiceUnavailableException:
+                await asyncio.sleep(self._retry_after())
+            except Exception as e:
+                logger.error(f"Error answering QA job question: {e}")
+                return None, "Failed to generate an answer"
+        return None, "The assistant stayed busy"
+
+    def _retry_after(self) -> int:
+        """
+        Seconds to wait before asking for a generation again.
+        """
+        return self.gateway.retry_after if self.gateway else self.settings.generation_retry_after
+
+    def _generation_slot(self):
+        """
+        Hold a generation slot from the gateway, if one is configured.
+        """
+        return self.gateway.slot() if self.gateway else nullcontext()
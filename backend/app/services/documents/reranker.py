@@ -0,0 +1,191 @@
+import time
+import asyncio
+import logging
+import concurrent.futures
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+from app.core.config import Settings
+
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker(ABC):
+    """
+    Base class for a reranking stage between retrieval and generation.
+
+    A reranker receives the candidates fetched by vector search and
+    returns one relevance score per candidate, or None when it could
+    not score them in time and the caller should keep vector order.
+
+    Attributes:
+        candidates (int): The number of candidates to fetch for reranking.
+        top_k (int): The number of candidates to keep after reranking.
+    """
+
+    def __init__(self, candidates: int, top_k: int):
+        self.candidates = candidates
+        self.top_k = top_k
+
+    @abstractmethod
+    async def score(
+        self, query: str, passages: List[str]
+    ) -> Optional[List[float]]:
+        """
+        Score the passages against the query.
+
+        Args:
+            query (str): The user query.
+            passages (List[str]): The candidate passages.
+
+        Returns:
+            Optional[List[float]]: One score per passage, higher is better,
+            or None to fall back to vector order.
+        """
+
+
+class CrossEncoderReranker(Reranker):
+    """
+    Reranker backed by a small local cross-encoder running on the CPU.
+
+    The model is loaded lazily in the background on first use and the
+    candidates are scored in batches on a dedicated worker thread. The
+    worker stops between batches once the time budget is spent, in which
+    case the vector order is kept. Only one request is scored at a time:
+    a request arriving while the worker is busy keeps the vector order
+    rather than queueing behind it, and so does one whose scoring fails.
+    Requires the optional
+    ``sentence-transformers`` package.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        candidates: int,
+        top_k: int,
+        batch_size: int,
+        budget_ms: int
+    ):
+        super().__init__(candidates, top_k)
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.budget = budget_ms / 1000
+        self._model = None
+        self._loader: Optional[asyncio.Future] = None
+        self._load_failed = False
+        self._busy = False
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="reranker"
+        )
+
+    def _load_model(self):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            logger.error(
+                "Reranking is enabled but sentence-transformers is not installed"
+            )
+            return None
+        return CrossEncoder(self.model_name, device="cpu")
+
+    def _ensure_loaded(self) -> bool:
+        """
+        Return True once the model is ready, starting the load if needed.
+        """
+        if self._model is not None:
+            return True
+        if self._load_failed:
+            return False
+        if self._loader is None:
+            loop = asyncio.get_running_loop()
+            self._loader = loop.run_in_executor(self._executor, self._load_model)
+        elif self._loader.done():
+            error = self._loader.exception()
+            if error is not None:
+                logger.error(
+                    f"Failed to load reranker model {self.model_name}, "
+                    f"reranking is disabled: {error}"
+                )
+                self._load_failed = True
+                return False
+            self._model = self._loader.result()
+            self._load_failed = self._model is None
+            return self._model is not None
+        return False
+
+    def _predict(self, pairs: List[tuple]) -> List[float]:
+        return [float(score) for score in self._model.predict(pairs)]
+
+    def _predict_until(
+        self, query: str, passages: List[str], deadline: float
+    ) -> Optional[List[float]]:
+        """
+        Score the passages batch by batch, giving up once past the deadline.
+        """
+        scores: List[float] = []
+        for start in range(0, len(passages), self.batch_size):
+            if time.monotonic() >= deadline:
+                return None
+            pairs = [(query, passage) for passage in passages[start:start + self.batch_size]]
+            scores.extend(self._predict(pairs))
+        return scores
+
+    def _release(self, _future: asyncio.Future):
+        self._busy = False
+
+    async def score(
+        self, query: str, passages: List[str]
+    ) -> Optional[List[float]]:
+        if not passages or not self._ensure_loaded():
+            return None
+        if self._busy:
+            logger.info("Reranker busy with another request, keeping vector order")
+            return None
+
+        loop = asyncio.get_running_loop()
+        self._busy = True
+        job = loop.run_in_executor(
+            self._executor,
+            self._predict_until,
+            query,
+            passages,
+            time.monotonic() + self.budget
+        )
+        # The worker is only free again once the job has really finished,
+        # not when this request stops waiting for it.
+        job.add_done_callback(self._release)
+        try:
+            scores = await asyncio.wait_for(asyncio.shield(job), timeout=self.budget)
+        except asyncio.TimeoutError:
+            scores = None
+        except Exception as e:
+            logger.error(f"Reranking failed, keeping vector order: {e}")
+            return None
+        if scores is None:
+            logger.warning(
+                f"Rerank budget of {self.budget * 1000:.0f} ms exhausted, "
+                "keeping vector order"
+            )
+        return scores
+
+
+def build_reranker(settings: Settings) -> Optional[Reranker]:
+    """
+    Build the configured reranker.
+
+    Args:
+        settings (Settings): The application settings.
+
+    Returns:
+        Optional[Reranker]: The reranker, or None if reranking is disabled.
+    """
+    if not settings.rerank_enabled:
+        return None
+    return CrossEncoderReranker(
+        model_name=settings.rerank_model,
+        candidates=settings.rerank_candidates,
+        top_k=settings.rerank_top_k,
+        batch_size=settings.rerank_batch_size,
+        budget_ms=settings.rerank_budget_ms
+    )
@@ -0,0 +1,359 @@
+import logging
+from contextlib import nullcontext
+from typing import Iterator, List, Optional, Tuple
+
+from prometheus_client.core import HistogramMetricFamily, Metric
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import get_settings
+from app.db.models.chat import ChatMessage, ChatSession
+from app.repositories.documents.chat_sessions import ChatSessionRepository
+from app.utils.deadline import Deadline
+from app.utils.metrics import CHAT_STAGE_SECONDS, Histogram
+from app.utils.tokens import estimate_tokens
+from .chat_service import NO_CONTEXT_RESPONSE, ChatService
+from .context import pack_context
+from .generation_gateway import GenerationGateway
+from .llm_service import LLMService
+
+
+logger = logging.getLogger(__name__)
+
+PREFILL_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+PROMPT_TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+
+
+class PrefillMetrics:
+    """
+    Prompt evaluation (prefill) time and size of session turns, reported
+    by Ollama.
+
+    First questions are tracked apart from follow-ups: a follow-up whose
+    prompt prefix is still cached only has its new suffix evaluated, which
+    shows up as fewer evaluated tokens and a shorter prefill.
+    """
+
+    def __init__(self):
+        self.prefill_ms = {
+            "first": Histogram(PREFILL_BUCKETS_MS),
+            "follow_up": Histogram(PREFILL_BUCKETS_MS)
+        }
+        self.prompt_eval_count = {
+            "first": Histogram(PROMPT_TOKEN_BUCKETS),
+            "follow_up": Histogram(PROMPT_TOKEN_BUCKETS)
+        }
+
+    def observe(self, kind: str, prefill_ms: Optional[float], prompt_eval_count: Optional[int]):
+        """
+        Record the prefill of a turn.
+
+        Args:
+            kind (str): "first" or "follow_up".
+            prefill_ms (float, optional): The prompt evaluation time.
+            prompt_eval_count (int, optional): The evaluated prompt tokens.
+        """
+        if prefill_ms is not None:
+            self.prefill_ms[kind].observe(prefill_ms)
+        if prompt_eval_count is not None:
+            self.prompt_eval_count[kind].observe(prompt_eval_count)
+
+    def stats(self) -> dict:
+        """
+        Get the prefill histograms.
+
+        Returns:
+            dict: The histograms of each kind of turn.
+        """
+        return {
+            kind: {
+                "prefill_ms": self.prefill_ms[kind].snapshot(),
+                "prompt_eval_count": self.prompt_eval_count[kind].snapshot()
+            }
+            for kind in self.prefill_ms
+        }
+
+    def collect(self) -> Iterator[Metric]:
+        """
+        Export the prefill histograms for Prometheus, with the time in
+        seconds.
+
+        Yields:
+            Metric: The prefill metric families, labelled by turn.
+        """
+        prefill = HistogramMetricFamily(
+            "session_prefill_seconds", "Prompt evaluation time of session turns.", labels=["turn"]
+        )
+        prompt_eval = HistogramMetricFamily(
+            "session_prompt_eval_tokens", "Prompt tokens evaluated for session turns.", labels=["turn"]
+        )
+        for kind in self.prefill_ms:
+            self.prefill_ms[kind].add_to(prefill, [kind], divisor=1000)
+            self.prompt_eval_count[kind].add_to(prompt_eval, [kind])
+        yield prefill
+        yield prompt_eval
+
+
+class ChatSessionService:
+    """
+    Service for multi-turn chat sessions about a document.
+
+    The context retrieved for the first question is pinned to the session.
+    A follow-up is still embedded and searched, but only passages missing
+    from the pinned context are sent, alongside the question. Prompts keep
+    a stable order (instructions and context, summary, turns, question),
+    so each turn extends the previous prompt and Ollama can reuse its
+    evaluated prefix. Once the history grows past the token threshold,
+    the older turns are folded into a summary.
+
+    Args:
+        session_repo (ChatSessionRepository): The chat session repository.
+        chat_service (ChatService): The chat service, used for retrieval.
+        llm_service (LLMService): The LLM service instance.
+        gateway (GenerationGateway, optional): The admission control
+        limiting concurrent generations.
+        metrics (PrefillMetrics, optional): The prefill metrics to record.
+    """
+
+    def __init__(
+        self,
+        session_repo: ChatSessionRepository,
+        chat_service: ChatService,
+        llm_service: LLMService,
+        gateway: Optional[GenerationGateway] = None,
+        metrics: Optional[PrefillMetrics] = None
+    ):
+        self.session_repo = session_repo
+        self.chat_service = chat_service
+        self.llm_service = llm_service
+        self.gateway = gateway
+        self.metrics = metrics
+        self.settings = get_settings()
+
+    async def create_session(
+        self,
+        user_id: int,
+        document_id: int,
+        session: AsyncSession
+    ) -> ChatSession:
+        """
+        Start a chat session.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            session (AsyncSession): The database session.
+
+        Returns:
+            ChatSession: The new chat session.
+        """
+        return await self.session_repo.create(user_id, document_id, session)
+
+    async def get_session(
+        self,
+        user_id: int,
+        document_id: int,
+        session_id: int,
+        session: AsyncSession
+    ) -> Tuple[ChatSession, List[ChatMessage]]:
+        """
+        Get a chat session with all its messages.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            session_id (int): The chat session id.
+            session (AsyncSession): The database session.
+
+        Returns:
+            Tuple[ChatSession, List[ChatMessage]]: The session and its
+            messages, oldest first.
+
+        Raises:
+            NotFoundException: If the user has no such session.
+        """
+        chat_session = await self.session_repo.get(user_id, document_id, session_id, session)
+        messages = await self.session_repo.get_messages(chat_session.id, session)
+        return chat_session, messages
+
+    async def chat(
+        self,
+        user_id: int,
+        document_id: int,
+        session_id: int,
+        message: str,
+        session: AsyncSession,
+        query_embedding: Optional[list] = None,
+        deadline: Optional[Deadline] = None
+    ) -> dict:
+        """
+        Answer a message within a chat session.
+
+        A failed generation is answered with an apology and leaves the
+        session unchanged.
+
+        Args:
+            user_id (int): The user id.
+            document_id (int): The document id.
+            session_id (int): The chat session id.
+            message (str): The message.
+            session (AsyncSession): The database session.
+            query_embedding (list, optional): The message embedding, if
+            already computed.
+            deadline (Deadline, optional): The request deadline.
+
+        Returns:
+            dict: The response, its sources, whether the turn was a
+            follow-up, whether the history was compacted and the prefill
+            reported by Ollama.
+
+        Raises:
+            NotFoundException: If the user has no such session.
+            ServiceUnavailableException: If generation is overloaded.
+        """
+        chat_session = await self.session_repo.get(user_id, document_id, session_id, session)
+        if query_embedding is None:
+            query_embedding = await self.chat_service.embed_query(message)
+        retrieved = await self.chat_service.find_context(
+            document_id, message, query_embedding, session, deadline
+        )
+
+        follow_up = chat_session.context_passages is not None
+        extra_context = None
+        if follow_up:
+            pinned = set(chat_session.context_passages)
+            extra = pack_context(
+                [
+                    (passage, estimate_tokens(passage))
+                    for passage in retrieved.passages if passage not in pinned
+                ],
+                self.settings.chat_followup_context_tokens
+            )
+            extra_context = "\n\n".join(extra.passages) or None
+            sent = pinned.union(extra.passages)
+            sources = [passage for passage in retrieved.passages if passage in sent]
+        elif retrieved.passages:
+            chat_session.context_passages = retrieved.passages
+            chat_session.context_tokens = retrieved.tokens
+            sources = retrieved.passages
+        else:
+            return self._response(NO_CONTEXT_RESPONSE, [], follow_up)
+
+        history = await self.session_repo.get_messages(
+            chat_session.id, session, after_id=chat_session.summarized_through
+        )
+        question = self.llm_service.render_question(message, extra_context)
+        kind = "follow_up" if follow_up else "first"
+
+        async with self._generation_slot():
+            try:
+                compacted, history = await self._compact(chat_session, history, question)
+                messages = self.llm_service.session_messages(
+                    "\n\n".join(chat_session.context_passages),
+                    chat_session.summary,
+                    [(turn.role, self._render(turn)) for turn in history],
+                    question
+                )
+                with CHAT_STAGE_SECONDS.labels("generation", self.llm_service.llm.model).time():
+                    answer, metadata = await self.llm_service.generate_turn(messages)
+            except Exception as e:
+                logger.error(f"Error processing chat session {session_id}: {e}")
+                return self._response(
+                    "Sorry, I encountered an error processing your request.", [], follow_up
+                )
+
+        prompt_eval_count = metadata.get("prompt_eval_count")
+        prefill_ms = None
+        if metadata.get("prompt_eval_duration") is not None:
+            prefill_ms = metadata["prompt_eval_duration"] / 1e6
+        if self.metrics:
+            self.metrics.observe(kind, prefill_ms, prompt_eval_count)
+        logger.info(
+            f"Chat session {session_id} {kind} turn: {prompt_eval_count} prompt tokens "
+            f"evaluated in {prefill_ms} ms"
+        )
+
+        await self.session_repo.add_turn(
+            chat_session,
+            question={
+                "content": message,
+                "context": extra_context,
+                "token_count": estimate_tokens(question)
+            },
+            answer={
+                "content": answer,
+                "token_count": estimate_tokens(answer),
+                "prompt_eval_count": prompt_eval_count,
+                "prefill_ms": prefill_ms
+            },
+            session=session
+        )
+        return {
+            **self._response(answer, [chunk[:50] + "..." for chunk in sources], follow_up),
+            "compacted": compacted,
+            "prompt_eval_count": prompt_eval_count,
+            "prefill_ms": prefill_ms
+        }
+
+    @staticmethod
+    def _response(response: str, sources: List[str], follow_up: bool) -> dict:
+        return {
+            "response": response,
+            "sources": sources,
+            "cached": False,
+            "follow_up": follow_up,
+            "compacted": False,
+            "prompt_eval_count": None,
+            "prefill_ms": None
+        }
+
+    def _render(self, turn: ChatMessage) -> str:
+        """
+        Render a stored message exactly as it was sent.
+        """
+        if turn.role == "user":
+            return self.llm_service.render_question(turn.content, turn.context)
+        return turn.content
+
+    async def _compact(
+        self,
+        chat_session: ChatSession,
+        history: List[ChatMessage],
+        question: str
+    ) -> Tuple[bool, List[ChatMessage]]:
+        """
+        Fold the older turns into the summary once the history is too long.
+
+        The last chat_history_keep_turns turns stay verbatim. Compaction
+        changes the prompt after the context, so it only happens when the
+        history and the new question exceed the threshold.
+
+        Args:
+            chat_session (ChatSession): The chat session, updated in place.
+            history (List[ChatMessage]): The messages after the summary.
+            question (str): The rendered new question.
+
+        Returns:
+            Tuple[bool, List[ChatMessage]]: Whether the history was
+            compacted, and the messages still sent verbatim.
+        """
+        tokens = sum(turn.token_count for turn in history) + estimate_tokens(question)
+        keep = 2 * self.settings.chat_history_keep_turns
+        if tokens <= self.settings.chat_history_token_threshold or len(history) <= keep:
+            return False, history
+
+        folded, kept = history[:len(history) - keep], history[len(history) - keep:]
+        chat_session.summary = await self.llm_service.summarize(
+            chat_session.summary, [(turn.role, self._render(turn)) for turn in folded]
+        )
+        chat_session.summarized_through = folded[-1].id
+        logger.info(
+            f"Compacted {len(folded)} messages of chat session {chat_session.id} "
+            f"({tokens} history tokens)"
+        )
+        return True, kept
+
+    def _generation_slot(self):
+        """
+        Hold a generation slot from the gateway, if one is configured.
+        """
+        return self.gateway.slot() if self.gateway else nullcontext()
@@ -0,0 +1,86 @@
+import os
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+
+from app.db.base import Base
+import app.db.models  # noqa: F401
+
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+TEST_REPLICA_DATABASE_URL = os.getenv("TEST_REPLICA_DATABASE_URL")
+RUN_BENCHMARKS = os.getenv("RUN_BENCHMARKS")
+
+
+@pytest_asyncio.fixture
+async def pg_session():
+    """
+    Yield a session on a real Postgres database with the schema created.
+
+    Everything, including the schema, is rolled back afterwards. Tests
+    using this fixture are skipped unless TEST_DATABASE_URL points at a
+    Postgres instance with the pgvector extension available.
+    """
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    engine = create_async_engine(TEST_DATABASE_URL)
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        await connection.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await connection.run_sync(Base.metadata.create_all)
+        session = AsyncSession(
+            bind=connection,
+            join_transaction_mode="create_savepoint"
+        )
+        try:
+            yield session
+        finally:
+            await session.close()
+            await transaction.rollback()
+    await engine.dispose()
+
+
+@pytest_asyncio.fixture
+async def pg_engines():
+    """
+    Yield engines on a Postgres primary and on a streaming replica of it.
+
+    Tests using this fixture are skipped unless TEST_DATABASE_URL and
+    TEST_REPLICA_DATABASE_URL point at two local instances, the second
+    replicating the first.
+    """
+    if not (TEST_DATABASE_URL and TEST_REPLICA_DATABASE_URL):
+        pytest.skip("TEST_DATABASE_URL and TEST_REPLICA_DATABASE_URL are not set")
+
+    primary = create_async_engine(TEST_DATABASE_URL)
+    replica = create_async_engine(TEST_REPLICA_DATABASE_URL)
+    try:
+        yield primary, replica
+    finally:
+        await primary.dispose()
+        await replica.dispose()
+
+
+@pytest.fixture
+def benchmark(request):
+    """
+    Return a function writing a benchmark result line to the terminal.
+
+    Benchmarks time real work and report their numbers rather than
+    assert on them, so tests using this fixture are skipped unless
+    RUN_BENCHMARKS is set. Their lines are shown even without -s.
+    """
+    if not RUN_BENCHMARKS:
+        pytest.skip("RUN_BENCHMARKS is not set")
+
+    capture = request.config.pluginmanager.get_plugin("capturemanager")
+    terminal = request.config.pluginmanager.get_plugin("terminalreporter")
+
+    def report(line: str):
+        with capture.global_and_fixture_disabled():
+            terminal.write_line(f"[{request.node.name}] {line}")
+
+    return report
@@ -0,0 +1,70 @@
+import time
+
+import pytest
+import pytest_mock
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.core.config import get_settings
+from app.db.pool import InstrumentedPool, PoolMetrics, engine_options
+
+
+def test_engine_options_come_from_settings():
+    """
+    Test that the pool is sized and tuned from the settings, with the
+    prepared statement cache passed to the asyncpg connections.
+    """
+    settings = get_settings().model_copy(update={
+        "db_pool_size": 4,
+        "db_max_overflow": 2,
+        "db_pool_timeout": 1.5,
+        "db_pool_recycle": 600,
+        "db_statement_cache_size": 0
+    })
+
+    options = engine_options(settings)
+
+    assert options["poolclass"] is InstrumentedPool
+    assert (options["pool_size"], options["max_overflow"]) == (4, 2)
+    assert (options["pool_timeout"], options["pool_recycle"]) == (1.5, 600)
+    assert options["connect_args"] == {"prepared_statement_cache_size": 0}
+
+
+def test_pool_checkout_wait_and_timeouts_are_recorded(mocker: pytest_mock.MockFixture):
+    """
+    Test that the time a checkout waits for a free connection is recorded,
+    and a checkout that gives up is counted as a timeout.
+    """
+    metrics = PoolMetrics()
+    mocker.patch("app.db.pool.get_pool_metrics", return_value=metrics)
+    pool = InstrumentedPool(lambda: None, pool_size=1, max_overflow=0)
+    do_get = mocker.patch.object(
+        AsyncAdaptedQueuePool, "_do_get",
+        side_effect=lambda: time.sleep(0.03) or "connection"
+    )
+
+    assert pool._do_get() == "connection"
+    do_get.side_effect = PoolTimeoutError("QueuePool limit reached")
+    with pytest.raises(PoolTimeoutError):
+        pool._do_get()
+
+    assert (metrics.checkouts, metrics.timeouts) == (1, 1)
+    assert metrics.wait_ms.count == 2
+    assert metrics.wait_ms.sum >= 30
+
+
+def test_pool_stats_report_utilisation(mocker: pytest_mock.MockFixture):
+    """
+    Test that the share of the pool in use counts the overflow
+    connections.
+    """
+    pool = mocker.MagicMock(_max_overflow=5)
+    pool.size.return_value = 5
+    pool.checkedout.return_value = 8
+    pool.checkedin.return_value = 0
+    pool.overflow.return_value = 3
+
+    stats = PoolMetrics().stats(pool)
+
+    assert stats["utilisation"] == 0.8
+    assert (stats["in_use"], stats["idle"], stats["overflow"]) == (8, 0, 3)
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+import pytest_mock
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.replicas import ReplicaSet
+
+
+def test_pick_round_robins_over_replicas_within_lag(mocker: pytest_mock.MockFixture):
+    """
+    Test that reads alternate between the replicas within the lag limit,
+    skip lagging or unreachable ones, and go to the primary without any.
+    """
+    engines = [mocker.MagicMock(name=f"replica-{i}") for i in range(3)]
+    replicas = ReplicaSet(engines, max_lag=5, poll_interval=1)
+
+    assert replicas.pick() is None
+
+    replicas.lag = {0: 0.0, 1: 12.0, 2: 1.5}
+    assert [replicas.pick() for _ in range(4)] == [engines[0], engines[2], engines[0], engines[2]]
+
+    replicas.lag = {0: None, 1: 12.0, 2: 30.0}
+    assert replicas.pick() is None
+
+
+@pytest.mark.asyncio
+async def test_check_marks_unreachable_replica_unusable(mocker: pytest_mock.MockFixture):
+    """
+    Test that a replica whose lag cannot be measured is no longer picked.
+    """
+    engine = mocker.MagicMock()
+    engine.connect.side_effect = OSError("connection refused")
+    replicas = ReplicaSet([engine], max_lag=5, poll_interval=1)
+    replicas.lag = {0: 0.0}
+
+    await replicas.check()
+
+    assert replicas.lag == {0: None}
+    assert replicas.pick() is None
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_replica_once_it_caught_up(pg_engines):
+    """
+    Test against a primary and its streaming replica that the replica's
+    lag is measured, that it is picked while within the limit, and that a
+    write on the primary becomes visible through it.
+    """
+    primary, replica = pg_engines
+    replicas = ReplicaSet([replica], max_lag=5, poll_interval=1)
+    async with primary.begin() as connection:
+        await connection.execute(text("CREATE TABLE IF NOT EXISTS replica_probe (id INTEGER)"))
+        await connection.execute(text("INSERT INTO replica_probe VALUES (1)"))
+    try:
+        for _ in range(50):
+            await replicas.check()
+            if replicas.lag[0] == 0:
+                break
+            await asyncio.sleep(0.1)
+
+        assert replicas.lag[0] is not None and replicas.lag[0] <= 5
+        async with AsyncSession(replicas.pick() or primary) as session:
+            assert (await session.execute(text("SELECT pg_is_in_recovery()"))).scalar()
+            count = (await session.execute(text("SELECT count(*) FROM replica_probe"))).scalar()
+        assert count >= 1
+
+        replicas.max_lag = -1
+        assert replicas.pick() is None
+    finally:
+        async with primary.begin() as connection:
+            await connection.execute(text("DROP TABLE replica_probe"))
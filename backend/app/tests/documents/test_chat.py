@@ -0,0 +1,632 @@
+import time
+import asyncio
+import threading
+import pytest
+from types import SimpleNamespace
+from unittest.mock import ANY
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.runnables import RunnableLambda
+from prometheus_client import REGISTRY
+
+from app.core.exceptions import ServiceUnavailableException
+from app.repositories.documents.documents import FAQAnswer, ScoredChunk
+from app.services.documents.answer_cache import AnswerCache
+from app.services.documents.chat_service import ChatService
+from app.services.documents.faq import FAQService
+from app.services.documents.extractive import (
+    ExtractiveAnswerer, SentenceEmbeddingCache, split_sentences
+)
+from app.services.documents.generation_gateway import GenerationGateway
+from app.services.documents.llm_service import LLMService
+from app.services.documents.mmr import mmr_select, normalize
+from app.services.documents.reranker import CrossEncoderReranker, Reranker
+
+
+class StaticReranker(Reranker):
+    """Reranker returning fixed scores, for exercising the chat pipeline."""
+
+    def __init__(self, scores, candidates=30, top_k=2):
+        super().__init__(candidates, top_k)
+        self.scores = scores
+
+    async def score(self, query, passages):
+        return self.scores
+
+
+def make_chat_service(mocker, chunks, reranker=None, answer_cache=None):
+    document_repo = mocker.MagicMock()
+    document_repo.search_chunks = mocker.AsyncMock(return_value=[
+        ScoredChunk(id=i, content=chunk, distance=0.1 * i)
+        for i, chunk in enumerate(chunks)
+    ])
+    embedding_service = mocker.MagicMock()
+    embedding_service.generate_embedding = mocker.AsyncMock(return_value=[0.1, 0.2])
+    llm_service = mocker.MagicMock()
+    llm_service.generate_response = mocker.AsyncMock(return_value="answer")
+    return ChatService(document_repo, embedding_service, llm_service, reranker, answer_cache)
+
+
+@pytest.mark.asyncio
+async def test_process_chat_reranks_candidates(mocker):
+    """
+    Test that the reranker widens retrieval and only the best scored chunks
+    reach the LLM.
+    """
+    chunks = ["first chunk", "second chunk", "third chunk"]
+    service = make_chat_service(mocker, chunks, StaticReranker([0.1, 0.9, 0.5]))
+
+    result = await service.process_chat(document_id=1, message="question", session=mocker.MagicMock())
+
+    assert service.document_repo.search_chunks.await_args.kwargs["k"] == 30
+    service.llm_service.generate_response.assert_awaited_once_with(
+        query="question", context="second chunk\n\nthird chunk", context_tokens=ANY
+    )
+    assert result["response"] == "answer"
+
+
+@pytest.mark.asyncio
+async def test_process_chat_keeps_vector_order_when_reranker_falls_back(mocker):
+    """
+    Test that the vector order is kept when the reranker gives up.
+    """
+    chunks = ["first chunk", "second chunk", "third chunk"]
+    service = make_chat_service(mocker, chunks, StaticReranker(None))
+
+    await service.process_chat(document_id=1, message="question", session=mocker.MagicMock())
+
+    service.llm_service.generate_response.assert_awaited_once_with(
+        query="question", context="first chunk\n\nsecond chunk", context_tokens=ANY
+    )
+
+
+async def wait_for_reranker(reranker: CrossEncoderReranker):
+    """Wait until the reranker's worker thread has finished its job."""
+    await asyncio.get_running_loop().run_in_executor(reranker._executor, lambda: None)
+    await asyncio.sleep(0)
+
+
+@pytest.mark.asyncio
+async def test_cross_encoder_reranker_respects_budget(mocker):
+    """
+    Test that the cross-encoder gives up once its time budget is spent and
+    stops scoring the remaining batches in the background.
+    """
+    reranker = CrossEncoderReranker(
+        model_name="test", candidates=30, top_k=3, batch_size=2, budget_ms=50
+    )
+    clock = [100.0]
+    clock_module = mocker.patch("app.services.documents.reranker.time")
+    clock_module.monotonic.side_effect = lambda: clock[0]
+    release = threading.Event()
+
+    def blocked_predict(pairs):
+        release.wait(5)
+        # the batch took longer than the whole budget
+        clock[0] += 1
+        return [1.0] * len(pairs)
+
+    reranker._model = mocker.MagicMock()
+    predict = mocker.patch.object(reranker, "_predict", side_effect=blocked_predict)
+
+    assert await reranker.score("q", ["a", "b", "c", "d", "e", "f", "g", "h"]) is None
+    release.set()
+    await wait_for_reranker(reranker)
+    assert predict.call_count == 1
+    assert not reranker._busy
+
+    predict.side_effect = lambda pairs: [1.0] * len(pairs)
+    reranker.budget = 5
+    assert await reranker.score("q", ["a", "b", "c"]) == [1.0, 1.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_cross_encoder_reranker_keeps_vector_order_when_scoring_fails(mocker):
+    """
+    Test that an error while scoring falls back to vector order instead of
+    failing the chat, and leaves the worker free for the next request.
+    """
+    reranker = CrossEncoderReranker(
+        model_name="test", candidates=30, top_k=3, batch_size=2, budget_ms=5000
+    )
+    reranker._model = mocker.MagicMock()
+    predict = mocker.patch.object(reranker, "_predict", side_effect=RuntimeError("model crashed"))
+
+    assert await reranker.score("q", ["a", "b"]) is None
+    await wait_for_reranker(reranker)
+    assert not reranker._busy
+
+    predict.side_effect = lambda pairs: [1.0] * len(pairs)
+    assert await reranker.score("q", ["a", "b"]) == [1.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_cross_encoder_reranker_does_not_queue_behind_busy_worker(mocker):
+    """
+    Test that a request arriving while the worker is scoring another one
+    keeps the vector order instead of waiting for the worker.
+    """
+    reranker = CrossEncoderReranker(
+        model_name="test", candidates=30, top_k=3, batch_size=2, budget_ms=1000
+    )
+
+    def slow_predict(pairs):
+        time.sleep(0.05)
+        return [1.0] * len(pairs)
+
+    reranker._model = mocker.MagicMock()
+    mocker.patch.object(reranker, "_predict", side_effect=slow_predict)
+
+    first = asyncio.create_task(reranker.score("q", ["a", "b"]))
+    await asyncio.sleep(0)
+
+    assert await reranker.score("q", ["c", "d"]) is None
+    assert await first == [1.0, 1.0]
+
+
+@pytest.mark.asyncio
+async def test_cross_encoder_reranker_logs_failed_model_load(mocker, caplog):
+    """
+    Test that a model that fails to load is reported and disables reranking.
+    """
+    reranker = CrossEncoderReranker(
+        model_name="missing", candidates=30, top_k=3, batch_size=2, budget_ms=50
+    )
+    mocker.patch.object(reranker, "_load_model", side_effect=OSError("no such model"))
+
+    assert await reranker.score("q", ["a"]) is None
+    await asyncio.wait([reranker._loader])
+    assert await reranker.score("q", ["a"]) is None
+
+    assert reranker._load_failed
+    assert "no such model" in caplog.text
+
+
+def test_normalize_scales_to_unit_length_and_keeps_zero_vectors():
+    """
+    Test that embeddings are scaled to unit length for cosine similarity,
+    and that a zero vector is left as it is.
+    """
+    assert normalize([3.0, 4.0]).tolist() == pytest.approx([0.6, 0.8])
+    assert normalize([0.0, 0.0]).tolist() == [0.0, 0.0]
+
+
+def test_mmr_select_skips_near_duplicates():
+    """
+    Test that MMR prefers a diverse candidate over a near-duplicate of an
+    already selected one.
+    """
+    query = [1.0, 0.0]
+    candidates = [[0.9, 0.3], [0.89, 0.31], [0.8, -0.4]]
+
+    assert mmr_select(query, candidates, k=2, lambda_mult=0.5) == [0, 2]
+    assert mmr_select(query, candidates, k=2, lambda_mult=1.0) == [0, 1]
+
+
+@pytest.mark.asyncio
+async def test_process_chat_applies_mmr(mocker):
+    """
+    Test that MMR selection fetches candidates with embeddings and drops
+    overlapping chunks before generation.
+    """
+    rows = [
+        ScoredChunk(id=1, content="alpha", distance=0.1, embedding=[0.9, 0.3]),
+        ScoredChunk(id=2, content="alpha again", distance=0.1, embedding=[0.89, 0.31]),
+        ScoredChunk(id=3, content="beta", distance=0.2, embedding=[0.9, -0.3]),
+    ]
+    service = make_chat_service(mocker, [])
+    service.embedding_service.generate_embedding.return_value = [1.0, 0.0]
+    service.settings = service.settings.model_copy(
+        update={"mmr_enabled": True, "mmr_candidates": 20, "chat_top_k": 2}
+    )
+    service.document_repo.search_chunks.return_value = rows
+
+    await service.process_chat(document_id=1, message="question", session=mocker.MagicMock())
+
+    search_kwargs = service.document_repo.search_chunks.await_args.kwargs
+    assert search_kwargs["k"] == 20
+    assert search_kwargs["include_embeddings"] is True
+    service.llm_service.generate_response.assert_awaited_once_with(
+        query="question", context="alpha\n\nbeta", context_tokens=ANY
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_chat_expands_hits_with_neighbours(mocker):
+    """
+    Test that neighbour chunks are fetched in one batched lookup and merged
+    around the hit.
+    """
+    service = make_chat_service(mocker, [])
+    service.settings = service.settings.model_copy(update={"context_neighbours": 1})
+    service.document_repo.search_chunks.return_value = [
+        ScoredChunk(id=5, content="middle", distance=0.1, ordinal=5)
+    ]
+    service.document_repo.get_chunks_by_ordinals = mocker.AsyncMock(
+        return_value={4: "before", 5: "middle", 6: "after"}
+    )
+
+    await service.process_chat(document_id=1, message="question", session=mocker.MagicMock())
+
+    service.document_repo.get_chunks_by_ordinals.assert_awaited_once()
+    assert service.document_repo.get_chunks_by_ordinals.await_args.kwargs["ordinals"] == [4, 5, 6]
+    service.llm_service.generate_response.assert_awaited_once_with(
+        query="question", context="before middle after", context_tokens=ANY
+    )
+
+
+@pytest.mark.asyncio
+async def test_search_embeds_and_searches_all_queries_at_once(mocker):
+    """
+    Test that a batch search makes one embedding call and one search call
+    and groups the hits by query.
+    """
+    service = make_chat_service(mocker, [])
+    service.embedding_service.generate_embeddings = mocker.AsyncMock(
+        return_value=[[0.1], [0.2]]
+    )
+    service.document_repo.search_chunks_batch = mocker.AsyncMock(return_value=[
+        [ScoredChunk(id=3, content="dates", distance=0.2)],
+        [],
+    ])
+
+    results = await service.search(
+        document_id=1,
+        queries=["key dates?", "parties?"],
+        k=4,
+        threshold=None,
+        session=mocker.MagicMock()
+    )
+
+    service.embedding_service.generate_embeddings.assert_awaited_once_with(["key dates?", "parties?"])
+    search_kwargs = service.document_repo.search_chunks_batch.await_args.kwargs
+    assert search_kwargs["query_embeddings"] == [[0.1], [0.2]]
+    assert search_kwargs["k"] == 4
+    assert results == [
+        {"query": "key dates?", "hits": [{"chunk_id": 3, "content": "dates", "distance": 0.2}]},
+        {"query": "parties?", "hits": []},
+    ]
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_sends_sources_then_tokens(mocker):
+    """
+    Test that a streamed chat retrieves before streaming, emits the sources
+    first and reports the time to first token.
+    """
+    service = make_chat_service(mocker, ["context chunk"])
+
+    async def tokens(**kwargs):
+        for token in ["An", "swer"]:
+            yield token
+
+    service.llm_service.stream_response = tokens
+
+    events = await service.stream_chat(document_id=1, message="question", session=mocker.MagicMock())
+    service.document_repo.search_chunks.assert_awaited_once()
+    sent = [event async for event in events]
+
+    assert sent[0].startswith("event: sources")
+    assert [event.split("\n")[0] for event in sent[1:]] == [
+        "event: token", "event: token", "event: done"
+    ]
+    assert '"token": "An"' in sent[1]
+
+
+@pytest.mark.asyncio
+async def test_process_chat_reuses_answers_for_similar_questions(mocker):
+    """
+    Test that a similar question about the same document version is
+    answered from the cache, and that a new version misses it.
+    """
+    cache = AnswerCache(max_entries=10, similarity_threshold=0.95)
+    service = make_chat_service(mocker, ["termination clause"], answer_cache=cache)
+    session = mocker.MagicMock()
+
+    first = await service.process_chat(
+        document_id=1, message="termination?", session=session, document_version="v1"
+    )
+    service.embedding_service.generate_embedding.return_value = [0.11, 0.2]
+    second = await service.process_chat(
+        document_id=1, message="how to terminate?", session=session, document_version="v1"
+    )
+
+    assert first["cached"] is False
+    assert second == {"response": "answer", "sources": first["sources"], "cached": True}
+    service.llm_service.generate_response.assert_awaited_once()
+
+    third = await service.process_chat(
+        document_id=1, message="how to terminate?", session=session, document_version="v2"
+    )
+    assert third["cached"] is False
+    assert service.llm_service.generate_response.await_count == 2
+    assert len(cache) == 1
+
+
+def test_answer_cache_evicts_least_recently_used():
+    """
+    Test that the answer cache stays within its size bound, evicting the
+    least recently used answer, and can be invalidated per document.
+    """
+    cache = AnswerCache(max_entries=2, similarity_threshold=0.99)
+    cache.put(1, "v1", [1.0, 0.0], "a", [])
+    cache.put(1, "v1", [0.0, 1.0], "b", [])
+    assert cache.get(1, "v1", [2.0, 0.0]).response == "a"
+
+    cache.put(2, "v1", [1.0, 0.0], "c", [])
+
+    assert cache.get(1, "v1", [0.0, 1.0]) is None
+    assert cache.get(1, "v1", [1.0, 0.0]).response == "a"
+    assert cache.get(1, "v1", [1.0, 1.0]) is None
+
+    cache.invalidate(1)
+    assert cache.get(1, "v1", [1.0, 0.0]) is None
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_process_chat_packs_context_by_stored_token_counts(mocker):
+    """
+    Test that chunks are packed into the token budget using the counts
+    stored at ingest, and the packed size is passed on for sizing num_ctx.
+    """
+    service = make_chat_service(mocker, [])
+    service.settings = service.settings.model_copy(update={"context_token_budget": 100})
+    service.document_repo.search_chunks.return_value = [
+        ScoredChunk(id=1, content="first", distance=0.1, token_count=60),
+        ScoredChunk(id=2, content="second", distance=0.2, token_count=50),
+        ScoredChunk(id=3, content="third", distance=0.3, token_count=30),
+    ]
+
+    await service.process_chat(document_id=1, message="question", session=mocker.MagicMock())
+
+    service.llm_service.generate_response.assert_awaited_once_with(
+        query="question", context="first\n\nthird", context_tokens=91
+    )
+
+
+@pytest.mark.asyncio
+async def test_chats_sessions_and_warm_up_share_one_window():
+    """
+    Test that chats, session turns, summaries and the warm-up all request
+    the configured num_ctx, so Ollama does not reload the model between
+    them, and that prompts too large for it are detected.
+    """
+    llm_service = LLMService()
+    llm_service.settings = llm_service.settings.model_copy(update={
+        "llm_num_ctx": 4096, "llm_num_predict": 256, "llm_token_margin": 0.2
+    })
+    windows = []
+    model = RunnableLambda(lambda prompt: AIMessage("answer"))
+
+    def model_copy(update):
+        windows.append(update["num_ctx"])
+        return model
+
+    llm_service.llm = SimpleNamespace(model="llama3.2:1b", model_copy=model_copy)
+
+    await llm_service.generate_response("question", "context", context_tokens=400)
+    await llm_service.generate_turn([HumanMessage("question")])
+    await llm_service.summarize(None, [("user", "question"), ("assistant", "answer")])
+    await llm_service.warm_up()
+
+    assert windows == [4096] * 4
+    assert llm_service.fits_window("question", context_tokens=2500)
+    assert not llm_service.fits_window("question", context_tokens=10000)
+
+
+def test_llm_tokens_reported_by_ollama_are_counted_per_model():
+    """
+    Test that the prompt and completion tokens of a generation are counted
+    under the chat model, and that stream chunks without usage are skipped.
+    """
+    llm_service = LLMService()
+    model = llm_service.llm.model
+
+    def tokens(kind):
+        return REGISTRY.get_sample_value("llm_tokens_total", {"model": model, "kind": kind}) or 0
+
+    prompt, completion = tokens("prompt"), tokens("completion")
+    llm_service._record_usage(AIMessage(
+        "answer", usage_metadata={"input_tokens": 120, "output_tokens": 30, "total_tokens": 150}
+    ))
+    llm_service._record_usage(AIMessageChunk(content="token"))
+
+    assert tokens("prompt") == prompt + 120
+    assert tokens("completion") == completion + 30
+
+
+@pytest.mark.asyncio
+async def test_generation_gateway_queues_then_sheds_load():
+    """
+    Test that the gateway queues requests beyond its concurrency, rejects
+    them at once when the queue is full and sheds them on queue timeout.
+    """
+    gateway = GenerationGateway(max_concurrency=1, max_queue=1, queue_timeout=0.05, retry_after=3)
+    release = asyncio.Event()
+
+    async def generate():
+        async with gateway.slot():
+            await release.wait()
+
+    running = asyncio.create_task(generate())
+    queued = None
+    try:
+        await asyncio.sleep(0)
+        queued = asyncio.create_task(generate())
+        await asyncio.sleep(0)
+        assert (gateway.in_flight, gateway.queue_depth) == (1, 1)
+
+        with pytest.raises(ServiceUnavailableException) as rejected:
+            async with gateway.slot():
+                pass
+        assert rejected.value.headers == {"Retry-After": "3"}
+
+        with pytest.raises(ServiceUnavailableException):
+            await queued
+    finally:
+        release.set()
+        await running
+        if queued and not queued.done():
+            queued.cancel()
+
+    stats = gateway.stats()
+    assert (stats["in_flight"], stats["queue_depth"]) == (0, 0)
+    assert (stats["rejected"], stats["timed_out"]) == (1, 1)
+    assert stats["wait_ms"]["count"] == 2
+
+
+@pytest.mark.asyncio
+async def test_stream_chat_rejects_before_streaming_when_overloaded(mocker):
+    """
+    Test that a streamed chat is refused with a 503 before any event is
+    sent when the generation queue is full.
+    """
+    service = make_chat_service(mocker, ["context chunk"])
+    service.gateway = GenerationGateway(max_concurrency=1, max_queue=0, queue_timeout=1, retry_after=1)
+    await service.gateway._semaphore.acquire()
+
+    with pytest.raises(ServiceUnavailableException):
+        await service.stream_chat(document_id=1, message="question", session=mocker.MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_process_chat_does_not_cache_failed_generation(mocker):
+    """
+    Test that a failed generation returns the error message without
+    caching it, so the next similar question is generated again.
+    """
+    cache = AnswerCache(max_entries=10, similarity_threshold=0.95)
+    service = make_chat_service(mocker, ["termination clause"], answer_cache=cache)
+    service.llm_service.generate_response.side_effect = [TimeoutError("ollama"), "answer"]
+    session = mocker.MagicMock()
+
+    failed = await service.process_chat(
+        document_id=1, message="termination?", session=session, document_version="v1"
+    )
+    retried = await service.process_chat(
+        document_id=1, message="termination?", session=session, document_version="v1"
+    )
+
+    assert failed["response"].startswith("Sorry")
+    assert (retried["response"], retried["cached"]) == ("answer", False)
+    assert service.llm_service.generate_response.await_count == 2
+    assert len(cache) == 1
+
+
+def make_extractor(mocker, vectors):
+    embedding_service = mocker.MagicMock()
+    embedding_service.generate_embeddings = mocker.AsyncMock(
+        side_effect=lambda sentences: [vectors[sentence] for sentence in sentences]
+    )
+    return ExtractiveAnswerer(
+        embedding_service, SentenceEmbeddingCache(max_entries=100),
+        top_sentences=1, min_sentence_chars=5
+    )
+
+
+def test_split_sentences_returns_trimmed_offsets():
+    """
+    Test that passages split at sentence ends and blank lines, with offsets
+    pointing at the sentences without surrounding whitespace.
+    """
+    text = "Rent is due monthly.  Late fees apply!\n\nTermination\nNotice is 30 days. ok."
+
+    spans = split_sentences(text, min_chars=5)
+
+    assert [text[start:end] for start, end in spans] == [
+        "Rent is due monthly.", "Late fees apply!", "Termination\nNotice is 30 days."
+    ]
+
+
+@pytest.mark.asyncio
+async def test_extractive_chat_answers_without_llm(mocker):
+    """
+    Test that an extractive chat highlights the closest sentence without
+    generating, and only embeds sentences it has not seen before.
+    """
+    service = make_chat_service(mocker, ["Rent is due monthly. Notice is 30 days."])
+    service.extractor = make_extractor(mocker, {
+        "Rent is due monthly.": [0.0, 1.0],
+        "Notice is 30 days.": [1.0, 2.1],
+    })
+
+    result = await service.process_chat(
+        document_id=1, message="notice?", session=mocker.MagicMock(), mode="extractive"
+    )
+    await service.process_chat(
+        document_id=1, message="notice?", session=mocker.MagicMock(), mode="extractive"
+    )
+
+    service.llm_service.generate_response.assert_not_awaited()
+    assert (result["response"], result["mode"]) == ("Notice is 30 days.", "extractive")
+    assert result["highlights"][0]["start"] == 21
+    assert service.extractor.embedding_service.generate_embeddings.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_process_chat_answers_extractively_when_saturated(mocker):
+    """
+    Test that a chat arriving when the generation queue is full gets an
+    extractive answer instead of a 503.
+    """
+    service = make_chat_service(mocker, ["Rent is due monthly."])
+    service.extractor = make_extractor(mocker, {"Rent is due monthly.": [0.1, 0.2]})
+    service.gateway = GenerationGateway(max_concurrency=1, max_queue=0, queue_timeout=1, retry_after=1)
+    await service.gateway._semaphore.acquire()
+
+    result = await service.process_chat(document_id=1, message="rent?", session=mocker.MagicMock())
+
+    service.llm_service.generate_response.assert_not_awaited()
+    assert (result["response"], result["mode"]) == ("Rent is due monthly.", "extractive")
+
+
+@pytest.mark.asyncio
+async def test_process_chat_serves_precomputed_answer(mocker):
+    """
+    Test that a question close to a precomputed one is answered from the
+    stored answer without retrieval or generation.
+    """
+    service = make_chat_service(mocker, ["context chunk"])
+    service.settings = service.settings.model_copy(update={"faq_enabled": True, "faq_similarity": 0.9})
+    service.document_repo.find_faq_answer = mocker.AsyncMock(return_value=FAQAnswer(
+        question="Summarize this document.", response="A lease.", sources=["Lease..."], distance=0.05
+    ))
+
+    result = await service.process_chat(document_id=1, message="summary?", session=mocker.MagicMock())
+
+    assert result == {"response": "A lease.", "sources": ["Lease..."], "cached": True}
+    assert service.document_repo.find_faq_answer.await_args.kwargs["max_distance"] == pytest.approx(0.1)
+    service.document_repo.search_chunks.assert_not_awaited()
+    service.llm_service.generate_response.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_faq_precompute_waits_for_spare_capacity(mocker):
+    """
+    Test that precomputed answers are only generated once the gateway has
+    a free slot, and questions without context are skipped.
+    """
+    chat_service = make_chat_service(mocker, [])
+    chat_service.embedding_service.generate_embeddings = mocker.AsyncMock(
+        return_value=[[0.1, 0.2], [0.3, 0.4]]
+    )
+    chat_service.document_repo.search_chunks_batch = mocker.AsyncMock(return_value=[
+        [ScoredChunk(id=1, content="The tenant is Acme.", distance=0.1)], []
+    ])
+    chat_service.document_repo.bulk_create_faqs = mocker.AsyncMock()
+    gateway = GenerationGateway(max_concurrency=1, max_queue=1, queue_timeout=1, retry_after=1)
+    await gateway._semaphore.acquire()
+    service = FAQService(chat_service, gateway)
+    service.settings = service.settings.model_copy(
+        update={"faq_questions": ["Who are the parties?", "Key dates?"], "faq_idle_poll": 0}
+    )
+    mocker.patch("app.services.documents.faq.get_db_session", return_value=mocker.AsyncMock())
+    sleep = mocker.patch("app.services.documents.faq.asyncio.sleep")
+    sleep.side_effect = lambda _: gateway._semaphore.release()
+
+    await service.precompute(document_id=5)
+
+    sleep.assert_awaited_once()
+    faqs = chat_service.document_repo.bulk_create_faqs.await_args.args[0]
+    assert [(faq["question"], faq["answer"]) for faq in faqs] == [("Who are the parties?", "answer")]
+    assert faqs[0]["embedding"] == [0.1, 0.2]
@@ -0,0 +1,175 @@
+from types import SimpleNamespace
+
+import pytest
+
+from app.db.models.chat import ChatMessage
+from app.db.models.documents import Document, StatusEnum
+from app.db.models.users import User
+from app.repositories.documents.chat_sessions import ChatSessionRepository
+from app.services.documents.context import PackedContext
+from app.services.documents.llm_service import SESSION_SYSTEM_PROMPT, LLMService
+from app.services.documents.session_service import ChatSessionService, PrefillMetrics
+
+
+class InMemorySessionRepository:
+    """Chat session repository keeping a single session in memory."""
+
+    def __init__(self):
+        self.chat_session = SimpleNamespace(
+            id=1, context_passages=None, context_tokens=None,
+            summary=None, summarized_through=None
+        )
+        self.messages = []
+
+    async def get(self, user_id, document_id, session_id, session):
+        return self.chat_session
+
+    async def get_messages(self, session_id, session, after_id=None):
+        return [m for m in self.messages if after_id is None or m.id > after_id]
+
+    async def add_turn(self, chat_session, question, answer, session):
+        for role, data in (("user", question), ("assistant", answer)):
+            data = {"context": None, "prompt_eval_count": None, "prefill_ms": None, **data}
+            self.messages.append(SimpleNamespace(id=len(self.messages) + 1, role=role, **data))
+
+
+def make_session_service(mocker, passages):
+    chat_service = mocker.MagicMock()
+    chat_service.embed_query = mocker.AsyncMock(return_value=[0.1, 0.2])
+    chat_service.find_context = mocker.AsyncMock(
+        side_effect=[PackedContext(p, 10 * len(p)) for p in passages]
+    )
+    llm_service = LLMService()
+    llm_service.generate_turn = mocker.AsyncMock(side_effect=[
+        (f"answer {i}", {"prompt_eval_count": 400 // (i + 1), "prompt_eval_duration": 80e6 // (i + 1)})
+        for i in range(len(passages))
+    ])
+    llm_service.summarize = mocker.AsyncMock(return_value="they asked about the contract")
+    return ChatSessionService(
+        InMemorySessionRepository(), chat_service, llm_service, metrics=PrefillMetrics()
+    )
+
+
+async def ask(service, message):
+    return await service.chat(
+        user_id=1, document_id=2, session_id=1, message=message, session=None
+    )
+
+
+@pytest.mark.asyncio
+async def test_follow_up_prompt_extends_previous_prompt(mocker):
+    """
+    Test that a follow-up keeps the pinned context, sends only the new
+    passages with the question, and that its prompt starts with the
+    previous prompt and answer so Ollama can reuse the cached prefix.
+    """
+    service = make_session_service(mocker, [["clause a", "clause b"], ["clause b", "clause c"]])
+
+    first = await ask(service, "What is the term?")
+    second = await ask(service, "And the notice period?")
+
+    first_prompt = service.llm_service.generate_turn.await_args_list[0].args[0]
+    second_prompt = service.llm_service.generate_turn.await_args_list[1].args[0]
+    assert second_prompt[:len(first_prompt)] == first_prompt
+    assert second_prompt[len(first_prompt)].content == "answer 0"
+    assert "clause c" in second_prompt[-1].content
+    assert "clause b" not in second_prompt[-1].content
+    assert "clause a" in second_prompt[0].content
+
+    assert (first["follow_up"], second["follow_up"]) == (False, True)
+    assert second["prefill_ms"] == 40.0
+    stats = service.metrics.stats()
+    assert stats["first"]["prompt_eval_count"]["count"] == 1
+    assert stats["follow_up"]["prompt_eval_count"]["count"] == 1
+
+
+@pytest.mark.asyncio
+async def test_long_history_is_compacted_into_summary(mocker):
+    """
+    Test that once the history passes the token threshold, the older turns
+    are replaced in the prompt by their summary and the recent ones stay.
+    """
+    service = make_session_service(mocker, [["clause a"]] * 4)
+    service.settings = service.settings.model_copy(update={
+        "chat_history_token_threshold": 10, "chat_history_keep_turns": 1
+    })
+
+    for question in ["q1", "q2", "q3"]:
+        await ask(service, question)
+    result = await ask(service, "q4")
+
+    assert result["compacted"] is True
+    folded = service.llm_service.summarize.await_args.args[1]
+    assert [content for _, content in folded] == ["q1", "answer 0", "q2", "answer 1"]
+    prompt = service.llm_service.generate_turn.await_args.args[0]
+    assert [message.content for message in prompt[1:]] == [
+        "Summary of the earlier conversation:\nthey asked about the contract",
+        "q3", "answer 2", "q4"
+    ]
+    assert service.session_repo.chat_session.summarized_through == 4
+
+
+@pytest.mark.asyncio
+async def test_failed_turn_leaves_session_unchanged(mocker):
+    """
+    Test that a failed generation is not stored and does not pin context.
+    """
+    service = make_session_service(mocker, [["clause a"]])
+    service.llm_service.generate_turn.side_effect = ConnectionError("down")
+
+    result = await ask(service, "What is the term?")
+
+    assert result["response"].startswith("Sorry")
+    assert service.session_repo.messages == []
+
+
+def test_session_window_fits_the_longest_turn():
+    """
+    Test that the shared num_ctx holds a session turn with the pinned
+    context, the history up to the compaction threshold, the summary and
+    the follow-up passages.
+    """
+    llm_service = LLMService()
+    settings = llm_service.settings
+    reserved = (
+        settings.context_token_budget + settings.chat_history_token_threshold
+        + settings.chat_summary_max_tokens + settings.chat_followup_context_tokens
+    )
+    assert llm_service.fits_window("", reserved, SESSION_SYSTEM_PROMPT)
+
+
+@pytest.mark.asyncio
+async def test_repository_returns_messages_after_summary(pg_session):
+    """
+    Test against Postgres that a session stores its turns in order and
+    that only the turns after the summary are loaded for the prompt.
+    """
+    user = User(username="session", email="session@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    document = Document(file_name="contract.pdf", user_id=user.id, status=StatusEnum.SUCCESS)
+    pg_session.add(document)
+    await pg_session.flush()
+    user_id, document_id = user.id, document.id
+
+    repo = ChatSessionRepository()
+    session_id = (await repo.create(user_id, document_id, pg_session)).id
+    for i in range(2):
+        chat_session = await repo.get(user_id, document_id, session_id, pg_session)
+        chat_session.context_passages = ["clause a"]
+        await repo.add_turn(
+            chat_session,
+            question={"content": f"q{i}", "token_count": 2},
+            answer={"content": f"a{i}", "token_count": 2, "prefill_ms": 12.5},
+            session=pg_session
+        )
+
+    loaded = await repo.get(user_id, document_id, session_id, pg_session)
+    messages = await repo.get_messages(loaded.id, pg_session)
+    assert loaded.context_passages == ["clause a"]
+    assert [(m.role, m.content) for m in messages] == [
+        ("user", "q0"), ("assistant", "a0"), ("user", "q1"), ("assistant", "a1")
+    ]
+    recent = await repo.get_messages(loaded.id, pg_session, after_id=messages[1].id)
+    assert [m.content for m in recent] == ["q1", "a1"]
+    assert isinstance(recent[0], ChatMessage)
@@ -1,15 +1,42 @@
+import asyncio
 import pytest
-from datetime import datetime
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from prometheus_client import REGISTRY
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
 from fastapi import UploadFile, BackgroundTasks
 from fastapi.testclient import TestClient
 from fastapi.exceptions import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
 
+from app.api.metrics import metrics
 from app.api.v1.users.documents.documents import get_documents
+from app.core.config import get_settings
+from app.core.factory.documentfactory import get_document_controller, get_generation_gateway
+from app.db.base import get_db, get_read_db
+from app.core.exceptions import (
+    BadRequestException, ForbiddenException, GatewayTimeoutException,
+    NotFoundException, ServiceUnavailableException
+)
+from app.db.models.chat import ChatMessage, ChatSession
+from app.db.models.documents import (
+    Document, DocumentChunk, DocumentFAQ, EMBEDDING_DIMENSIONS, StatusEnum
+)
+from app.db.models.jobs import QAJob, QAJobAnswer
+from app.db.models.users import User
+from app.repositories.documents.documents import DocumentRepository
 from app.main import app
-from app.schemas.documents.document_schemas import DocumentOut
+from app.services.auth.auth_services import jwt_bearer
+from app.schemas.documents.document_schemas import DocumentOut, DocumentPage
 from app.api.v1.users.documents.documents import upload_document
 from app.controllers.documents.document_controller import DocumentController
-from app.services.documents.documentservice import DocumentService
+from app.services.documents.answer_cache import AnswerCache
+from app.services.documents.documentservice import (
+    DocumentService, FileProcessor, decode_cursor, encode_cursor
+)
+from app.utils.deadline import Deadline
+from app.utils.disconnect import CLIENT_CLOSED_REQUEST, cancel_on_disconnect
 
 
 client = TestClient(app)
@@ -30,32 +57,40 @@ async def test_get_documents_unauthorized(mocker):
 @pytest.mark.asyncio
 async def test_get_documents_returns_list_for_valid_user(mocker):
     """
-    Test that get_documents returns a list of documents for a valid user.
+    Test that get_documents returns a page of documents for a valid user.
     """
     mock_user = {"sub": "123"}
     mock_session = mocker.AsyncMock()
 
     mock_controller = mocker.AsyncMock()
-    mock_documents = [
-        DocumentOut(
-            id=1,
-            file_name="test.pdf",
-            user_id=123,
-            status="processed",
-            created_at=datetime.now(),
-            updated_at=datetime.now()
-        )
-    ]
+    mock_documents = DocumentPage(
+        items=[
+            DocumentOut(
+                id=1,
+                file_name="test.pdf",
+                user_id=123,
+                status="processed",
+                created_at=datetime.now(),
+                updated_at=datetime.now()
+            )
+        ],
+        total=1
+    )
     mock_controller.get_documents.return_value = mock_documents
 
     result = await get_documents(
+        limit=20,
+        cursor=None,
+        status=StatusEnum.SUCCESS,
         user=mock_user,
         controller=mock_controller,
         session=mock_session
     )
 
     assert result == mock_documents
-    mock_controller.get_documents.assert_called_once_with(123, mock_session)
+    mock_controller.get_documents.assert_called_once_with(
+        123, mock_session, limit=20, cursor=None, status=StatusEnum.SUCCESS
+    )
 
 
 @pytest.mark.asyncio
@@ -141,6 +176,7 @@ async def test_controller_chat_with_document_success(mocker):
     chat_response = {"reply": "Hello"}
     
     chat_service = mocker.MagicMock()
+    chat_service.embed_query = mocker.AsyncMock(return_value=[0.1, 0.2])
     chat_service.process_chat = mocker.AsyncMock(return_value=chat_response)
     
     controller = DocumentController(document_service=doc_service, chat_service=chat_service)
@@ -162,7 +198,432 @@ async def test_controller_chat_with_document_success(mocker):
     chat_service.process_chat.assert_awaited_once_with(
         document_id=document_id,
         message=message,
-        session=test_session
+        session=test_session,
+        document_version=document.updated_at,
+        query_embedding=[0.1, 0.2],
+        deadline=None,
+        mode="generative"
     )
     
     assert response == chat_response
+
+
+def test_chat_stream_sends_sources_first_and_skips_gzip(mocker):
+    """
+    Test that a streaming chat is sent as Server-Sent Events, sources first,
+    and is not compressed by the gzip middleware even when the client
+    accepts gzip.
+    """
+    async def events():
+        yield 'event: sources\ndata: {"sources": ["a..."]}\n\n'
+        for token in ["Hel", "lo"]:
+            yield f'event: token\ndata: {{"token": "{token}"}}\n\n'
+        yield 'event: done\ndata: {"time_to_first_token_ms": 12.0}\n\n' + " " * 2000
+
+    async def fake_db():
+        yield mocker.MagicMock()
+
+    controller = mocker.MagicMock()
+    controller.stream_chat_with_document = mocker.AsyncMock(return_value=events())
+    app.dependency_overrides[jwt_bearer] = lambda: {"sub": "1"}
+    app.dependency_overrides[get_read_db] = fake_db
+    app.dependency_overrides[get_document_controller] = lambda: controller
+    try:
+        response = client.post(
+            "/api/v1/docs/7/chat",
+            json={"query": "hi", "stream": True},
+            headers={"Accept-Encoding": "gzip"}
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert "content-encoding" not in response.headers
+    assert response.headers["x-content-type-options"] == "nosniff"
+    events_sent = [line for line in response.text.splitlines() if line.startswith("event:")]
+    assert events_sent == ["event: sources", "event: token", "event: token", "event: done"]
+
+
+def test_chat_overloaded_returns_503_with_retry_after(mocker):
+    """
+    Test that a chat shed by the generation gateway is answered with a 503
+    and a Retry-After header.
+    """
+    async def fake_db():
+        yield mocker.MagicMock()
+
+    controller = mocker.MagicMock()
+    controller.chat_with_document = mocker.AsyncMock(
+        side_effect=ServiceUnavailableException(message="busy", retry_after=5)
+    )
+    app.dependency_overrides[jwt_bearer] = lambda: {"sub": "1"}
+    app.dependency_overrides[get_read_db] = fake_db
+    app.dependency_overrides[get_document_controller] = lambda: controller
+    try:
+        response = client.post("/api/v1/docs/7/chat", json={"query": "hi"})
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    assert response.json()["message"] == "busy"
+
+
+@pytest.mark.asyncio
+async def test_controller_chat_passes_version_of_loaded_document(mocker, pg_session):
+    """
+    Test against Postgres that the chat controller can read the version of
+    a document loaded by the repository without a lazy load.
+    """
+    user = User(username="version", email="version@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    document = Document(file_name="contract.pdf", user_id=user.id, status=StatusEnum.SUCCESS)
+    pg_session.add(document)
+    await pg_session.flush()
+    document_id, updated_at = document.id, document.updated_at
+    pg_session.expunge_all()
+
+    chat_service = mocker.MagicMock()
+    chat_service.embed_query = mocker.AsyncMock(return_value=[0.1])
+    chat_service.process_chat = mocker.AsyncMock(return_value={"response": "ok", "sources": []})
+    doc_service = DocumentService(mocker.MagicMock(), DocumentRepository(), mocker.MagicMock())
+    controller = DocumentController(document_service=doc_service, chat_service=chat_service)
+
+    await controller.chat_with_document(
+        user_id=user.id, document_id=document_id, message="hi", session=pg_session
+    )
+
+    assert chat_service.process_chat.await_args.kwargs["document_version"] == updated_at
+
+
+@pytest.mark.asyncio
+async def test_controller_embeds_while_checking_ownership(mocker):
+    """
+    Test that the query embedding starts before the ownership check ends,
+    and is cancelled when the check fails.
+    """
+    embedding_started = asyncio.Event()
+    embedding_cancelled = asyncio.Event()
+
+    async def embed(message):
+        embedding_started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            embedding_cancelled.set()
+            raise
+
+    async def get_user_document(user_id, document_id, session):
+        await asyncio.wait_for(embedding_started.wait(), timeout=1)
+        raise NotFoundException(message="Document not found")
+
+    chat_service = mocker.MagicMock()
+    chat_service.embed_query = embed
+    doc_service = mocker.MagicMock()
+    doc_service.get_user_document = get_user_document
+    controller = DocumentController(document_service=doc_service, chat_service=chat_service)
+
+    with pytest.raises(NotFoundException):
+        await controller.chat_with_document(
+            user_id=1, document_id=2, message="hi", session=mocker.MagicMock()
+        )
+    await asyncio.wait_for(embedding_cancelled.wait(), timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_controller_chat_past_deadline_times_out(mocker):
+    """
+    Test that a chat still running at its deadline is cancelled with a 504.
+    """
+    async def slow_chat(**kwargs):
+        await asyncio.sleep(10)
+
+    chat_service = mocker.MagicMock()
+    chat_service.embed_query = mocker.AsyncMock(return_value=[0.1])
+    chat_service.process_chat = slow_chat
+    doc_service = mocker.MagicMock()
+    doc_service.get_user_document = mocker.AsyncMock(return_value=mocker.MagicMock())
+    controller = DocumentController(document_service=doc_service, chat_service=chat_service)
+
+    with pytest.raises(GatewayTimeoutException) as exc:
+        await controller.chat_with_document(
+            user_id=1, document_id=2, message="hi",
+            session=mocker.MagicMock(), deadline=Deadline(0.05)
+        )
+    assert exc.value.code == 504
+
+
+@pytest.mark.asyncio
+async def test_cancel_on_disconnect_cancels_abandoned_work(mocker):
+    """
+    Test that work for a client that disconnected is cancelled and
+    answered with a 499.
+    """
+    cancelled = asyncio.Event()
+
+    async def generate():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    request = mocker.MagicMock()
+    request.is_disconnected = mocker.AsyncMock(side_effect=[False, True])
+
+    response = await cancel_on_disconnect(request, generate(), poll_interval=0.01)
+
+    assert response.status_code == CLIENT_CLOSED_REQUEST
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+
+
+def test_page_cursor_round_trips_and_rejects_garbage():
+    """
+    Test that a cursor decodes to the position it was made from, and a
+    tampered one is refused with a 400.
+    """
+    created_at = datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc)
+
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, 42)
+    with pytest.raises(BadRequestException):
+        decode_cursor("not-a-cursor")
+
+
+@pytest.mark.asyncio
+async def test_get_documents_returns_cursor_only_when_more_pages(mocker):
+    """
+    Test that one row more than the page is fetched to decide whether a
+    next cursor is returned, and that the cursor points after the last
+    document of the page.
+    """
+    now = datetime.now(timezone.utc)
+    rows = [mocker.MagicMock(id=i, created_at=now - timedelta(minutes=i)) for i in range(3)]
+    repo = mocker.MagicMock()
+    repo.get_documents_by_user = mocker.AsyncMock(side_effect=[rows, rows[2:]])
+    repo.count_documents_by_user = mocker.AsyncMock(return_value=3)
+    service = DocumentService(mocker.MagicMock(), repo, mocker.MagicMock())
+
+    first = await service.get_documents(1, mocker.MagicMock(), limit=2)
+    second = await service.get_documents(1, mocker.MagicMock(), limit=2, cursor=first["next_cursor"])
+
+    assert first["items"] == rows[:2] and first["total"] == 3
+    assert decode_cursor(first["next_cursor"]) == (rows[1].created_at, 1)
+    assert repo.get_documents_by_user.await_args_list[1].kwargs["after"] == (rows[1].created_at, 1)
+    assert repo.get_documents_by_user.await_args_list[0].kwargs["limit"] == 3
+    assert second["items"] == rows[2:] and second["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_document_pages_cover_every_document_once(pg_session):
+    """
+    Test against Postgres that walking the pages returns every document
+    once, newest first and with ties on created_at broken by id, that the
+    status filter applies to pages and total, and that pages are read
+    from the (user_id, created_at, id) index.
+    """
+    user = User(username="pages", email="pages@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    now = datetime.now(timezone.utc)
+    pg_session.add_all([
+        Document(
+            file_name=f"{i}.txt",
+            user_id=user.id,
+            status=StatusEnum.SUCCESS if i % 3 else StatusEnum.PROCESSING,
+            created_at=now - timedelta(minutes=i // 2)
+        )
+        for i in range(25)
+    ])
+    await pg_session.flush()
+    repo = DocumentRepository()
+
+    seen = []
+    after = None
+    while True:
+        rows = await repo.get_documents_by_user(user.id, pg_session, limit=4, after=after)
+        seen.extend(rows)
+        if len(rows) < 4:
+            break
+        after = (rows[-1].created_at, rows[-1].id)
+
+    assert len({row.id for row in seen}) == 25
+    assert [(row.created_at, row.id) for row in seen] == sorted(
+        ((row.created_at, row.id) for row in seen), reverse=True
+    )
+    assert set(seen[0]._fields) == {"id", "file_name", "user_id", "status", "created_at", "updated_at"}
+    processing = await repo.get_documents_by_user(
+        user.id, pg_session, limit=100, status=StatusEnum.PROCESSING
+    )
+    assert len(processing) == 9
+    assert await repo.count_documents_by_user(user.id, pg_session, status=StatusEnum.PROCESSING) == 9
+    assert await repo.count_documents_by_user(user.id, pg_session) == 25
+
+    await pg_session.execute(text("SET LOCAL enable_seqscan = off"))
+    query = (
+        select(Document.id)
+        .where(Document.user_id == user.id)
+        .order_by(Document.created_at.desc(), Document.id.desc())
+        .limit(4)
+    )
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = (await pg_session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()[0]["Plan"]
+    assert plan["Plans"][0]["Index Name"] == "ix_document_user_created_id"
+
+
+@pytest.mark.asyncio
+async def test_delete_documents_in_groups_and_clears_answer_cache(mocker):
+    """
+    Test that documents are deleted a group at a time, chunks first, that
+    their cached answers are dropped, and that deleting a document the
+    user does not own is a 404.
+    """
+    repo = mocker.MagicMock()
+    repo.get_document_ids_by_user = mocker.AsyncMock(return_value=list(range(1, 251)))
+    repo.delete_chunks = mocker.AsyncMock(return_value=10)
+    repo.delete_documents = mocker.AsyncMock(side_effect=lambda user_id, ids, session: len(ids))
+    cache = AnswerCache(max_entries=10, similarity_threshold=0.95)
+    cache.put(7, "v1", [0.1, 0.2], "answer", [])
+    service = DocumentService(
+        mocker.MagicMock(), repo, mocker.MagicMock(), answer_cache=cache, delete_batch_size=500
+    )
+
+    assert await service.delete_documents(1, mocker.MagicMock()) == 250
+
+    assert [len(call.args[0]) for call in repo.delete_chunks.await_args_list] == [100, 100, 50]
+    assert repo.delete_chunks.await_args_list[0].args[1] == 500
+    assert len(cache) == 0
+
+    repo.get_document_ids_by_user.return_value = []
+    with pytest.raises(NotFoundException):
+        await service.delete_document(1, 999, mocker.MagicMock())
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_chunks_in_batches_and_dependent_rows(pg_session):
+    """
+    Test against Postgres that chunks are deleted in batches until none
+    are left, and that deleting the documents takes their answers, chat
+    sessions and QA jobs along while other users' documents stay.
+    """
+    owner = User(username="owner", email="owner@example.com", hashed_password="x")
+    other = User(username="other", email="other@example.com", hashed_password="x")
+    pg_session.add_all([owner, other])
+    await pg_session.flush()
+    document = Document(file_name="a.txt", user_id=owner.id, status=StatusEnum.SUCCESS)
+    kept = Document(file_name="b.txt", user_id=other.id, status=StatusEnum.SUCCESS)
+    pg_session.add_all([document, kept])
+    await pg_session.flush()
+    embedding = [0.1] * EMBEDDING_DIMENSIONS
+    pg_session.add_all([
+        DocumentChunk(document_id=doc.id, ordinal=i, content=str(i), embedding=embedding)
+        for doc in (document, kept) for i in range(25)
+    ])
+    pg_session.add(DocumentFAQ(
+        document_id=document.id, question="q", answer="a", embedding=embedding
+    ))
+    chat_session = ChatSession(document_id=document.id, user_id=owner.id)
+    job = QAJob(document_id=document.id, user_id=owner.id, total=1)
+    pg_session.add_all([chat_session, job])
+    await pg_session.flush()
+    pg_session.add_all([
+        ChatMessage(session_id=chat_session.id, role="user", content="hi", token_count=1),
+        QAJobAnswer(job_id=job.id, ordinal=0, question="q")
+    ])
+    await pg_session.flush()
+    repo = DocumentRepository()
+    execute = pg_session.execute
+    statements = []
+
+    async def counting_execute(statement, *args, **kwargs):
+        statements.append(statement)
+        return await execute(statement, *args, **kwargs)
+
+    pg_session.execute = counting_execute
+    assert await repo.delete_chunks([document.id], 10, pg_session) == 25
+    assert len(statements) == 3
+    pg_session.execute = execute
+
+    assert await repo.delete_documents(other.id, [document.id], pg_session) == 0
+    assert await repo.delete_documents(owner.id, [document.id], pg_session) == 1
+
+    for model in (ChatMessage, ChatSession, QAJobAnswer, QAJob, DocumentFAQ):
+        assert (await pg_session.execute(select(model.id))).first() is None
+    chunks = await pg_session.execute(select(DocumentChunk.document_id).distinct())
+    assert chunks.scalars().all() == [kept.id]
+    assert await repo.get_document_ids_by_user(other.id, pg_session) == [kept.id]
+
+
+def metric(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+@pytest.mark.asyncio
+async def test_process_document_records_stage_metrics(mocker, tmp_path):
+    """
+    Test that ingesting a document times each stage and counts its bytes
+    and chunks under its file type, and that the in-flight gauge goes back
+    down.
+    """
+    path = tmp_path / "upload.txt"
+    path.write_bytes(b"x" * 300)
+    mocker.patch.object(FileProcessor, "process", return_value=["first part", "second part"])
+    session = mocker.AsyncMock()
+
+    @asynccontextmanager
+    async def db_session():
+        yield session
+
+    mocker.patch("app.services.documents.documentservice.get_db_session", db_session)
+    repo = mocker.MagicMock()
+    repo.create = mocker.AsyncMock(return_value=mocker.MagicMock(id=1))
+    repo.bulk_create_chunks = mocker.AsyncMock()
+    embedding_service = mocker.MagicMock()
+    embedding_service.generate_embeddings = mocker.AsyncMock(
+        side_effect=lambda texts: [[0.1]] * len(texts)
+    )
+    file_service = mocker.MagicMock()
+    file_service.cleanup_temp_file = mocker.AsyncMock()
+    service = DocumentService(file_service, repo, embedding_service)
+    stages = ("parse", "chunk", "clean", "embed", "insert")
+    before = {
+        stage: metric("ingest_stage_seconds_count", stage=stage, file_type="txt")
+        for stage in stages
+    }
+    bytes_before = metric("ingested_bytes_total", file_type="txt")
+    chunks_before = metric("ingested_chunks_total", file_type="txt")
+
+    await service.process_document(str(path), 1, "Notes.TXT")
+
+    for stage in stages:
+        assert metric("ingest_stage_seconds_count", stage=stage, file_type="txt") == before[stage] + 1
+    assert metric("ingested_bytes_total", file_type="txt") == bytes_before + 300
+    assert metric("ingested_chunks_total", file_type="txt") == chunks_before + 1
+    assert metric("ingestions_in_progress", file_type="txt") == 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_export_service_stats_to_token_holders():
+    """
+    Test that /metrics requires the metrics token when one is set, and
+    that it exports the generation gateway and connection pool statistics
+    next to the prometheus_client metrics.
+    """
+    settings = get_settings().model_copy(update={"metrics_token": "scrape-secret"})
+    gateway = get_generation_gateway()
+    async with gateway.slot():
+        pass
+
+    with pytest.raises(ForbiddenException):
+        await metrics(None, settings)
+    with pytest.raises(ForbiddenException):
+        await metrics(HTTPAuthorizationCredentials(scheme="Bearer", credentials="wrong"), settings)
+    response = await metrics(HTTPAuthorizationCredentials(scheme="Bearer", credentials="scrape-secret"), settings)
+
+    body = response.body.decode()
+    assert "generation_in_flight 0.0" in body
+    assert "generation_queue_wait_seconds_count" in body
+    assert "db_pool_checkouts_total" in body
+    assert 'session_prefill_seconds_count{turn="follow_up"}' in body
+    assert metric("generation_queue_wait_seconds_count") == gateway.wait_ms.count
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.factory.documentfactory import get_model_warmer
+from app.main import app
+from app.services.documents.model_warmup import ModelWarmer
+
+
+def make_warmer(mocker):
+    llm_service = mocker.MagicMock()
+    llm_service.llm.model = "chat-model"
+    llm_service.warm_up = mocker.AsyncMock()
+    embedding_service = mocker.MagicMock()
+    embedding_service.model_name = "embed-model"
+    embedding_service.warm_up = mocker.AsyncMock()
+    return ModelWarmer(
+        llm_service, embedding_service, "http://ollama:11434",
+        keep_warm_interval=60, retry_interval=1
+    )
+
+
+@pytest.mark.asyncio
+async def test_warmer_is_ready_only_once_both_models_respond(mocker):
+    """
+    Test that the service becomes ready only when the chat and embedding
+    models both answer their warm-up request.
+    """
+    warmer = make_warmer(mocker)
+    warmer.embedding_service.warm_up.side_effect = [ConnectionError("loading"), None]
+
+    assert await warmer.warm() is False
+    assert warmer.models == {"chat": True, "embedding": False}
+
+    assert await warmer.warm() is True
+    assert warmer.status()["ready"] is True
+
+
+@pytest.mark.asyncio
+async def test_keep_warm_only_targets_unloaded_or_expiring_models(mocker):
+    """
+    Test that keep-warm skips models that recent traffic keeps loaded.
+    """
+    warmer = make_warmer(mocker)
+    now = datetime.now(timezone.utc)
+    processes = mocker.MagicMock()
+    processes.models = [mocker.MagicMock(model="chat-model", expires_at=now + timedelta(minutes=30))]
+    mocker.patch.object(warmer.client, "ps", mocker.AsyncMock(return_value=processes))
+
+    assert await warmer.stale_models() == ["embedding"]
+
+    processes.models[0].expires_at = now + timedelta(seconds=30)
+    assert await warmer.stale_models() == ["chat", "embedding"]
+
+
+def test_ready_endpoint_reports_model_readiness(mocker):
+    """
+    Test that /ready answers 503 until the models are warm, then 200.
+    """
+    warmer = make_warmer(mocker)
+    app.dependency_overrides[get_model_warmer] = lambda: warmer
+    try:
+        client = TestClient(app)
+        assert client.get("/ready").status_code == 503
+        warmer.models = {"chat": True, "embedding": True}
+        response = client.get("/ready")
+    finally:
+        app.dependency_overrides.clear()
+
+    assert response.status_code == 200
+    assert response.json()["ready"] is True
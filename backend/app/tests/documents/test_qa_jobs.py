@@ -0,0 +1,125 @@
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.core.exceptions import ServiceUnavailableException
+from app.db.models.jobs import QAJobStatusEnum
+from app.repositories.documents.documents import ScoredChunk
+from app.services.documents.chat_service import NO_CONTEXT_RESPONSE, ChatService
+from app.services.documents.generation_gateway import GenerationGateway
+from app.services.documents.qa_jobs import QAJobService
+
+
+class InMemoryJobRepository:
+    """QA job repository keeping a single job in memory."""
+
+    def __init__(self, questions):
+        self.job = SimpleNamespace(id=7, document_id=3, status=QAJobStatusEnum.PENDING, completed=0)
+        self.answers = [
+            SimpleNamespace(ordinal=i, question=q, answer=None, sources=None, error=None)
+            for i, q in enumerate(questions)
+        ]
+        self.statuses = []
+
+    async def get(self, job_id, session, user_id=None, document_id=None):
+        return self.job
+
+    async def get_answers(self, job_id, session):
+        return self.answers
+
+    async def set_status(self, job_id, status, session):
+        self.statuses.append(status)
+
+    async def save_answer(self, job_id, ordinal, session, answer=None, sources=None, error=None):
+        self.answers[ordinal].answer = answer
+        self.answers[ordinal].sources = sources
+        self.answers[ordinal].error = error
+        self.job.completed += 1
+
+
+def make_job_service(mocker, questions, hits, gateway=None):
+    document_repo = mocker.MagicMock()
+    document_repo.search_chunks_batch = mocker.AsyncMock(return_value=[
+        [ScoredChunk(id=i, content=content, distance=0.1) for i, content in enumerate(chunks)]
+        for chunks in hits
+    ])
+    embedding_service = mocker.MagicMock()
+    embedding_service.generate_embeddings = mocker.AsyncMock(
+        return_value=[[0.1, 0.2] for _ in questions]
+    )
+    llm_service = mocker.MagicMock()
+    llm_service.generate_response = mocker.AsyncMock(
+        side_effect=lambda query, context, context_tokens: f"answer to {query}"
+    )
+    chat_service = ChatService(document_repo, embedding_service, llm_service)
+
+    session = mocker.AsyncMock()
+
+    @asynccontextmanager
+    async def db_session():
+        yield session
+
+    mocker.patch("app.services.documents.qa_jobs.get_db_session", db_session)
+    return QAJobService(InMemoryJobRepository(questions), chat_service, gateway)
+
+
+@pytest.mark.asyncio
+async def test_qa_job_embeds_and_searches_all_questions_at_once(mocker):
+    """
+    Test that a job embeds and retrieves all questions in one call each and
+    stores an answer for every question, in question order.
+    """
+    questions = ["Who are the parties?", "When does it end?", "Any penalties?"]
+    service = make_job_service(
+        mocker, questions, [["Acme and Bolt sign."], ["It ends in 2027."], []]
+    )
+
+    await service.run(job_id=7)
+
+    service.chat_service.embedding_service.generate_embeddings.assert_awaited_once_with(questions)
+    service.chat_service.document_repo.search_chunks_batch.assert_awaited_once()
+    repo = service.job_repo
+    assert repo.statuses == [QAJobStatusEnum.RUNNING, QAJobStatusEnum.SUCCESS]
+    assert [answer.answer for answer in repo.answers] == [
+        "answer to Who are the parties?", "answer to When does it end?", NO_CONTEXT_RESPONSE
+    ]
+    assert repo.answers[0].sources == ["Acme and Bolt sign...."]
+    assert repo.job.completed == 3
+
+
+@pytest.mark.asyncio
+async def test_qa_job_waits_for_gateway_instead_of_failing(mocker):
+    """
+    Test that a question shed by the generation gateway is retried after
+    Retry-After instead of being stored as failed.
+    """
+    gateway = GenerationGateway(max_concurrency=1, max_queue=0, queue_timeout=1, retry_after=0)
+    service = make_job_service(mocker, ["Who signs?"], [["Acme signs."]], gateway)
+    await gateway._semaphore.acquire()
+    sleep = mocker.patch("app.services.documents.qa_jobs.asyncio.sleep")
+    sleep.side_effect = lambda _: gateway._semaphore.release()
+
+    await service.run(job_id=7)
+
+    assert gateway.rejected == 1
+    assert service.job_repo.answers[0].answer == "answer to Who signs?"
+    assert service.job_repo.answers[0].error is None
+
+
+@pytest.mark.asyncio
+async def test_qa_job_retry_without_gateway_waits_configured_retry_after(mocker):
+    """
+    Test that without a gateway, a question whose generation is shed is
+    retried after the configured Retry-After.
+    """
+    service = make_job_service(mocker, ["Who signs?"], [["Acme signs."]])
+    service.chat_service.llm_service.generate_response.side_effect = [
+        ServiceUnavailableException(retry_after=60), "Acme"
+    ]
+    sleep = mocker.patch("app.services.documents.qa_jobs.asyncio.sleep")
+
+    await service.run(job_id=7)
+
+    sleep.assert_awaited_once_with(service.settings.generation_retry_after)
+    assert service.job_repo.answers[0].answer == "Acme"
@@ -0,0 +1,248 @@
+import pytest
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+
+from app.db.models.documents import Document, DocumentChunk, EMBEDDING_DIMENSIONS, StatusEnum
+from app.db.models.users import User
+from app.repositories.documents.documents import (
+    DocumentRepository, ScoredChunk, batch_nearest_chunks_query, nearest_chunks_query
+)
+from app.services.documents.context import (
+    expand_context, join_overlapping, neighbour_ordinals, pack_context
+)
+
+
+def compile_sql(query) -> str:
+    return str(query.compile(dialect=postgresql.dialect()))
+
+
+def test_nearest_chunks_query_evaluates_distance_once():
+    """
+    Test that the distance is computed once, ordered and limited in the inner
+    query, and that the threshold only filters the k nearest rows.
+    """
+    sql = compile_sql(nearest_chunks_query(1, [0.1] * EMBEDDING_DIMENSIONS, k=5, threshold=0.7))
+    inner, outer = sql.split(") AS anon_1")
+
+    assert sql.count("<=>") == 1
+    assert "ORDER BY distance" in inner and "LIMIT" in inner
+    assert "<" not in inner.replace("<=>", "")
+    assert "anon_1.distance <" in outer
+
+
+def test_batch_nearest_chunks_query_is_one_lateral_statement():
+    """
+    Test that a batch search passes all query embeddings as one array and
+    runs the limited search per query in a LATERAL subquery.
+    """
+    query = batch_nearest_chunks_query(1, [[0.1] * 4, [0.2] * 4], k=3, threshold=0.5)
+    compiled = query.compile(dialect=postgresql.dialect())
+
+    assert "WITH ORDINALITY" in str(compiled)
+    assert "JOIN LATERAL" in str(compiled)
+    assert len(compiled.params["query_embeddings"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_search_chunks_sets_search_knobs_per_call(mocker):
+    """
+    Test that probes, ef_search and the statement timeout are applied
+    locally to the search transaction and the rows are returned with
+    their scores.
+    """
+    session = mocker.MagicMock()
+    result = [mocker.MagicMock(id=7, content="chunk", distance=0.2)]
+    session.execute = mocker.AsyncMock(side_effect=[None, result])
+
+    chunks = await DocumentRepository().search_chunks(
+        document_id=1,
+        query_embedding=[0.1] * EMBEDDING_DIMENSIONS,
+        session=session,
+        k=100,
+        probes=4,
+        ef_search=80,
+        iterative_scan="relaxed_order",
+        statement_timeout_ms=1500
+    )
+
+    assert session.execute.await_count == 2
+    params = list(
+        session.execute.await_args_list[0].args[0].compile(dialect=postgresql.dialect()).params.values()
+    )
+    assert [params[i:i + 2] for i in range(0, len(params), 3)] == [
+        ["ivfflat.probes", "4"],
+        ["hnsw.ef_search", "100"],
+        ["hnsw.iterative_scan", "relaxed_order"],
+        ["statement_timeout", "1500ms"],
+    ]
+    assert [(c.id, c.content, c.distance) for c in chunks] == [(7, "chunk", 0.2)]
+
+
+@pytest.mark.asyncio
+async def test_search_chunks_plan_limits_before_threshold(pg_session):
+    """
+    Test against Postgres that the plan applies LIMIT to the ordered scan
+    and filters on the threshold above it.
+    """
+    user = User(username="plan", email="plan@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    document = Document(file_name="plan.txt", user_id=user.id, status=StatusEnum.SUCCESS)
+    pg_session.add(document)
+    await pg_session.flush()
+    pg_session.add_all([
+        DocumentChunk(
+            document_id=document.id,
+            content=f"chunk {i}",
+            embedding=[1.0, float(i)] + [0.0] * (EMBEDDING_DIMENSIONS - 2)
+        )
+        for i in range(3)
+    ])
+    await pg_session.flush()
+
+    query = nearest_chunks_query(document.id, [1.0] * EMBEDDING_DIMENSIONS, k=2, threshold=0.9)
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = (await pg_session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()[0]["Plan"]
+
+    node = plan
+    while node["Node Type"] != "Subquery Scan":
+        node = node["Plans"][0]
+    assert "distance" in node["Filter"]
+    assert node["Plans"][0]["Node Type"] == "Limit"
+
+    chunks = await DocumentRepository().search_chunks(
+        document_id=document.id,
+        query_embedding=[1.0] + [0.0] * (EMBEDDING_DIMENSIONS - 1),
+        session=pg_session,
+        k=2,
+        threshold=0.9
+    )
+    assert [chunk.content for chunk in chunks] == ["chunk 0", "chunk 1"]
+    assert chunks[0].distance < chunks[1].distance
+
+
+@pytest.mark.asyncio
+async def test_search_chunks_recall_with_many_documents(pg_session):
+    """
+    Test against Postgres that a document whose chunks are far from the
+    query still gets k results through the HNSW index when the chunks of
+    other documents crowd the nearest neighbours.
+    """
+    version = (await pg_session.execute(
+        text("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    )).scalar()
+    if tuple(int(part) for part in version.split(".")[:2]) < (0, 8):
+        pytest.skip(f"hnsw.iterative_scan needs pgvector 0.8+, found {version}")
+
+    def embedding(near: float, far: float, noise: int) -> list:
+        vector = [near, far] + [0.0] * (EMBEDDING_DIMENSIONS - 2)
+        vector[2 + noise % (EMBEDDING_DIMENSIONS - 2)] = 0.01
+        return vector
+
+    user = User(username="recall", email="recall@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    documents = [
+        Document(file_name=f"doc{i}.txt", user_id=user.id, status=StatusEnum.SUCCESS)
+        for i in range(20)
+    ]
+    pg_session.add_all(documents)
+    await pg_session.flush()
+    target, others = documents[0], documents[1:]
+    pg_session.add_all([
+        DocumentChunk(document_id=document.id, content="other", embedding=embedding(1.0, 0.1, i))
+        for document in others for i in range(30)
+    ] + [
+        DocumentChunk(document_id=target.id, content=f"target {i}", embedding=embedding(0.3, 1.0, i))
+        for i in range(10)
+    ])
+    await pg_session.flush()
+
+    # Force the filtered HNSW scan, the plan that loses recall without
+    # iterative scans, instead of the exact per-document scan.
+    await pg_session.execute(text("DROP INDEX ix_document_chunks_document_ordinal"))
+    await pg_session.execute(text("SET LOCAL enable_seqscan = off"))
+    sql = str(nearest_chunks_query(target.id, [1.0] * EMBEDDING_DIMENSIONS, k=5).compile(
+        dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+    ))
+    plan = (await pg_session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+    assert "ix_document_chunks_embedding" in str(plan)
+
+    chunks = await DocumentRepository().search_chunks(
+        document_id=target.id,
+        query_embedding=[1.0] + [0.0] * (EMBEDDING_DIMENSIONS - 1),
+        session=pg_session,
+        k=5,
+        ef_search=10,
+        iterative_scan="relaxed_order"
+    )
+    assert len(chunks) == 5
+    assert all(chunk.content.startswith("target") for chunk in chunks)
+
+
+def test_join_overlapping_drops_shared_text():
+    """
+    Test that consecutive chunks are joined without repeating their overlap.
+    """
+    assert join_overlapping("The term is five years.", "five years. Renewal is yearly.") == (
+        "The term is five years. Renewal is yearly."
+    )
+    assert join_overlapping("First.", "Second.") == "First. Second."
+
+
+def test_expand_context_merges_neighbour_windows_within_budget():
+    """
+    Test that overlapping neighbour windows are merged into one passage and
+    that windows over the budget shrink to their hit.
+    """
+    hits = [
+        ScoredChunk(id=1, content="c2", distance=0.1, ordinal=2),
+        ScoredChunk(id=2, content="c3", distance=0.2, ordinal=3),
+        ScoredChunk(id=3, content="c9", distance=0.3, ordinal=9),
+    ]
+    chunks = {i: f"c{i}" for i in range(12)}
+
+    assert neighbour_ordinals(hits, 1) == [1, 2, 3, 4, 8, 9, 10]
+    assert expand_context(hits, chunks, 1, char_budget=100) == ["c1 c2 c3 c4", "c8 c9 c10"]
+    assert expand_context(hits, chunks, 1, char_budget=14) == ["c1 c2 c3 c4", "c9"]
+
+
+def test_expand_context_skips_empty_windows():
+    """
+    Test that a window whose chunks were not fetched falls back to its hit,
+    and that nothing is added when the hit is empty too.
+    """
+    hits = [
+        ScoredChunk(id=1, content="c2", distance=0.1, ordinal=2),
+        ScoredChunk(id=2, content="", distance=0.2, ordinal=9),
+    ]
+    chunks = {i: f"c{i}" for i in (4, 5)}
+
+    assert expand_context(hits, chunks, 1, char_budget=100) == ["c2"]
+    assert expand_context(hits, {}, 1, char_budget=100) == ["c2"]
+
+
+def test_pack_context_fills_budget_in_relevance_order():
+    """
+    Test that packing keeps relevance order, skips passages that do not
+    fit and still uses the remaining budget for smaller ones.
+    """
+    passages = [("best", 40), ("too long", 70), ("short", 20), ("tail", 30)]
+
+    packed = pack_context(passages, token_budget=62)
+
+    assert packed.passages == ["best", "short"]
+    assert packed.tokens == 61
+
+
+def test_pack_context_truncates_best_passage_when_nothing_fits():
+    """
+    Test that an oversized top passage is truncated to the budget instead
+    of leaving the context empty.
+    """
+    passages = [("one two three four five six", 6), ("seven eight nine", 3)]
+
+    packed = pack_context(passages, token_budget=2)
+
+    assert packed.passages == ["one two"]
+    assert packed.tokens == 2
@@ -1,16 +1,35 @@
 import re
+import time
+import statistics
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
 import pytest
 import pytest_mock
+from fastapi import HTTPException
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock
 from pydantic import ValidationError
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
 
 from app.api.v1.users.auth.auth import signup, login, logout
 from app.api.v1.users.auth.auth_response import AuthResponse, LogoutResponse
 from app.controllers.users.auth_controller import AuthController
 from app.core.exceptions import ForbiddenException
 from app.core.exceptions import BadRequestException
+from app.core.exceptions import ServiceUnavailableException
+from app.db.models.users import TokenTable, User
 from app.main import app
+from app.repositories.users.tokens import TokenRepository
+from app.services.auth.auth_services import jwt_bearer
+from app.services.auth.revocation import BloomFilter, RevocationFilter
+from app.services.auth.revocation_poller import RevocationPoller
+from app.services.auth.token_cache import TokenCache
+from app.utils.security import (
+    PasswordHasher, create_refresh_token, hash_password, verify_password
+)
 from app.schemas.users.users import UserCreate, TokenSchema, LoginUser
 
 
@@ -270,4 +289,367 @@ async def test_logout_successfully_invalidates_tokens(mocker: pytest_mock.MockFi
     
     assert isinstance(response, LogoutResponse)
     assert response.body == b'{"message":"Logout successful"}'
-    
\ No newline at end of file
+    
+
+@pytest.mark.asyncio
+async def test_jwt_bearer_queries_database_once_per_cached_token(mocker: pytest_mock.MockFixture):
+    """
+    Test that repeated requests with the same access token hit the database
+    once instead of on every request, and that a logout drops the token from
+    the cache.
+    """
+    cache = TokenCache(max_entries=10, ttl=60)
+    mocker.patch("app.services.auth.auth_services.get_token_cache", return_value=cache)
+    mocker.patch("app.repositories.users.tokens.get_token_cache", return_value=cache)
+    payload = {"sub": "1", "exp": time.time() + 600}
+    mocker.patch("app.services.auth.auth_services.decodeJWT", return_value=payload)
+    request = mocker.MagicMock()
+    request.cookies = {"_at": "access"}
+    db = mocker.AsyncMock()
+    db.execute.return_value.scalars = mocker.MagicMock(
+        return_value=mocker.MagicMock(first=mocker.MagicMock(return_value=object()))
+    )
+
+    for _ in range(100):
+        assert await jwt_bearer(request, db) == payload
+    before_logout = db.execute.await_count
+
+    await TokenRepository(db).invalidate_all_tokens(1)
+    await jwt_bearer(request, db)
+
+    assert before_logout == 1
+    assert (cache.hits, cache.misses) == (99, 2)
+    assert db.execute.await_count == 3
+    exported = {metric.name: metric.samples[0].value for metric in cache.collect()}
+    assert exported == {"token_cache_entries": 1, "token_cache_hits": 99, "token_cache_misses": 2}
+
+
+def test_token_cache_entry_never_outlives_token_expiry():
+    """
+    Test that a cached token is dropped at its exp even when the TTL is
+    longer.
+    """
+    cache = TokenCache(max_entries=10, ttl=3600)
+
+    cache.put("expired", {"sub": "1", "exp": time.time() - 1})
+    cache.put("valid", {"sub": "1", "exp": time.time() + 60})
+
+    assert cache.get("expired") is None
+    assert cache.get("valid") is not None
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_login_storm_does_not_stall_event_loop(mocker: pytest_mock.MockFixture):
+    """
+    Test that password verification runs on the hashing threads: while a
+    verification is blocked, the event loop keeps running other work.
+    """
+    release = threading.Event()
+    threads = []
+
+    def blocking_verify(plain_password, hashed_password):
+        threads.append(threading.current_thread().name)
+        release.wait(5)
+        return True
+
+    mocker.patch("app.utils.security.pwd_context.verify", side_effect=blocking_verify)
+    hasher = PasswordHasher(max_workers=2, max_pending=16, retry_after=1)
+
+    login = asyncio.create_task(hasher.verify("password", "hash"))
+    await asyncio.sleep(0)
+    assert hasher.pending == 1
+    assert not login.done()
+
+    release.set()
+    assert await login is True
+    assert threads[0].startswith("password-hash")
+    assert threads[0] != threading.current_thread().name
+
+
+@pytest.mark.asyncio
+async def test_password_hasher_sheds_logins_beyond_queue_cap(mocker: pytest_mock.MockFixture):
+    """
+    Test that logins beyond the queue cap are refused with a 503 instead of
+    waiting behind the others.
+    """
+    release = threading.Event()
+    mocker.patch(
+        "app.utils.security.pwd_context.verify",
+        side_effect=lambda plain, hashed: release.wait(5)
+    )
+    hasher = PasswordHasher(max_workers=1, max_pending=2, retry_after=3)
+
+    logins = [asyncio.create_task(hasher.verify("password", "hash")) for _ in range(2)]
+    await asyncio.sleep(0)
+    assert hasher.pending == 2
+
+    with pytest.raises(ServiceUnavailableException) as error:
+        await hasher.verify("password", "hash")
+    assert error.value.headers == {"Retry-After": "3"}
+
+    release.set()
+    assert await asyncio.gather(*logins) == [True, True]
+    assert hasher.pending == 0
+
+
+async def max_loop_lag(work) -> float:
+    """Run the work while measuring the longest event loop stall, in seconds."""
+    lag = 0.0
+    running = True
+
+    async def tick():
+        nonlocal lag
+        while running:
+            started = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lag = max(lag, time.perf_counter() - started - 0.005)
+
+    ticker = asyncio.create_task(tick())
+    await asyncio.sleep(0.01)
+    try:
+        await work()
+    finally:
+        running = False
+        await ticker
+    return lag
+
+
+@pytest.mark.asyncio
+async def test_benchmark_login_storm_loop_lag(benchmark):
+    """
+    Benchmark the longest event loop stall during a burst of logins with
+    real bcrypt, verifying on the event loop and on the hashing threads.
+    """
+    hashed = hash_password("password")
+    logins = 16
+    hasher = PasswordHasher(max_workers=2, max_pending=logins, retry_after=1)
+
+    async def inline_storm():
+        for _ in range(logins):
+            verify_password("password", hashed)
+
+    async def executor_storm():
+        await asyncio.gather(*(hasher.verify("password", hashed) for _ in range(logins)))
+
+    for name, storm in (("inline", inline_storm), ("executor", executor_storm)):
+        started = time.perf_counter()
+        lag = await max_loop_lag(storm)
+        elapsed = time.perf_counter() - started
+        benchmark(
+            f"{logins} logins {name}: max loop lag {lag * 1000:.1f} ms, "
+            f"storm {elapsed * 1000:.0f} ms"
+        )
+
+
+async def add_tokens(session, user_id: int, count: int, offset: int = 0, **values):
+    session.add_all([
+        TokenTable(
+            user_id=user_id,
+            access_token=f"access-{offset + i}",
+            refresh_token=f"refresh-{offset + i}",
+            **values
+        )
+        for i in range(count)
+    ])
+    await session.flush()
+
+
+def test_refresh_tokens_issued_in_the_same_second_differ():
+    """
+    Test that two refresh tokens for the same user are distinct even when
+    issued within the same second, since refresh tokens are unique.
+    """
+    assert create_refresh_token(1) != create_refresh_token(1)
+
+
+@pytest.mark.asyncio
+async def test_refresh_token_lookup_uses_index(pg_session):
+    """
+    Test against Postgres that refresh and logout find the token through
+    the refresh token index, so their latency stays flat as the table
+    grows.
+    """
+    user = User(username="tokens", email="tokens@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    await add_tokens(pg_session, user.id, 1000)
+    await pg_session.execute(text("ANALYZE token"))
+    token_repo = TokenRepository(pg_session)
+
+    assert await token_repo.get_by_refresh_token("refresh-500") is not None
+    await token_repo.invalidate_token("refresh-501")
+
+    query = select(TokenTable).filter(TokenTable.refresh_token == "refresh-1", TokenTable.status)
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = (await pg_session.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()[0]["Plan"]
+    assert plan["Node Type"] == "Index Scan"
+    assert plan["Index Name"] == "ix_token_refresh_token"
+
+
+@pytest.mark.asyncio
+async def test_benchmark_refresh_and_logout_latency_by_table_size(pg_session, benchmark):
+    """
+    Benchmark against Postgres the median latency of a refresh lookup and
+    of a logout as the token table grows.
+    """
+    user = User(username="tokens", email="tokens@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    token_repo = TokenRepository(pg_session)
+    rounds = 20
+    size = 0
+    for target in (1000, 10000, 50000):
+        await add_tokens(pg_session, user.id, target - size, offset=size)
+        size = target
+        await pg_session.execute(text("ANALYZE token"))
+
+        refresh, logout = [], []
+        for i in range(rounds):
+            started = time.perf_counter()
+            assert await token_repo.get_by_refresh_token(f"refresh-{size - 1 - i}") is not None
+            refresh.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            await token_repo.invalidate_token(f"refresh-{size - 1 - rounds - i}")
+            logout.append(time.perf_counter() - started)
+        benchmark(
+            f"{size} tokens: refresh {statistics.median(refresh) * 1000:.2f} ms, "
+            f"logout {statistics.median(logout) * 1000:.2f} ms"
+        )
+
+
+@pytest.mark.asyncio
+async def test_delete_expired_removes_expired_and_revoked_tokens_in_batches(pg_session):
+    """
+    Test against Postgres that the sweep deletes expired tokens, and
+    revoked tokens whose access token expired, at most one batch at a
+    time, and keeps the others.
+    """
+    user = User(username="sweep", email="sweep@example.com", hashed_password="x")
+    pg_session.add(user)
+    await pg_session.flush()
+    now = datetime.utcnow()
+    await add_tokens(pg_session, user.id, 5, offset=0, created_at=now - timedelta(days=30))
+    await add_tokens(
+        pg_session, user.id, 3, offset=5, created_at=now - timedelta(days=1), status=False
+    )
+    await add_tokens(pg_session, user.id, 1, offset=8, created_at=now, status=False)
+    await add_tokens(pg_session, user.id, 2, offset=9, created_at=now)
+    token_repo = TokenRepository(pg_session)
+
+    batches = []
+    while True:
+        batches.append(await token_repo.delete_expired(
+            now - timedelta(days=7), now - timedelta(hours=1), batch_size=3
+        ))
+        if batches[-1] < 3:
+            break
+
+    assert batches == [3, 3, 2]
+    remaining = (await pg_session.execute(select(TokenTable.refresh_token))).scalars().all()
+    assert sorted(remaining) == ["refresh-10", "refresh-8", "refresh-9"]
+    assert await token_repo.count() == 3
+
+
+def test_bloom_filter_has_no_false_negatives_and_bounded_false_positives():
+    """
+    Test that every added ID is found and that the false positive rate
+    stays close to the one the filter is sized for.
+    """
+    bloom = BloomFilter(capacity=10000, error_rate=0.01)
+    for i in range(10000):
+        bloom.add(f"revoked-{i}")
+
+    assert all(f"revoked-{i}" in bloom for i in range(10000))
+    false_positives = sum(f"active-{i}" in bloom for i in range(100000))
+    assert false_positives / 100000 < 0.02
+    assert not bloom.saturated
+
+
+@pytest.mark.asyncio
+async def test_jwt_bearer_skips_database_unless_revocation_filter_hits(
+    mocker: pytest_mock.MockFixture
+):
+    """
+    Test that a token missing from the revocation filter is accepted
+    without a query, and that a revoked one is rejected after checking the
+    primary, even while it is still in the token cache.
+    """
+    revocations = RevocationFilter(capacity=100, error_rate=0.001, max_staleness=30)
+    revocations.replace(["revoked"], watermark=None)
+    mocker.patch("app.services.auth.auth_services.get_revocation_filter", return_value=revocations)
+    cache = TokenCache(max_entries=10, ttl=60)
+    mocker.patch("app.services.auth.auth_services.get_token_cache", return_value=cache)
+    decode = mocker.patch("app.services.auth.auth_services.decodeJWT")
+    request = mocker.MagicMock()
+    request.cookies = {"_at": "access"}
+    replica = mocker.AsyncMock()
+    primary = mocker.AsyncMock()
+    primary.execute.return_value.scalars = mocker.MagicMock(
+        return_value=mocker.MagicMock(first=mocker.MagicMock(return_value=None))
+    )
+
+    @asynccontextmanager
+    async def primary_session():
+        yield primary
+
+    mocker.patch("app.services.auth.auth_services.get_db_session", primary_session)
+
+    decode.return_value = {"sub": "1", "exp": time.time() + 600, "jti": "active"}
+    for _ in range(100):
+        assert await jwt_bearer(request, replica) == decode.return_value
+    assert primary.execute.await_count == 0
+
+    decode.return_value = {"sub": "1", "exp": time.time() + 600, "jti": "revoked"}
+    cache.put("access", decode.return_value)
+    with pytest.raises(HTTPException) as error:
+        await jwt_bearer(request, replica)
+    assert error.value.detail == "Token invalidated"
+    assert primary.execute.await_count == 1
+    assert replica.execute.await_count == 0
+    assert (revocations.checks, revocations.hits) == (101, 1)
+    exported = {metric.name: metric.samples[0].value for metric in revocations.collect()}
+    assert exported["revocation_filter_checks"] == 101
+    assert exported["revocation_filter_hits"] == 1
+    assert exported["revocation_filter_ready"] == 1
+
+
+def test_revocation_filter_sends_everything_to_database_when_stale():
+    """
+    Test that before the first load, and once polls stop succeeding, no
+    token is accepted on the filter alone.
+    """
+    revocations = RevocationFilter(capacity=100, error_rate=0.001, max_staleness=0)
+
+    assert revocations.might_be_revoked("active")
+    revocations.replace([], watermark=None)
+    time.sleep(0.01)
+    assert revocations.might_be_revoked("active")
+
+
+@pytest.mark.asyncio
+async def test_revocation_poller_loads_incrementally_from_watermark(
+    mocker: pytest_mock.MockFixture
+):
+    """
+    Test that after the first full load, polls only fetch revocations newer
+    than the watermark minus the overlap, and add them to the filter.
+    """
+    revocations = RevocationFilter(capacity=100, error_rate=0.001, max_staleness=30)
+    poller = RevocationPoller(revocations, poll_interval=1, overlap=5, rebuild_interval=3600)
+    first = datetime(2024, 1, 1, 12, 0, 0)
+    token_repo = mocker.AsyncMock()
+    token_repo.get_revoked_jtis.side_effect = [
+        [("a", first)],
+        [("a", first), ("b", first + timedelta(seconds=3))],
+    ]
+
+    await poller.poll(token_repo)
+    await poller.poll(token_repo)
+
+    assert [call.args for call in token_repo.get_revoked_jtis.await_args_list] == [
+        (None,), (first - timedelta(seconds=5),)
+    ]
+    assert revocations.watermark == first + timedelta(seconds=3)
+    assert revocations.might_be_revoked("b")
+    assert not revocations.might_be_revoked("c")
@@ -0,0 +1,180 @@
+import io
+
+import pytest
+import pytest_mock
+from fastapi import BackgroundTasks, UploadFile
+
+from app.controllers.documents.document_controller import DocumentController
+from app.core.exceptions import NotFoundException, TooManyRequestsException
+from app.repositories.users.rate_limits import RateLimitRepository
+from app.services.auth.rate_limiter import (
+    EMBEDDING_CHUNKS, LLM_TOKENS, UPLOAD_BYTES,
+    BucketLimit, MemoryRateLimitStore, RateLimiter
+)
+from app.services.documents.documentservice import DocumentService, FileService
+from app.utils.tokens import record_token_usage
+
+
+def make_limiter(**limits) -> RateLimiter:
+    buckets = {
+        UPLOAD_BYTES: BucketLimit(1000, 10),
+        EMBEDDING_CHUNKS: BucketLimit(10, 1),
+        LLM_TOKENS: BucketLimit(1000, 10),
+    }
+    buckets.update(limits)
+    return RateLimiter(MemoryRateLimitStore(), buckets, chat_overhead_tokens=400)
+
+
+@pytest.mark.asyncio
+async def test_bucket_refuses_beyond_burst_and_refills(mocker: pytest_mock.MockFixture):
+    """
+    Test that a bucket grants requests up to its capacity, refuses the next
+    one with a Retry-After until it refills, and keeps users apart.
+    """
+    clock = mocker.patch("app.services.auth.rate_limiter.time.monotonic", return_value=100.0)
+    limiter = make_limiter()
+
+    await limiter.acquire(1, LLM_TOKENS, 600)
+    await limiter.acquire(1, LLM_TOKENS, 400)
+    with pytest.raises(TooManyRequestsException) as error:
+        await limiter.acquire(1, LLM_TOKENS, 300)
+    assert error.value.headers == {"Retry-After": "30"}
+    await limiter.acquire(2, LLM_TOKENS, 300)
+
+    clock.return_value = 130.0
+    await limiter.acquire(1, LLM_TOKENS, 300)
+
+
+@pytest.mark.asyncio
+async def test_charge_after_the_fact_delays_next_request(mocker: pytest_mock.MockFixture):
+    """
+    Test that a cost charged after the request was accepted may put the
+    bucket into debt, which refuses the user's next request.
+    """
+    mocker.patch("app.services.auth.rate_limiter.time.monotonic", return_value=100.0)
+    limiter = make_limiter()
+
+    await limiter.acquire(1, EMBEDDING_CHUNKS, 1)
+    await limiter.charge(1, EMBEDDING_CHUNKS, 25)
+
+    with pytest.raises(TooManyRequestsException) as error:
+        await limiter.acquire(1, EMBEDDING_CHUNKS, 1)
+    assert error.value.headers == {"Retry-After": "17"}
+
+
+@pytest.mark.asyncio
+async def test_cost_above_capacity_passes_once_bucket_is_full(mocker: pytest_mock.MockFixture):
+    """
+    Test that a request costing more than the bucket holds is not refused
+    forever, but charged the whole bucket.
+    """
+    mocker.patch("app.services.auth.rate_limiter.time.monotonic", return_value=100.0)
+    limiter = make_limiter()
+
+    await limiter.acquire(1, UPLOAD_BYTES, 5000)
+    with pytest.raises(TooManyRequestsException):
+        await limiter.acquire(1, UPLOAD_BYTES, 1)
+
+
+@pytest.mark.asyncio
+async def test_upload_over_byte_limit_is_refused_before_saving(mocker: pytest_mock.MockFixture):
+    """
+    Test that an upload larger than what is left in the user's byte bucket
+    is refused before any file is saved.
+    """
+    file_service = mocker.MagicMock()
+    file_service.validate_file = mocker.AsyncMock()
+    file_service.get_size = FileService.get_size
+    file_service.save_temp_file = mocker.AsyncMock()
+    service = DocumentService(
+        file_service, mocker.MagicMock(), mocker.MagicMock(),
+        rate_limiter=make_limiter(**{UPLOAD_BYTES: BucketLimit(1000, 1)})
+    )
+    files = [UploadFile(io.BytesIO(b"x" * 600), filename=f"{i}.txt") for i in range(2)]
+
+    await service.handle_upload(1, files[:1], BackgroundTasks())
+    with pytest.raises(TooManyRequestsException):
+        await service.handle_upload(1, files[1:], BackgroundTasks())
+
+    assert file_service.save_temp_file.await_count == 1
+
+
+@pytest.mark.asyncio
+async def test_settle_gives_back_or_charges_the_difference(mocker: pytest_mock.MockFixture):
+    """
+    Test that settling a reservation charges the actual cost instead,
+    and that what is given back never fills the bucket past its capacity.
+    """
+    mocker.patch("app.services.auth.rate_limiter.time.monotonic", return_value=100.0)
+    limiter = make_limiter()
+
+    reserved = await limiter.acquire(1, LLM_TOKENS, 400)
+    await limiter.settle(1, LLM_TOKENS, reserved, 700)
+    await limiter.acquire(1, LLM_TOKENS, 300)
+    with pytest.raises(TooManyRequestsException):
+        await limiter.acquire(1, LLM_TOKENS, 1)
+
+    reserved = await limiter.acquire(2, LLM_TOKENS, 1000)
+    await limiter.settle(2, LLM_TOKENS, reserved + 500, 0)
+    await limiter.acquire(2, LLM_TOKENS, 1000)
+    with pytest.raises(TooManyRequestsException):
+        await limiter.acquire(2, LLM_TOKENS, 1)
+
+
+@pytest.mark.asyncio
+async def test_chat_is_charged_the_tokens_the_model_reported(mocker: pytest_mock.MockFixture):
+    """
+    Test that chats about a document the user does not own cost nothing,
+    that generative chats reserve the estimate and are charged the tokens
+    the model reported, and that answers without a generation, like
+    cache hits and extractive ones, are given back.
+    """
+    mocker.patch("app.services.auth.rate_limiter.time.monotonic", return_value=100.0)
+    document = mocker.MagicMock()
+    doc_service = mocker.MagicMock()
+    doc_service.get_user_document = mocker.AsyncMock(
+        side_effect=[NotFoundException()] * 3 + [document] * 6
+    )
+    reported = iter([250, 0, 0, 0, 500])
+
+    async def process_chat(**kwargs):
+        record_token_usage(next(reported))
+        return {"response": "answer"}
+
+    chat_service = mocker.MagicMock()
+    chat_service.embed_query = mocker.AsyncMock(return_value=[0.1, 0.2])
+    chat_service.process_chat = mocker.AsyncMock(side_effect=process_chat)
+    controller = DocumentController(
+        document_service=doc_service, chat_service=chat_service,
+        rate_limiter=make_limiter()
+    )
+
+    for _ in range(3):
+        with pytest.raises(NotFoundException):
+            await controller.chat_with_document(1, 7, "What is it?", mocker.MagicMock())
+    for mode in ("generative", "generative", "extractive", "extractive", "generative"):
+        await controller.chat_with_document(1, 7, "What is it?", mocker.MagicMock(), mode=mode)
+    # 250 tokens are left, short of the 404 reserved for the question
+    with pytest.raises(TooManyRequestsException) as error:
+        await controller.chat_with_document(1, 7, "What is it?", mocker.MagicMock())
+
+    assert error.value.headers == {"Retry-After": "16"}
+    assert chat_service.process_chat.await_count == 5
+
+
+@pytest.mark.asyncio
+async def test_postgres_bucket_take_is_atomic_upsert(pg_session):
+    """
+    Test against Postgres that the first take creates a full bucket, later
+    ones only succeed while tokens are left, and forced ones run into debt.
+    """
+    repository = RateLimitRepository()
+
+    assert await repository.take("llm_tokens:1", 600, 1000, 0.001, pg_session) == pytest.approx(400, abs=1)
+    assert await repository.take("llm_tokens:1", 300, 1000, 0.001, pg_session) == pytest.approx(100, abs=1)
+    assert await repository.take("llm_tokens:1", 300, 1000, 0.001, pg_session) is None
+    assert await repository.level("llm_tokens:1", 1000, 0.001, pg_session) == pytest.approx(100, abs=1)
+
+    left = await repository.take("llm_tokens:1", 300, 1000, 0.001, pg_session, force=True)
+    assert left == pytest.approx(-200, abs=1)
+    assert await repository.level("llm_tokens:2", 1000, 0.001, pg_session) == 1000
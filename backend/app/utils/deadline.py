@@ -0,0 +1,52 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from app.core.exceptions import GatewayTimeoutException
+
+
+class Deadline:
+    """
+    A point in time by which a whole request must be done.
+
+    The same deadline is handed to every stage of the request, each of
+    which only gets the time that is left.
+
+    :param seconds: The time allowed from now.
+    """
+
+    def __init__(self, seconds: float):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        """
+        Get the time left.
+
+        :return: The seconds left, zero once expired.
+        """
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def remaining_ms(self) -> int:
+        """
+        Get the time left in whole milliseconds, at least one.
+
+        :return: The milliseconds left.
+        """
+        return max(1, int(self.remaining() * 1000))
+
+    @asynccontextmanager
+    async def limit(self) -> AsyncIterator[None]:
+        """
+        Cancel the block when the deadline passes.
+
+        :raises GatewayTimeoutException: If the deadline passed.
+        """
+        try:
+            async with asyncio.timeout(self.remaining()):
+                yield
+        except TimeoutError:
+            raise GatewayTimeoutException(
+                message=f"The request did not complete within {self.seconds:g} seconds"
+            )
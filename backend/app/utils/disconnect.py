@@ -0,0 +1,44 @@
+import asyncio
+import logging
+from typing import Any, Awaitable
+
+from fastapi import Request
+from fastapi.responses import Response
+
+
+logger = logging.getLogger(__name__)
+
+# nginx's status for a request closed by the client
+CLIENT_CLOSED_REQUEST = 499
+
+
+async def cancel_on_disconnect(
+    request: Request,
+    awaitable: Awaitable[Any],
+    poll_interval: float = 0.25
+) -> Any:
+    """
+    Run the awaitable, cancelling it if the client goes away first.
+
+    Cancelling aborts any in-flight HTTP call to Ollama, which then
+    stops generating for a client that will never read the answer.
+
+    :param request: The incoming request.
+    :param awaitable: The work producing the response.
+    :param poll_interval: Seconds between disconnect checks.
+    :return: The result of the awaitable, or an empty 499 response if
+        the client disconnected.
+    """
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=poll_interval)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                logger.info(f"Client disconnected, cancelling {request.url.path}")
+                task.cancel()
+                return Response(status_code=CLIENT_CLOSED_REQUEST)
+    finally:
+        if not task.done():
+            task.cancel()
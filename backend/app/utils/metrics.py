@@ -0,0 +1,132 @@
+import bisect
+from typing import Sequence
+
+import prometheus_client
+from prometheus_client.core import HistogramMetricFamily
+from prometheus_client.utils import floatToGoString
+
+
+class Histogram:
+    """
+    A cumulative histogram of observed values, in the Prometheus layout.
+
+    :param buckets: The upper bounds of the buckets, in increasing order.
+    """
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = list(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        """
+        Record a value.
+
+        :param value: The observed value.
+        """
+        self._counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def snapshot(self) -> dict:
+        """
+        Get the cumulative bucket counts, total count and sum.
+
+        :return: The histogram as a JSON-serialisable dict.
+        """
+        cumulative = {}
+        total = 0
+        for bound, count in zip(self.buckets + ["+Inf"], self._counts):
+            total += count
+            cumulative[str(bound)] = total
+        return {"buckets": cumulative, "count": self.count, "sum": self.sum}
+
+    def add_to(self, family: HistogramMetricFamily, labels: Sequence[str] = (), divisor: float = 1):
+        """
+        Add the histogram to a Prometheus metric family.
+
+        :param family: The family to add the histogram to.
+        :param labels: The label values of the histogram in the family.
+        :param divisor: What to divide the observed values by, e.g. 1000
+            to export milliseconds as seconds.
+        """
+        buckets = []
+        total = 0
+        for bound, count in zip(self.buckets + [float("inf")], self._counts):
+            total += count
+            buckets.append((floatToGoString(bound / divisor), total))
+        family.add_metric(list(labels), buckets, self.sum / divisor)
+
+
+# seconds, from a cached lookup up to a long generation or a large upload
+STAGE_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300
+)
+
+# ingestion, labelled by the extension of the uploaded file
+INGEST_STAGE_SECONDS = prometheus_client.Histogram(
+    "ingest_stage_seconds",
+    "Time spent in each stage of document ingestion: parse, chunk, clean, embed, insert.",
+    ["stage", "file_type"],
+    buckets=STAGE_BUCKETS
+)
+INGESTED_DOCUMENTS = prometheus_client.Counter(
+    "ingested_documents_total",
+    "Documents whose ingestion finished, by outcome.",
+    ["file_type", "outcome"]
+)
+INGESTED_BYTES = prometheus_client.Counter(
+    "ingested_bytes_total",
+    "Bytes of the uploaded files ingested.",
+    ["file_type"]
+)
+INGESTED_CHUNKS = prometheus_client.Counter(
+    "ingested_chunks_total",
+    "Chunks embedded and stored.",
+    ["file_type"]
+)
+INGESTED_TOKENS = prometheus_client.Counter(
+    "ingested_tokens_total",
+    "Estimated tokens of the chunks stored.",
+    ["file_type"]
+)
+INGESTIONS_IN_PROGRESS = prometheus_client.Gauge(
+    "ingestions_in_progress",
+    "Documents being ingested.",
+    ["file_type"]
+)
+
+# chat; model is empty for the stages that do not call a model
+CHAT_STAGE_SECONDS = prometheus_client.Histogram(
+    "chat_stage_seconds",
+    "Time spent in each stage of a chat: auth, ownership, query_embed, retrieval, generation.",
+    ["stage", "model"],
+    buckets=STAGE_BUCKETS
+)
+
+# models
+EMBEDDED_TEXTS = prometheus_client.Counter(
+    "embedded_texts_total",
+    "Texts sent to the embedding model.",
+    ["model"]
+)
+LLM_TOKENS = prometheus_client.Counter(
+    "llm_tokens_total",
+    "Prompt and completion tokens evaluated by the chat model, as reported by Ollama.",
+    ["model", "kind"]
+)
+
+
+def file_type(filename: str) -> str:
+    """
+    Get the metric label of an uploaded file.
+
+    Args:
+        filename (str): The original file name.
+
+    Returns:
+        str: The lowercased extension, or "none" without one.
+    """
+    _, dot, extension = filename.rpartition(".")
+    return extension.lower() if dot else "none"
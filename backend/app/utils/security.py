@@ -1,10 +1,15 @@
+import asyncio
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 from passlib.context import CryptContext
 from datetime import datetime, timedelta, timezone
-from typing import Any
+from typing import Any, Callable
 from jose import jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.core.config import get_settings
+from app.core.exceptions import ServiceUnavailableException
 from app.db.models.users import TokenTable
 from app.schemas.users.users import TokenSchema
 
@@ -37,9 +42,106 @@ def verify_password(
 
     return pwd_context.verify(plain_password, hashed_password)
 
+
+class PasswordHasher:
+    """
+    Runs bcrypt on a dedicated, size-limited thread pool.
+
+    Each hash or verification takes a few hundred milliseconds of CPU.
+    Run on the event loop, a burst of logins would stall every other
+    request of the worker, including chat streams. Here they queue for
+    one of ``max_workers`` threads instead, and once ``max_pending``
+    calls are queued or running, further ones are refused with a 503.
+
+    Attributes:
+        max_workers (int): The number of hashing threads.
+        max_pending (int): The maximum number of queued or running calls.
+        retry_after (int): The Retry-After sent with a 503, in seconds.
+        pending (int): The number of queued or running calls.
+    """
+
+    def __init__(self, max_workers: int, max_pending: int, retry_after: int):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retry_after = retry_after
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="password-hash"
+        )
+
+    async def hash(self, password: str) -> str:
+        """
+        Hash a password off the event loop.
+
+        :param password: The plain text password.
+        :return: The hashed password.
+        :raises ServiceUnavailableException: If too many calls are queued.
+        """
+        return await self._run(hash_password, password)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """
+        Verify a password off the event loop.
+
+        :param plain_password: The plain text password to verify.
+        :param hashed_password: The hashed password to compare against.
+        :return: True if the passwords match, False otherwise.
+        :raises ServiceUnavailableException: If too many calls are queued.
+        """
+        return await self._run(verify_password, plain_password, hashed_password)
+
+    async def _run(self, function: Callable, *args):
+        if self.pending >= self.max_pending:
+            raise ServiceUnavailableException(
+                message="Too many sign-in attempts, please retry shortly",
+                retry_after=self.retry_after
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self._executor, function, *args
+            )
+        finally:
+            self.pending -= 1
+
+
+@lru_cache
+def get_password_hasher() -> PasswordHasher:
+    """
+    Get the process-wide password hasher.
+
+    :return: The password hasher.
+    """
+    return PasswordHasher(
+        max_workers=settings.password_hash_workers,
+        max_pending=settings.password_hash_max_pending,
+        retry_after=settings.password_hash_retry_after
+    )
+
+
+async def hash_password_async(password: str) -> str:
+    """
+    Hashes the given password on the password hashing threads.
+    """
+    return await get_password_hasher().hash(password)
+
+
+async def verify_password_async(
+    plain_password: str,
+    hashed_password: str) -> bool:
+    """
+    Verifies the given password on the password hashing threads.
+
+    :param plain_password: The plain text password to verify.
+    :param hashed_password: The hashed password to compare against.
+    :return: True if the passwords match, False otherwise.
+    """
+    return await get_password_hasher().verify(plain_password, hashed_password)
+
 def create_access_token(
     subject: str | Any,
     expires_delta: timedelta | None = None,
+    jti: str | None = None,
 ) -> str:
     """
     Creates a JWT access token for the given subject.
@@ -47,6 +149,8 @@ def create_access_token(
     :param subject: The subject of the token, usually a user ID.
     :param expires_delta: The time delta for when the token should expire.
         If None, the token expires after ACCESS_TOKEN_EXPIRE_MINUTES minutes.
+    :param jti: The ID of the token, checked against the revocation
+        filter. If None, a random one is generated.
     :return: The generated JWT access token.
     """
     expires = datetime.now(timezone.utc) + (
@@ -54,7 +158,7 @@ def create_access_token(
             minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES
         )
     )
-    to_encode = {"exp": expires, "sub": str(subject)}
+    to_encode = {"exp": expires, "sub": str(subject), "jti": jti or uuid.uuid4().hex}
     return jwt.encode(
         to_encode,
         settings.JWT_SECRET_KEY,
@@ -72,7 +176,8 @@ def create_refresh_token(
     :param subject: The subject of the token, usually a user ID.
     :param expires_delta: The time delta for when the token should expire.
         If None, the token expires after REFRESH_TOKEN_EXPIRE_MINUTES minutes.
-    :return: The generated JWT refresh token.
+    :return: The generated JWT refresh token, unique thanks to a random
+        ``jti`` even when issued twice in the same second.
     """
 
     now = datetime.now(timezone.utc)
@@ -80,7 +185,7 @@ def create_refresh_token(
         minutes=settings.REFRESH_TOKEN_EXPIRE_MINUTES
     ) if expires_delta is None else now + expires_delta
     
-    to_encode = {"exp": expires, "sub": str(subject)}
+    to_encode = {"exp": expires, "sub": str(subject), "jti": uuid.uuid4().hex}
     return jwt.encode(
         to_encode,
         settings.JWT_REFRESH_SECRET_KEY,
@@ -100,12 +205,13 @@ async def create_tokens(
     :param db: The database session to use.
     :return: A dictionary containing the access and refresh tokens.
     """
-    access = create_access_token(id)
+    jti = uuid.uuid4().hex
+    access = create_access_token(id, jti=jti)
     refresh = create_refresh_token(id)
     
     token_db = TokenTable(
         user_id=id,  access_token=access, 
-        refresh_token=refresh, status=True
+        refresh_token=refresh, jti=jti, status=True
     )
     await db.merge(token_db)
     await db.commit()
@@ -0,0 +1,85 @@
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenUsage:
+    """
+    The LLM tokens the model reported for the generations of a request,
+    prompt and completion together, in ``tokens``.
+    """
+
+    def __init__(self):
+        self.tokens = 0
+
+
+_usage: ContextVar[Optional[TokenUsage]] = ContextVar("token_usage", default=None)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Estimate the number of LLM tokens in the given text.
+
+    Words and punctuation marks are counted separately, and long
+    words are assumed to split into roughly four-character pieces,
+    which tracks the llama tokenizer closely enough for budgeting.
+
+    :param text: The text to measure.
+    :return: The estimated token count.
+    """
+    if not text:
+        return 0
+    return sum(
+        max(1, (len(piece) + 3) // 4)
+        for piece in TOKEN_PATTERN.findall(text)
+    )
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    Cut the text to at most the given estimated number of tokens.
+
+    :param text: The text to cut.
+    :param max_tokens: The maximum estimated token count to keep.
+    :return: The longest prefix within the budget, ending on a whole word.
+    """
+    used = 0
+    end = 0
+    for match in TOKEN_PATTERN.finditer(text):
+        cost = max(1, (len(match.group()) + 3) // 4)
+        if used + cost > max_tokens:
+            break
+        used += cost
+        end = match.end()
+    return text[:end]
+
+
+@contextmanager
+def track_token_usage() -> Iterator[TokenUsage]:
+    """
+    Tally the LLM tokens reported within the block, including by the
+    tasks started in it.
+
+    :return: The tally, filled in as generations finish.
+    """
+    usage = TokenUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def record_token_usage(tokens: int):
+    """
+    Add reported LLM tokens to the tally of the current request, if one
+    is being tracked.
+
+    :param tokens: The prompt and completion tokens of a generation.
+    """
+    usage = _usage.get()
+    if usage is not None:
+        usage.tokens += tokens
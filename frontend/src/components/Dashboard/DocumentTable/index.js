@@ -7,31 +7,42 @@ import Pagination from "./Pagination";
 
 const PerformanceOfAgents = () => {
   const [documents, setDocuments] = useState([]);
+  const [total, setTotal] = useState(0);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loading, setLoading] = useState(false);
   const [showChat, setShowChat] = useState(false);
   const [selectedDocumentName, setSelectedDocumentName] = useState(null);
 
-  useEffect(() => {
-    const loadData = async () => {
-      try {
-        const response = await fetch(
-          `${process.env.NEXT_PUBLIC_API_URL}docs`,
-          {
-            method: "GET",
-            credentials: "include",
-          }
-        );
-        if (!response.ok) {
-          throw new Error("Failed to fetch documents");
+  const loadPage = async (cursor = null) => {
+    setLoading(true);
+    try {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : "";
+      const response = await fetch(
+        `${process.env.NEXT_PUBLIC_API_URL}docs${query}`,
+        {
+          method: "GET",
+          credentials: "include",
         }
-        const data = await response.json();
-        setDocuments(data);
-      } catch (error) {
-        console.error("Error fetching documents:", error);
+      );
+      if (!response.ok) {
+        throw new Error("Failed to fetch documents");
+      }
+      const data = await response.json();
+      setDocuments((previous) => (cursor ? [...previous, ...data.items] : data.items));
+      setTotal(data.total);
+      setNextCursor(data.next_cursor);
+    } catch (error) {
+      console.error("Error fetching documents:", error);
+      if (!cursor) {
         setDocuments([]);
       }
-    };
+    } finally {
+      setLoading(false);
+    }
+  };
 
-    loadData();
+  useEffect(() => {
+    loadPage();
   }, []);
 
   const formatDate = (dateString) => {
@@ -142,7 +153,13 @@ const PerformanceOfAgents = () => {
                 </tbody>
               </Table>
             </div>
-            <Pagination />
+            <Pagination
+              shown={documents.length}
+              total={total}
+              hasMore={Boolean(nextCursor)}
+              loading={loading}
+              onLoadMore={() => loadPage(nextCursor)}
+            />
           </div>
         </Card.Body>
       </Card>